@@ -0,0 +1,1174 @@
+# quick benchmarks for the shop code
+# these are not tests, they just time things so we can see if a change made it faster
+#
+# run all of them:   python benchmarks.py
+# run just one:      python benchmarks.py money
+# save results:      python benchmarks.py scale --json after.json
+# catch regressions: python benchmarks.py scale --json after.json --compare before.json
+
+import argparse
+import contextlib
+import csv
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import pty
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from decimal import Decimal
+
+from catalogue import FIELDS as CATALOGUE_FIELDS, import_catalogue, read_catalogue, row_fields
+from columnar import ColumnarInventory
+from details import DetailsFile, write_details
+from journal import OrderJournal, read_journal, replay_stock
+from orders import LOW_STOCK, OrderError, OrderService, StockChange, basket_total, find_products, list_products
+from persistence import SQLiteBackend
+from pricing import MealDeal, MultiBuy, PricingEngine, Selector, TimedPrice, sample_rules, scan_price
+from search import SearchIndex, scan_search
+from stockalerts import LowStockMonitor, scan_low
+from stores import DEFAULT_STORES, StoreNetwork
+from models import Basket, BasketItem, Inventory, PersistentInventory, Product, money, product_row, seed_inventory
+from reservations import LOCK_STRATEGIES, OutOfStock, ReservationService
+from replay import random_orders, replay
+from loadtest import percentile
+import profiling
+import project
+
+
+def best_time(func, number: int, repeat: int = 5) -> float:
+    # runs func() "number" times, does that "repeat" times and keeps the fastest
+    # (the fastest run is the one with the least noise from other programs)
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def print_table(title: str, headers, rows):
+    # prints rows as a simple lined-up table
+    print(f"\n{title}")
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for r in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)))
+
+
+# =========================
+# MONEY: float sum() vs whole pence vs Decimal
+# =========================
+
+def bench_money(sizes=(10, 100, 1000)):
+    rng = random.Random(1)
+    rows = []
+
+    for size in sizes:
+        prices = [rng.randint(50, 2500) for _ in range(size)]
+        qtys = [rng.randint(1, 5) for _ in range(size)]
+
+        # the old way: floats in pounds, summed every time
+        float_lines = [BasketItem(f"P{i}", "x", p / 100, q) for i, (p, q) in enumerate(zip(prices, qtys))]
+        # whole pence, still summed every time
+        pence_lines = [BasketItem(f"P{i}", "x", p, q) for i, (p, q) in enumerate(zip(prices, qtys))]
+        # Decimal in pounds (exact, but slow)
+        decimal_lines = [BasketItem(f"P{i}", "x", Decimal(p) / 100, q) for i, (p, q) in enumerate(zip(prices, qtys))]
+
+        # whole pence with the Basket keeping a running total
+        basket = Basket()
+        for i, (p, q) in enumerate(zip(prices, qtys)):
+            basket.add(Product(f"P{i}", "food", "x", p, 99, ""), q)
+
+        number = max(1, 200_000 // size)
+        timings = {
+            "float sum()": best_time(lambda: sum(i.unit_price * i.qty for i in float_lines), number),
+            "pence sum()": best_time(lambda: sum(i.unit_price * i.qty for i in pence_lines), number),
+            "Decimal sum()": best_time(lambda: sum(i.unit_price * i.qty for i in decimal_lines), number),
+            "Basket.total": best_time(lambda: basket.total, number * 10),
+        }
+        for name, secs in timings.items():
+            rows.append((size, name, f"{1 / secs:,.0f}", f"{size / secs:,.0f}"))
+
+    print_table("basket totalling throughput", ("lines", "method", "totals/sec", "lines/sec"), rows)
+
+
+# =========================
+# MEMORY: dict of Product dataclasses vs ColumnarInventory
+# =========================
+
+CATEGORIES = ("drinks", "food", "books")
+
+
+def synthetic_rows(n: int, seed: int = 1):
+    # makes n fake products as (id, category, name, price, stock, details, delivery)
+    # strings are built fresh for every row, like they would be when reading a file
+    rng = random.Random(seed)
+    for i in range(n):
+        category = "".join(CATEGORIES[i % 3])
+        yield (
+            f"{category[0].upper()}{i}",
+            category,
+            f"Product number {i}",
+            rng.randint(50, 2500),
+            rng.randint(0, 50),
+            f"Author {rng.randint(1, 5000)} — synthetic description for item {i}",
+            category == "books",
+        )
+
+
+def traced_size(build) -> int:
+    # how many bytes are still in use after build() runs (and what it returns is kept)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def bench_memory(sizes=(10_000, 100_000)):
+    rows = []
+    for size in sizes:
+        builders = {
+            "dict of Product": lambda: {r[0]: Product(*r) for r in synthetic_rows(size)},
+            "Inventory": lambda: Inventory({r[0]: Product(*r) for r in synthetic_rows(size)}),
+            "ColumnarInventory": lambda: ColumnarInventory.from_rows(synthetic_rows(size)),
+        }
+        for name, build in builders.items():
+            used = traced_size(build)
+            rows.append((f"{size:,}", name, f"{used / 1_000_000:,.1f}", f"{used / size:,.0f}"))
+
+    print_table("catalogue memory", ("products", "store", "MB", "bytes/product"), rows)
+
+
+# =========================
+# PERSISTENCE: startup and saving with SQLite
+# =========================
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_persistence(sizes=(10_000, 100_000), changes=100):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"bench_{size}.db")
+            backend = SQLiteBackend(path)
+            backend.write(synthetic_rows(size))
+            backend.close()
+
+            # startup + first screen: open the file and list one category
+            inventory = PersistentInventory(SQLiteBackend(path))
+            first_screen = timed(lambda: inventory.in_category("drinks"))
+            full_load = timed(lambda: len(inventory))
+
+            # save a few stock changes (only those rows are written)
+            ids = random.Random(2).sample(list(inventory), changes)
+            for pid in ids:
+                inventory.adjust_stock(pid, -1)
+            incremental = timed(inventory.flush)
+
+            # what saving would cost if we rewrote every row instead
+            everything = [product_row(p) for p in inventory.values()]
+            rewrite_all = timed(lambda: inventory.backend.write(everything))
+            inventory.close()
+
+            rows.append((f"{size:,}", f"{first_screen * 1000:,.1f}", f"{full_load * 1000:,.1f}",
+                         f"{incremental * 1000:,.1f}", f"{rewrite_all * 1000:,.1f}"))
+
+    print_table(f"SQLite inventory (ms, saving {changes} stock changes)",
+                ("products", "open + 1 category", "load all", "save changes", "rewrite all"), rows)
+
+
+# =========================
+# RESERVATIONS: many tills fighting over a few products
+# =========================
+
+class SlowShelf(Inventory):
+    # an inventory where changing stock takes a moment (like a round trip to a
+    # database would), so another till can get in between reading the stock
+    # and writing it back. without locks that loses updates and oversells
+
+    def adjust_stock(self, pid: str, delta: int):
+        stock = self[pid].stock
+        time.sleep(0)
+        self.set_stock(pid, stock + delta)
+
+
+def stress_reservations(strategy: str, threads: int = 8, ops: int = 20_000,
+                        products: int = 20, stock: int = 200, ttl: float = 0.05) -> dict:
+    # every thread plays a till: reserve 1-3 of a random product, then either
+    # buy it (commit), put it back (release) or walk away (left to time out)
+    inventory = SlowShelf({f"P{i}": Product(f"P{i}", "food", f"P{i}", 100, stock, "") for i in range(products)})
+    service = ReservationService(inventory, ttl=ttl, locks=strategy)
+    sold = [0] * threads
+    refused = [0] * threads
+    pids = list(inventory)
+
+    def till(n: int):
+        rng = random.Random(n)
+        for _ in range(ops // threads):
+            holder = object()
+            pid = rng.choice(pids)
+            qty = rng.randint(1, 3)
+            try:
+                service.reserve(holder, pid, qty)
+            except OutOfStock:
+                refused[n] += 1
+                continue
+            roll = rng.random()
+            if roll < 0.6:
+                try:
+                    service.commit(holder, {pid: qty})
+                except OutOfStock:
+                    # timed out before paying and someone else got the stock
+                    refused[n] += 1
+                    service.release(holder)
+                    continue
+                sold[n] += qty
+            elif roll < 0.9:
+                service.release(holder)
+            # else: abandoned basket, the ttl gives it back
+
+    # switch threads as often as possible so they really do collide
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        workers = [threading.Thread(target=till, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.setswitchinterval(old_interval)
+
+    # let every abandoned basket time out, then check the books balance
+    time.sleep(ttl * 2)
+    service.expire_stale()
+    remaining = sum(p.stock for p in inventory.values())
+    total = products * stock
+    return {
+        "ops/sec": ops / elapsed,
+        "refused": sum(refused),
+        "negative stock": sum(1 for p in inventory.values() if p.stock < 0),
+        # sold + left on the shelf should be exactly what we started with
+        "oversold": sum(sold) + remaining - total,
+    }
+
+
+def bench_reservations(strategies=tuple(LOCK_STRATEGIES)):
+    rows = []
+    for strategy in strategies:
+        result = stress_reservations(strategy)
+        ok = result["oversold"] == 0 and result["negative stock"] == 0
+        verdict = "ok" if ok else "OVERSOLD"
+        if strategy == "none":
+            # (this one is meant to fail, it shows what the locks are for)
+            verdict = "OVERSOLD (expected)" if not ok else "ok (not enough contention to show it)"
+        rows.append((strategy, f"{result['ops/sec']:,.0f}", result["refused"],
+                     result["negative stock"], result["oversold"], verdict))
+    print_table("reservation stress (8 threads, 20 hot products)",
+                ("locks", "ops/sec", "refused", "negative stock", "oversold", "result"), rows)
+
+
+# =========================
+# JOURNAL: writing every order safely, and rebuilding stock from it
+# =========================
+
+def journal_record(n: int, pids) -> dict:
+    # looks like what OrderService writes for a 2-line order
+    return {"order_id": n, "placed_at": 0.0,
+            "lines": [[pids[n % len(pids)], "Item", 360, 1], [pids[(n * 7) % len(pids)], "Item", 499, 2]],
+            "subtotal": 1358, "discount": 0, "total": 1358, "delivery": None}
+
+
+def journal_throughput(path: str, orders: int, threads: int, **options) -> float:
+    # orders/sec with `threads` tills each waiting for their own order to be safe
+    journal = OrderJournal(path, **options)
+    pids = list(seed_inventory())
+
+    def till(first: int):
+        for n in range(first, orders, threads):
+            journal.append(journal_record(n, pids))
+
+    workers = [threading.Thread(target=till, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    journal.close()
+    return orders / (time.perf_counter() - start)
+
+
+def bench_journal(orders=2_000, recovery_sizes=(10_000, 100_000)):
+    rows = []
+    modes = [
+        ("no fsync", 1, {"fsync": False, "group_commit": False}),
+        ("fsync every order", 1, {"group_commit": False}),
+        ("group commit, 1 till", 1, {}),
+        ("group commit, 8 tills", 8, {}),
+        ("group commit, 64 tills", 64, {}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, threads, options in modes:
+            path = os.path.join(tmp, f"{name}.journal")
+            rows.append((name, f"{journal_throughput(path, orders, threads, **options):,.0f}"))
+        print_table(f"order journal ({orders:,} orders)", ("mode", "orders/sec"), rows)
+
+        rows = []
+        for size in recovery_sizes:
+            path = os.path.join(tmp, f"recover_{size}.journal")
+            journal = OrderJournal(path, fsync=False)
+            pids = list(seed_inventory())
+            for n in range(size):
+                journal.append(journal_record(n, pids), wait=False)
+            journal.close()
+
+            inventory = seed_inventory()
+            for pid in inventory:
+                inventory.set_stock(pid, size * 3)
+            start = time.perf_counter()
+            replay_stock(inventory, read_journal(path))
+            elapsed = time.perf_counter() - start
+            rows.append((f"{size:,}", f"{os.path.getsize(path) / 1e6:,.1f}", f"{elapsed * 1000:,.0f}",
+                         f"{size / elapsed:,.0f}"))
+        print_table("rebuilding stock from the journal", ("orders", "MB", "ms", "orders/sec"), rows)
+
+
+# =========================
+# SEARCH: inverted index vs reading every product
+# =========================
+
+def made_up_words(count: int, rng: random.Random):
+    syllables = ["ba", "ko", "ri", "chee", "se", "lat", "te", "mo", "cha", "har", "ry", "pot",
+                 "ter", "hab", "it", "clear", "ja", "mes", "bro", "wn", "ie", "ca", "ke", "tea"]
+    return ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))) for _ in range(count)]
+
+
+def search_products(n: int, seed: int = 1):
+    # products with names and blurbs made of made-up words (some common, some rare)
+    rng = random.Random(seed)
+    words = made_up_words(20_000, rng)
+    common = words[:50]
+    for row in synthetic_rows(n, seed):
+        name = " ".join(rng.choice(common if rng.random() < 0.3 else words) for _ in range(3))
+        details = " ".join(rng.choice(words) for _ in range(12))
+        yield Product(row[0], row[1], name.title(), row[3], row[4], details, row[6])
+
+
+def bench_search(sizes=(10_000, 100_000, 300_000), queries=20):
+    rows = []
+    for size in sizes:
+        products = list(search_products(size))
+        start = time.perf_counter()
+        index = SearchIndex(products)
+        build = time.perf_counter() - start
+
+        # a mix of: whole words, prefixes ("as you type") and two-word searches
+        rng = random.Random(3)
+        picks = [rng.choice(products) for _ in range(queries)]
+        texts = []
+        for n, p in enumerate(picks):
+            name_words = p.name.split()
+            if n % 3 == 0:
+                texts.append(name_words[0])
+            elif n % 3 == 1:
+                texts.append(name_words[1][:3])
+            else:
+                texts.append(f"{name_words[2]} {p.details.split()[0]}")
+
+        indexed = best_time(lambda: [index.search(q) for q in texts], number=1, repeat=3) / queries
+        scanned = timed(lambda: [scan_search(products, q) for q in texts[:3]]) / 3
+        rows.append((f"{size:,}", f"{build:,.2f}", f"{indexed * 1000:,.2f}", f"{scanned * 1000:,.0f}",
+                     f"{scanned / indexed:,.0f}x"))
+
+    print_table(f"product search (avg ms per query, {queries} mixed queries)",
+                ("products", "build index s", "index ms", "scan ms", "speedup"), rows)
+
+
+# =========================
+# IMPORT: streaming a big catalogue file into the inventory
+# =========================
+
+def write_catalogue(path: str, n: int, bad_every: int = 1000):
+    # writes n synthetic products as CSV or JSON lines (by extension),
+    # with one broken row every `bad_every` rows so the error path is timed too
+    as_json = not path.endswith(".csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = None if as_json else csv.writer(f)
+        if writer:
+            writer.writerow(CATALOGUE_FIELDS)
+        for i, (pid, category, name, price, stock, details, delivery) in enumerate(synthetic_rows(n)):
+            price_text = f"{price / 100:.2f}" if i % bad_every else "free"
+            if as_json:
+                f.write(json.dumps({"id": pid, "category": category, "name": name, "price": price_text,
+                                    "stock": stock, "details": details, "delivery_eligible": delivery}))
+                f.write("\n")
+            else:
+                writer.writerow((pid, category, name, price_text, stock, details, "yes" if delivery else "no"))
+
+
+def parse_only(path: str) -> int:
+    # reads and checks every row but keeps nothing
+    count = 0
+    for _line, record in read_catalogue(path):
+        try:
+            row_fields(record)
+        except OrderError:
+            pass
+        count += 1
+    return count
+
+
+def bench_import(sizes=(100_000, 1_000_000)):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for ext in ("csv", "jsonl"):
+                path = os.path.join(tmp, f"catalogue_{size}.{ext}")
+                write_catalogue(path, size)
+                mb = os.path.getsize(path) / 1e6
+
+                read_secs = timed(lambda: parse_only(path))
+                # peak memory while just reading the file (should not grow with its size)
+                # (measured on a second pass, tracemalloc slows everything down)
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    parse_only(path)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                rows.append((f"{size:,}", ext, f"{mb:,.0f}", "read + check only",
+                             f"{size / read_secs:,.0f}", f"{peak / 1e6:,.2f}"))
+
+                stores = {
+                    "ColumnarInventory": lambda: ColumnarInventory(),
+                    "SQLite": lambda: PersistentInventory(SQLiteBackend(os.path.join(tmp, f"import_{size}_{ext}.db"),
+                                                                       synchronous="NORMAL")),
+                }
+                for name, make in stores.items():
+                    inventory = make()
+                    report = import_catalogue(OrderService(inventory), path)
+                    getattr(inventory, "close", lambda: None)()
+                    rows.append((f"{size:,}", ext, f"{mb:,.0f}", name,
+                                 f"{report.rows_per_sec:,.0f}", "-"))
+                    del inventory, report
+
+    print_table("catalogue import (1 bad row in 1000)",
+                ("rows", "format", "file MB", "into", "rows/sec", "read peak MB"), rows)
+
+
+# =========================
+# STOCK: a big delivery, one product at a time vs one batch
+# =========================
+
+def delivery_changes(pids, count: int, seed: int = 4):
+    # mostly deliveries, some breakages and some stock-take counts
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(count):
+        roll = rng.random()
+        pid = rng.choice(pids)
+        if roll < 0.7:
+            changes.append(StockChange(pid, rng.randint(1, 48)))
+        elif roll < 0.9:
+            changes.append(StockChange(pid, -1))
+        else:
+            changes.append(StockChange(pid, rng.randint(50, 100), absolute=True))
+    return changes
+
+
+def bench_stock(products=100_000, updates=100_000):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stock.db")
+        backend = SQLiteBackend(path)
+        backend.write((pid, c, n, p, 100, d, e) for pid, c, n, p, _s, d, e in synthetic_rows(products))
+        backend.close()
+
+        stores = {
+            "Inventory": lambda: Inventory({r[0]: Product(*r[:4], 100, *r[5:]) for r in synthetic_rows(products)}),
+            "SQLite": lambda: PersistentInventory(SQLiteBackend(path)),
+        }
+        for name, make in stores.items():
+            for method in ("set_stock one by one", "change_stock batch"):
+                inventory = make()
+                service = OrderService(inventory)
+                changes = delivery_changes(list(inventory), updates)
+
+                def one_by_one():
+                    # what the "Update stock" screen does, once per line
+                    for c in changes:
+                        stock = c.amount if c.absolute else service.product(c.product_id).stock + c.amount
+                        service.set_stock(c.product_id, stock)
+                    inventory.flush()
+
+                def batch():
+                    report = service.change_stock(changes)
+                    assert report.ok, report
+
+                secs = timed(one_by_one if method.startswith("set_stock") else batch)
+                rows.append((name, method, f"{secs * 1000:,.0f}", f"{updates / secs:,.0f}"))
+                inventory.close()
+
+        # the problem report when a delivery note has mistakes in it
+        inventory = stores["Inventory"]()
+        bad = delivery_changes(list(inventory), updates)
+        bad[::100] = [StockChange(f"NOPE{i}", 1) for i in range(len(bad[::100]))]
+        bad[50::100] = [StockChange(c.product_id, -1_000) for c in bad[50::100]]
+        report = None
+
+        def rejected():
+            nonlocal report
+            report = OrderService(inventory).change_stock(bad)
+
+        secs = timed(rejected)
+        rows.append(("Inventory", f"rejected ({len(report.unknown):,} unknown, {len(report.negative):,} negative)",
+                     f"{secs * 1000:,.0f}", f"{updates / secs:,.0f}"))
+
+    print_table(f"stock changes ({updates:,} updates over {products:,} products)",
+                ("store", "method", "ms", "updates/sec"), rows)
+
+
+# =========================
+# PROFILING: what the timing hooks cost
+# =========================
+
+def bench_profiling(orders=20_000, repeat=3):
+    def run() -> float:
+        inventory = seed_inventory()
+        for pid in list(inventory):
+            inventory.set_stock(pid, 10 * orders)
+        result = replay(OrderService(inventory), random_orders(inventory, orders))
+        return result["seconds"]
+
+    rows = []
+    off = min(run() for _ in range(repeat))
+    rows.append(("off (nothing wrapped)", f"{orders / off:,.0f}", "-"))
+
+    metrics = profiling.enable()
+    try:
+        on = min(run() for _ in range(repeat))
+    finally:
+        profiling.disable()
+    calls = sum(t.count for _name, t in metrics._snapshot())
+    rows.append(("on", f"{orders / on:,.0f}", f"{(on - off) / (calls / repeat) * 1e9:,.0f}"))
+
+    # and after switching it off again everything should be back to full speed
+    again = min(run() for _ in range(repeat))
+    rows.append(("off again", f"{orders / again:,.0f}", "-"))
+    print_table(f"profiling hooks ({orders:,} replayed orders)", ("profiling", "orders/sec", "ns per timed call"), rows)
+
+
+# =========================
+# CHANGE FEED: what each stock change costs with subscribers listening
+# =========================
+
+def bench_changes(products=10_000, changes=200_000, repeat=3):
+    rng = random.Random(8)
+    rows_in = list(synthetic_rows(products))
+    # most changes hit a few popular products (like a real shop: coffee sells all day)
+    hot = [r[0] for r in rows_in[:50]]
+    cold = [r[0] for r in rows_in]
+    pids = [rng.choice(hot) if rng.random() < 0.8 else rng.choice(cold) for _ in range(changes)]
+
+    def setup(how: str):
+        inventory = Inventory({r[0]: Product(*r) for r in rows_in})
+        subs = []
+        if how == "1 subscriber":
+            subs.append(inventory.changes().subscribe())
+        elif how == "1 subscriber, not stock":
+            subs.append(inventory.changes().subscribe(kinds=("added", "replaced", "removed")))
+        elif how == "4 subscribers":
+            subs += [inventory.changes().subscribe() for _ in range(4)]
+        elif how == "listener thread":
+            subs.append(inventory.changes().listen(lambda batch: None))
+        return inventory, subs
+
+    rows = []
+    base = None
+    for how in ("nobody listening", "1 subscriber", "1 subscriber, not stock",
+                "4 subscribers", "listener thread"):
+        best = float("inf")
+        for _ in range(repeat):
+            inventory, subs = setup(how)
+            adjust = inventory.adjust_stock
+            start = time.perf_counter()
+            for pid in pids:
+                adjust(pid, 1)
+            best = min(best, time.perf_counter() - start)
+            drained = sum(len(sub.drain()) for sub in subs)
+            for sub in subs:
+                sub.close()
+        ns = best / changes * 1e9
+        base = ns if base is None else base
+        per_sub = f"{drained // len(subs):,}" if subs else "-"
+        rows.append((how, f"{ns:,.0f}", f"+{ns - base:,.0f}", per_sub))
+    print_table(f"adjust_stock with the change feed ({changes:,} changes over {products:,} products)",
+                ("listening", "ns per change", "extra ns", "changes drained (coalesced)"), rows)
+
+    # a subscriber that never drains stays bounded: it is reset instead of growing
+    inventory, _ = setup("nobody listening")
+    sub = inventory.changes().subscribe(max_pending=1_000)
+    for pid in cold:
+        inventory.adjust_stock(pid, 1)
+    pending, overflows, drained = len(sub), sub.overflows, sub.drain()
+    print(f"\nsubscriber that never drains (max_pending=1,000, {products:,} products changed): "
+          f"{pending} pending, {overflows} overflow, drain gives {len(drained)} change (reset={drained[0].reset})")
+
+
+# =========================
+# TILL SCREENS: one print() per line vs one write per screen, on a pseudo-terminal
+# =========================
+
+class CountingTerminal(io.FileIO):
+    # the till's end of a pseudo-terminal, counting every write() that reaches it
+    # (each one is a system call, and over SSH/serial often a packet of its own)
+
+    def __init__(self, fd: int):
+        super().__init__(fd, "w", closefd=False)
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self.writes += 1
+        n = super().write(data)
+        self.bytes += n
+        return n
+
+
+def per_line(lines):
+    # how the screens used to be written: one print() per line
+    for text in lines:
+        for line in text.split("\n"):
+            print(line)
+
+
+def bench_render(categories=(5, 200, 2_000), repeat=20):
+    master, slave = pty.openpty()
+    raw = CountingTerminal(slave)
+    # like sys.stdout on a real terminal: line buffered, so every newline is written straight away
+    term = io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8", line_buffering=True)
+
+    def read_terminal():
+        # somebody has to read the other end or the pty fills up and writes block
+        while True:
+            try:
+                if not os.read(master, 65536):
+                    return
+            except OSError:
+                return
+
+    threading.Thread(target=read_terminal, daemon=True).start()
+
+    old_line = lambda p: f"{p.name} — {money(p.price)} (stock: {p.stock})"
+    screens = []
+    screens.append(("home menu", lambda: per_line([project.HOME_MENU]), lambda: project.show(project.HOME_MENU)))
+    for n in categories:
+        inventory = Inventory({r[0]: Product(*r) for r in synthetic_rows(3 * n)})
+        screens.append((
+            f"category, {n:,} products",
+            lambda inv=inventory: per_line([project.header("DRINKS"), *(
+                f"{idx}. {old_line(p)}" for idx, p in enumerate(list_products(inv, "drinks"), start=1))]),
+            lambda inv=inventory: project.show_category(inv, "drinks"),
+        ))
+    basket = Basket()
+    for p in list(seed_inventory().values())[:10]:
+        basket.add(p, 2)
+    screens.append(("basket, 10 lines", lambda: per_line(project.basket_lines(basket)),
+                    lambda: project.print_basket(basket)))
+    inventory = Inventory({r[0]: Product(*r) for r in synthetic_rows(categories[-1])})
+    screens.append((
+        f"employee inventory, {len(inventory):,}",
+        lambda: per_line([project.header("INVENTORY"), *(
+            f"{p.id} | {p.category} | {p.name} | {money(p.price)} | stock={p.stock}" for p in inventory.values())]),
+        lambda: project.show(project.header("INVENTORY"), *map(project.inventory_line, inventory.values())),
+    ))
+
+    def measure(func):
+        with contextlib.redirect_stdout(term):
+            func()      # (warms up the caches)
+            raw.writes = raw.bytes = 0
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            seconds = (time.perf_counter() - start) / repeat
+        return raw.writes // repeat, raw.bytes // repeat, seconds
+
+    rows = []
+    try:
+        for name, old, new in screens:
+            old_writes, old_bytes, old_s = measure(old)
+            new_writes, new_bytes, new_s = measure(new)
+            rows.append((name, f"{old_bytes:,}", f"{old_writes:,}", f"{new_writes:,}",
+                         f"{old_s * 1e6:,.0f}", f"{new_s * 1e6:,.0f}"))
+    finally:
+        term.close()
+        os.close(slave)
+        os.close(master)
+    print_table(f"till screens on a pseudo-terminal (per screen, average of {repeat} draws)",
+                ("screen", "bytes", "writes per line", "writes per screen", "us per line", "us per screen"), rows)
+
+
+# =========================
+# EMPLOYEE INVENTORY VIEW: first page of a huge inventory
+# =========================
+
+def bench_inventory_view(products=1_000_000, pages=(1, 100)):
+    def everything(inventory):
+        # how the view used to work: every product formatted before anything is shown
+        return [f"{p.id} | {p.category} | {p.name} | {money(p.price)} | stock={p.stock}" for p in inventory.values()]
+
+    def paged(inventory, n, **filters):
+        pager = project.Pager(find_products(inventory, **filters))
+        return [project.inventory_line.render(p) for p in pager.page(n - 1)]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "view.db")
+        backend = SQLiteBackend(path)
+        backend.write(synthetic_rows(products))
+        backend.close()
+
+        kinds = {
+            "in memory": lambda: Inventory({r[0]: Product(*r) for r in synthetic_rows(products)}),
+            "SQLite (just opened)": lambda: PersistentInventory(SQLiteBackend(path)),
+        }
+        for kind, make in kinds.items():
+            inventory = make()
+            rows.append((kind, "everything at once", f"{timed(lambda: everything(inventory)) * 1000:,.1f}"))
+            for n in pages:
+                inventory = make()
+                rows.append((kind, f"page {n}", f"{timed(lambda: paged(inventory, n)) * 1000:,.1f}"))
+            inventory = make()
+            rows.append((kind, f"page 1, books, stock <= {LOW_STOCK}",
+                         f"{timed(lambda: paged(inventory, 1, category='books', max_stock=LOW_STOCK)) * 1000:,.1f}"))
+            inventory = make()
+            rows.append((kind, "page 1, ids starting F99",
+                         f"{timed(lambda: paged(inventory, 1, prefix='F99')) * 1000:,.1f}"))
+            if hasattr(inventory, "close"):
+                inventory.close()
+    print_table(f"employee inventory view ({products:,} products, {project.PAGE_SIZE} per page)",
+                ("inventory", "showing", "ms"), rows)
+
+
+# =========================
+# LOW STOCK: "what's running low?" kept up to date vs looking at everything
+# =========================
+
+def bench_low_stock(sizes=(10_000, 100_000, 1_000_000), sales=60_000):
+    rows = []
+    for size in sizes:
+        rng = random.Random(9)
+        catalogue = list(synthetic_rows(size))
+        # restocked to 50-100, so only the products the tills sell down go low
+        stocks = [rng.randint(50, 100) for _ in catalogue]
+        make = lambda: Inventory({r[0]: Product(*r[:4], stock, *r[5:]) for r, stock in zip(catalogue, stocks)})
+        # a few hundred popular products get all the sales, some with their own reorder level
+        popular = [r[0] for r in catalogue[:900]]
+        pids = [rng.choice(popular) for _ in range(sales)]
+        thresholds = {pid: 20 for pid in popular[::10]}
+
+        def sell(inventory):
+            # (gc off: with a million products alive, a collection in the middle swamps the difference)
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                for pid in pids:
+                    if inventory[pid].stock > 0:
+                        inventory.adjust_stock(pid, -1)
+                return time.perf_counter() - start
+            finally:
+                gc.enable()
+
+        plain = sell(make())
+        inventory = make()
+        monitors = []
+        first = timed(lambda: monitors.append(LowStockMonitor(inventory, thresholds)))   # (the one full scan)
+        monitor = monitors[0]
+        alerts = []
+        monitor.listen(alerts.append)
+        # (each sale is checked against its level on the till's thread, the monitor's
+        # thread only tells the listeners)
+        watched = sell(inventory)
+        catch_up = timed(monitor.catch_up)
+
+        indexed = best_time(monitor.low, number=5, repeat=3)
+        scanned = best_time(lambda: scan_low(inventory, thresholds), number=1, repeat=3)
+        assert sorted(p.id for p, _ in monitor.low()) == sorted(scan_low(inventory, thresholds))
+        rows.append((f"{size:,}", f"{len(monitor):,}", f"{len(alerts):,}",
+                     f"{(watched - plain) / len(pids) * 1e9:,.0f}", f"{first * 1000:,.1f}",
+                     f"{catch_up * 1000:,.1f}", f"{indexed * 1000:,.3f}", f"{scanned * 1000:,.1f}"))
+        monitor.close()
+    print_table(f"low stock ({sales:,} sales, ms unless shown)",
+                ("products", "low", "alerts", "extra ns per sale", "start (scan)", "catch up", "low()",
+                 "scan everything"), rows)
+
+
+# =========================
+# STORES: asking every shop's shard at once
+# =========================
+
+def synthetic_store(store_id: str, products: int):
+    # the same synthetic catalogue in every shop, stock differs from shop to shop
+    # (module level so a shard process can call it)
+    rng = random.Random(store_id)
+    return Inventory({r[0]: Product(*r[:4], rng.randint(0, 20), *r[5:]) for r in synthetic_rows(products)})
+
+
+def bench_stores(shard_counts=(1, 2, 4, 8), products=20_000, questions=200):
+    rows = []
+    rng = random.Random(10)
+    pids = [f"{'DFB'[i % 3]}{i}" for i in (rng.randrange(products) for _ in range(questions))]
+    words = [f"product number {rng.randrange(products)}" for _ in range(questions)]
+    for count in shard_counts:
+        with StoreNetwork(DEFAULT_STORES[:count], synthetic_store, lambda store: (store.id, products)) as network:
+            network.where("product")        # (every shard builds its search index)
+            latencies = {}
+            for name, ask in (("stock", lambda i: network.stock(pids[i])),
+                              ("where", lambda i: network.where(words[i])),
+                              ("one by one", lambda i: [shard.call("search", words[i], 20)
+                                                        for shard in network.shards])):
+                times = []
+                for i in range(questions):
+                    start = time.perf_counter()
+                    ask(i)
+                    times.append(time.perf_counter() - start)
+                latencies[name] = sorted(times)
+        rows.append((count, *(f"{percentile(latencies[name], p) * 1000:,.3f}"
+                              for name in ("stock", "where", "one by one") for p in (50, 99))))
+    print_table(f"stores ({products:,} products per store, {questions} questions, ms)",
+                ("stores", "stock p50", "stock p99", "where p50", "where p99",
+                 "one by one p50", "one by one p99"), rows)
+
+
+# =========================
+# DETAILS: long product details kept on disk until someone looks at them
+# =========================
+
+def book_rows(n: int, seed: int = 11):
+    # synthetic_rows with a book-sized blurb (200-800 characters) for every product
+    rng = random.Random(seed)
+    text = " ".join(made_up_words(50_000, rng))
+    for row in synthetic_rows(n, seed):
+        start = rng.randrange(len(text) - 800)
+        yield (*row[:5], text[start:start + rng.randint(200, 800)], row[6])
+
+
+def peak_rss_kb() -> int:
+    # the most memory this process has had (linux keeps ru_maxrss across exec,
+    # so a child started by a big parent would report the parent's, VmHWM doesn't)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def details_startup(db_path: str, details_path: str = ""):
+    # (runs in a python of its own, see bench_details) loads the catalogue the
+    # way a big shop would start up, and prints how long it took and how much
+    # more memory the process needed for it
+    before = peak_rss_kb()
+    start = time.perf_counter()
+    backend = SQLiteBackend(db_path)
+    inventory = ColumnarInventory.from_rows(backend.rows(), DetailsFile(details_path) if details_path else None)
+    seconds = time.perf_counter() - start
+    grew_kb = peak_rss_kb() - before
+    print(json.dumps({"seconds": seconds, "rss_mb": grew_kb / 1024, "products": len(inventory)}))
+
+
+def bench_details(sizes=(100_000, 300_000), reads=20_000):
+    rows = []
+    lookups = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            # the same catalogue twice: details in the database, and details in a file of their own
+            full, lean, details_path = (os.path.join(tmp, f"{name}_{size}") for name in ("full.db", "lean.db", "details.dat"))
+            backend = SQLiteBackend(full, synchronous="OFF")
+            backend.write(book_rows(size))
+            backend.close()
+            backend = SQLiteBackend(lean, synchronous="OFF")
+            backend.write((*r[:5], "", r[6]) for r in book_rows(size))
+            backend.close()
+            write_details(details_path, (r[5] for r in book_rows(size)))
+
+            for name, args in (("details in memory", (full,)), ("details on disk", (lean, details_path))):
+                out = subprocess.run([sys.executable, "-c", f"import benchmarks; benchmarks.details_startup(*{args!r})"],
+                                     capture_output=True, text=True, check=True, cwd=here).stdout
+                result = json.loads(out.splitlines()[-1])
+                assert result["products"] == size
+                rows.append((f"{size:,}", name, f"{result['seconds']:,.2f}", f"{result['rss_mb']:,.0f}"))
+
+            # reading one product's details (what the details screen does)
+            details = DetailsFile(details_path)
+            texts = [r[5] for r in book_rows(size)]
+            rng = random.Random(12)
+            cold = [rng.randrange(size) for _ in range(reads)]
+            warm = cold[:100]
+            assert all(details[row] == texts[row] for row in cold[:1000])
+            details = DetailsFile(details_path)
+            miss = timed(lambda: [details[row] for row in cold])
+            hit = best_time(lambda: [details[row] for row in warm], number=10) / len(warm)
+            in_list = best_time(lambda: [texts[row] for row in warm], number=10) / len(warm)
+            lookups.append((f"{size:,}", f"{miss / len(cold) * 1e9:,.0f}", f"{hit * 1e9:,.0f}", f"{in_list * 1e9:,.0f}"))
+            details.close()
+            del texts
+
+    print_table("details startup (ColumnarInventory from SQLite, s / MB more RSS)",
+                ("products", "details", "startup s", "RSS MB"), rows)
+    print_table("reading one product's details (ns)",
+                ("products", "not cached", "cached", "plain list"), lookups)
+
+
+# =========================
+# SCALE: catalogue and basket operations from small to huge
+# =========================
+
+def scale_round(service: OrderService, pids) -> dict:
+    # one customer with len(pids) different things in their basket:
+    # fill it, total it, change every quantity, empty it, then fill it again and pay
+    order = service.new_order()
+    basket = order.basket
+    times = {}
+
+    times["add_to_basket"] = timed(lambda: [service.add(order, pid, 1) for pid in pids])
+    # basket_total is nearly free, so time lots of calls and keep one
+    calls = 1000
+    times["basket_total"] = timed(lambda: [basket_total(basket) for _ in range(calls)]) / calls
+    times["adjust_basket_qty"] = timed(lambda: [service.adjust(order, pid, 2) for pid in pids])
+    times["remove_from_basket"] = timed(lambda: [service.remove(order, pid) for pid in pids])
+
+    for pid in pids:
+        service.add(order, pid, 1)
+    times["checkout"] = timed(lambda: service.checkout(order))
+    return times
+
+
+def bench_scale(catalogues=(1_000, 10_000, 100_000, 1_000_000),
+                baskets=(1, 10, 100, 1_000, 10_000), repeat: int = 3) -> list:
+    # gives back a list of results (for --json), one per (catalogue, basket, operation)
+    results = []
+    rows = []
+
+    def add(catalogue, basket, op, seconds, items):
+        results.append({"catalogue": catalogue, "basket": basket, "op": op, "seconds": seconds})
+        rows.append((f"{catalogue:,}", "-" if basket is None else f"{basket:,}", op,
+                     f"{seconds * 1000:,.3f}", f"{seconds / items * 1e6:,.3f}"))
+
+    for size in catalogues:
+        # the seed_inventory way: one Product per row into an Inventory
+        gc.collect()
+        load = min(timed(lambda: Inventory({r[0]: Product(*r) for r in synthetic_rows(size)}))
+                   for _ in range(repeat if size < 1_000_000 else 1))
+        add(size, None, "load", load, size)
+
+        inventory = Inventory({r[0]: Product(*r) for r in synthetic_rows(size)})
+        for pid in list(inventory):
+            inventory.set_stock(pid, 1_000_000)
+        listing = best_time(lambda: [list_products(inventory, c) for c in CATEGORIES], number=100, repeat=repeat)
+        add(size, None, "list_products", listing / len(CATEGORIES), 1)
+
+        # the same basket products every run, so results can be compared between versions
+        rng = random.Random(5)
+        all_pids = list(inventory)
+        for lines in baskets:
+            if lines > size:
+                continue
+            pids = rng.sample(all_pids, lines)
+            best: dict = {}
+            for _ in range(repeat):
+                service = OrderService(inventory)
+                for op, secs in scale_round(service, pids).items():
+                    best[op] = min(secs, best.get(op, secs))
+            for op, secs in best.items():
+                add(size, lines, op, secs, 1 if op == "basket_total" else lines)
+        del inventory
+        gc.collect()
+
+    print_table("catalogue and basket operations at scale (best of a few runs)",
+                ("products", "basket lines", "operation", "ms", "us per item"), rows)
+    return results
+
+
+# =========================
+# PRICING: promotions at checkout with lots of rules running
+# =========================
+
+def synthetic_rules(pids_by_category: dict, count: int, seed: int = 6) -> list:
+    # mostly promotions on a few named products (like a real shop's weekly offers)
+    # plus the three category-wide sample ones
+    rng = random.Random(seed)
+    drinks, food, books = (pids_by_category[c] for c in CATEGORIES)
+    rules = sample_rules()
+    for n in range(count - len(rules)):
+        roll = rng.random()
+        if roll < 0.6:
+            rules.append(MealDeal(f"deal {n}", Selector(tuple(rng.sample(drinks, 3))),
+                                  Selector(tuple(rng.sample(food, 3))), rng.randint(300, 600)))
+        elif roll < 0.9:
+            rules.append(MultiBuy(f"multi {n}", Selector(tuple(rng.sample(books, rng.randint(3, 10)))),
+                                  buy=rng.choice((2, 3, 4)), pay=1))
+        else:
+            start = rng.randint(0, 22)
+            rules.append(TimedPrice(f"timed {n}", Selector(tuple(rng.sample(drinks + food, 5))),
+                                    rng.choice((10, 20, 30)), datetime.time(start), datetime.time(start + 1)))
+    return rules
+
+
+def bench_pricing(products=100_000, rule_counts=(10, 100, 1_000, 10_000), baskets=(3, 30, 300)):
+    inventory = Inventory({r[0]: Product(*r) for r in synthetic_rows(products)})
+    by_category = {c: [p.id for p in inventory.in_category(c)] for c in CATEGORIES}
+    category_of = lambda pid: inventory[pid].category
+    now = datetime.datetime(2026, 1, 1, 15, 30)
+    rng = random.Random(7)
+
+    rows = []
+    for count in rule_counts:
+        rules = synthetic_rules(by_category, count)
+        start = time.perf_counter()
+        engine = PricingEngine(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+        for lines in baskets:
+            basket = Basket()
+            # half the basket from products that have offers, so the rules really fire
+            offered = [pid for r in rules[3:] for sel in ((r.first, r.second) if isinstance(r, MealDeal) else (r.items,))
+                       for pid in sel.products]
+            picks = set(rng.sample(offered, min(len(offered), lines // 2)))
+            while len(picks) < lines:
+                picks.add(rng.choice(list(inventory)))
+            for pid in picks:
+                basket.add(inventory[pid], rng.randint(1, 3))
+
+            compiled = engine.price(basket, category_of, now)
+            scanned = scan_price(rules, basket, category_of, now)
+            assert compiled == scanned, (compiled, scanned)
+
+            fast = best_time(lambda: engine.price(basket, category_of, now), number=20, repeat=3)
+            slow = best_time(lambda: scan_price(rules, basket, category_of, now), number=1, repeat=3)
+            rows.append((f"{count:,}", f"{compile_ms:,.1f}", lines, len(compiled.applied),
+                         f"{fast * 1e6:,.0f}", f"{slow * 1e6:,.0f}", f"{slow / fast:,.0f}x"))
+
+    print_table(f"pricing a basket ({products:,} products, us per basket)",
+                ("rules", "compile ms", "basket lines", "promos hit", "compiled us", "check every rule us", "speedup"),
+                rows)
+
+
+# =========================
+# SAVING AND COMPARING RESULTS
+# =========================
+
+def run_info() -> dict:
+    # what the results were measured on, so two files can be told apart
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def result_key(name: str, result: dict) -> tuple:
+    # everything in a result except the timing says *what* was measured
+    return (name,) + tuple(sorted((k, v) for k, v in result.items() if k != "seconds"))
+
+
+def compare(old: dict, new: dict, threshold: float) -> list:
+    # gives back (what, old seconds, new seconds) for everything that got slower
+    # by more than threshold (0.2 = 20%)
+    before = {result_key(name, r): r["seconds"]
+              for name, results in old["results"].items() for r in results}
+    slower = []
+    for name, results in new["results"].items():
+        for r in results:
+            was = before.get(result_key(name, r))
+            if was and r["seconds"] > was * (1 + threshold):
+                slower.append((result_key(name, r), was, r["seconds"]))
+    return slower
+
+
+# every benchmark we can run, by name
+BENCHMARKS = {
+    "money": bench_money,
+    "memory": bench_memory,
+    "persistence": bench_persistence,
+    "reservations": bench_reservations,
+    "journal": bench_journal,
+    "search": bench_search,
+    "import": bench_import,
+    "stock": bench_stock,
+    "profiling": bench_profiling,
+    "scale": bench_scale,
+    "pricing": bench_pricing,
+    "changes": bench_changes,
+    "render": bench_render,
+    "inventory_view": bench_inventory_view,
+    "low_stock": bench_low_stock,
+    "stores": bench_stores,
+    "details": bench_details,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PaperCup benchmarks")
+    parser.add_argument("names", nargs="*", help=f"which benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--json", metavar="FILE", help="save the results (of benchmarks that give any) to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare with results saved earlier by --json")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="(--compare) how much slower counts as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    saved = {"run": run_info(), "results": {}}
+    for name in args.names or BENCHMARKS:
+        results = BENCHMARKS[name]()
+        if results is not None:
+            saved["results"][name] = results
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        slower = compare(old, saved, args.threshold)
+        print(f"\ncompared with {args.compare} (commit {old['run'].get('commit')}):")
+        for key, was, now in slower:
+            what = ", ".join(f"{k}={v}" for k, v in key[1:])
+            print(f"  SLOWER  {key[0]}: {what}: {was * 1000:,.3f} ms -> {now * 1000:,.3f} ms ({now / was - 1:+.0%})")
+        if slower:
+            sys.exit(1)
+        print(f"  no regressions over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# bulk catalogue import: loads a whole file of products instead of typing
+# them in one at a time through the employee screen
+#
+# two kinds of file are understood (picked by the file extension):
+#
+#   CSV (.csv), with a header line:
+#     id,category,name,price,stock,details,delivery_eligible
+#     D6,drinks,Mocha,3.80,20,Espresso + chocolate + milk,no
+#     B6,books,Dune,10.99,4,Frank Herbert — Science fiction,yes
+#
+#   JSON lines (.jsonl / .ndjson), one product per line:
+#     {"id": "B6", "category": "books", "name": "Dune", "price": "10.99", "stock": 4,
+#      "details": "Frank Herbert — Science fiction", "delivery_eligible": true}
+#
+#   JSON (.json), either JSON lines like above or one array of those objects:
+#     [{"id": "B6", ...}, {"id": "B7", ...}]
+#     (an array is read in one go, so for very big catalogues use JSON lines)
+#
+# prices are in pounds like the employee screen asks for ("3.80"),
+# details and delivery_eligible are optional.
+#
+# the file is read one row at a time and each row goes straight into the
+# inventory, so a 1,000,000 row file needs no more memory to read than a 10 row
+# one. every row is checked by the same rules as adding a product by hand
+# (OrderService.add_product); a bad row is written down and skipped, the
+# rest of the file still goes in.
+#
+# run:
+#   python catalogue.py products.csv                   (into papercup.db)
+#   python catalogue.py products.jsonl --replace       (overwrite existing ids)
+#   python catalogue.py products.csv --db other.db
+
+import argparse
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from models import INVENTORY_DB, LARGEST, open_inventory, to_pence
+from orders import OrderError, OrderService
+
+FIELDS = ("id", "category", "name", "price", "stock", "details", "delivery_eligible")
+REQUIRED = ("id", "category", "name", "price", "stock")
+
+# how many bad rows we keep the details of (the rest are only counted)
+KEEP_ERRORS = 100
+
+_YES = {"y", "yes", "true", "1"}
+_NO = {"n", "no", "false", "0", ""}
+
+
+@dataclass
+class RowError:
+    line: int          # line number in the file (1 = first line), or position in a JSON array
+    pid: str           # the id on that row ("" if there wasn't one)
+    message: str
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    # the first KEEP_ERRORS problems, in file order
+    errors: List[RowError] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return self.imported + self.failed
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# =========================
+# READING FILES (one row at a time)
+# =========================
+
+def read_csv(path: str) -> Iterator[Tuple[int, dict]]:
+    # gives back (line number, {field: text}) for every row
+    # utf-8-sig = ignore the invisible marker Excel puts at the start of a file
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [name for name in REQUIRED if name not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"{path}: header is missing {', '.join(missing)}")
+        for record in reader:
+            # reader.line_num is the line the row ended on (a quoted field can span lines)
+            yield reader.line_num, record
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[int, object]]:
+    # gives back (line number, parsed object) for every non-blank line
+    # a line that isn't valid JSON is passed on as an OrderError so it is
+    # reported like any other bad row
+    with open(path, encoding="utf-8-sig") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, OrderError("Not valid JSON.")
+
+
+def read_json(path: str) -> Iterator[Tuple[int, object]]:
+    # a .json file: a JSON array of products (gives back (position in the array, object)),
+    # or JSON lines with a .json name
+    with open(path, encoding="utf-8-sig") as f:
+        start = f.read(4096).lstrip()
+    if not start.startswith("["):
+        yield from read_jsonl(path)
+        return
+    with open(path, encoding="utf-8-sig") as f:
+        try:
+            records = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: not valid JSON ({e})") from None
+    if not isinstance(records, list):
+        raise ValueError(f"{path}: expected an array of products")
+    yield from enumerate(records, start=1)
+
+
+def read_catalogue(path: str) -> Iterator[Tuple[int, object]]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return read_csv(path)
+    if ext in (".jsonl", ".ndjson"):
+        return read_jsonl(path)
+    if ext == ".json":
+        return read_json(path)
+    raise ValueError(f"{path}: don't know how to read '{ext}' files (use .csv or .jsonl)")
+
+
+# =========================
+# CHECKING AND ADDING ROWS
+# =========================
+
+def _text(record: dict, name: str) -> str:
+    value = record.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def _price(value) -> int:
+    if value is None or str(value).strip() == "":
+        raise OrderError("Price is missing.")
+    try:
+        pence = to_pence(value)
+    except (ValueError, ArithmeticError):
+        raise OrderError(f"Price must be a number like 3.50 (got {value!r}).") from None
+    if pence > LARGEST:
+        raise OrderError(f"Price is too big (got {value!r}).")
+    return pence
+
+
+def _stock(value) -> int:
+    if isinstance(value, bool):
+        raise OrderError(f"Stock must be a whole number (got {value!r}).")
+    if isinstance(value, int):
+        stock = value
+    else:
+        text = "" if value is None else str(value).strip()
+        try:
+            stock = int(text)
+        except ValueError:
+            raise OrderError(f"Stock must be a whole number (got {value!r}).") from None
+    if stock > LARGEST:
+        raise OrderError(f"Stock is too big (got {value!r}).")
+    return stock
+
+
+def _yes_no(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = "" if value is None else str(value).strip().lower()
+    if text in _YES:
+        return True
+    if text in _NO:
+        return False
+    raise OrderError(f"delivery_eligible must be yes or no (got {value!r}).")
+
+
+def row_fields(record) -> tuple:
+    # one file row -> the arguments for OrderService.add_product
+    # (raises OrderError with a message if the row can't be read)
+    if isinstance(record, OrderError):
+        raise record
+    if not isinstance(record, dict):
+        raise OrderError("Each row must be an object with product fields.")
+    for name in REQUIRED:
+        if name not in record:
+            raise OrderError(f"Missing {name}.")
+    return (
+        _text(record, "id"),
+        _text(record, "category"),
+        _text(record, "name"),
+        _price(record.get("price")),
+        _stock(record.get("stock")),
+        _text(record, "details"),
+        _yes_no(record.get("delivery_eligible")),
+    )
+
+
+def import_rows(service: OrderService, rows: Iterable[Tuple[int, object]],
+                replace: bool = False, keep_errors: int = KEEP_ERRORS) -> ImportReport:
+    # adds every row through the order service (so it gets the same checks as
+    # the employee screen and shows up in search), skipping the bad ones
+    report = ImportReport()
+    add_product = service.add_product
+    start = time.perf_counter()
+    for line, record in rows:
+        try:
+            add_product(*row_fields(record), replace=replace)
+        except OrderError as e:
+            report.failed += 1
+            if len(report.errors) < keep_errors:
+                pid = _text(record, "id") if isinstance(record, dict) else ""
+                report.errors.append(RowError(line, pid, str(e)))
+            continue
+        report.imported += 1
+
+    # a saved inventory writes the last batch of new rows now
+    # (a plain dict or a ColumnarInventory has nothing to save)
+    flush = getattr(service.inventory, "flush", None)
+    if flush is not None:
+        flush()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def import_catalogue(service: OrderService, path: str, replace: bool = False,
+                     keep_errors: int = KEEP_ERRORS) -> ImportReport:
+    # reads a .csv or .jsonl catalogue file into the service's inventory
+    return import_rows(service, read_catalogue(path), replace=replace, keep_errors=keep_errors)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Import a CSV or JSON-lines catalogue into the PaperCup inventory")
+    parser.add_argument("path", help="catalogue file (.csv, .jsonl or .json)")
+    parser.add_argument("--db", default=INVENTORY_DB, help=f"inventory file to import into (default: {INVENTORY_DB})")
+    parser.add_argument("--replace", action="store_true", help="overwrite products whose id already exists")
+    parser.add_argument("--show-errors", type=int, default=20, metavar="N",
+                        help="print the first N bad rows (default: 20)")
+    args = parser.parse_args(argv)
+
+    inventory = open_inventory(args.db)
+    try:
+        try:
+            report = import_catalogue(OrderService(inventory), args.path, replace=args.replace,
+                                      keep_errors=args.show_errors)
+        except (OSError, ValueError) as e:
+            parser.exit(1, f"error: {e}\n")
+    finally:
+        inventory.close()
+
+    for error in report.errors:
+        print(f"line {error.line}: {error.pid or '(no id)'}: {error.message}")
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors):,} more")
+    print(f"imported: {report.imported:,}")
+    print(f"failed:   {report.failed:,}")
+    print(f"time:     {report.seconds:.2f}s ({report.rows_per_sec:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# a feed of inventory changes that other parts of the shop can subscribe to
+# (the GUI product list, the search index, anything that keeps its own copy
+# of product data) so they can update just what changed instead of rescanning
+#
+#   feed = inventory.changes()           # one feed per inventory, made on first use
+#   sub = feed.subscribe()
+#   ... tills sell things, employees change stock ...
+#   for change in sub.drain():           # everything since the last drain
+#       change.pid, change.kinds, change.product
+#
+# bursts are coalesced: a subscriber holds at most ONE pending change per
+# product, so a checkout that sells 3 flat whites, or 500 deliveries to the same
+# shelf, is one change when it is drained (change.count says how many it was).
+# change.product is read at drain time, so it is always the latest state
+# (None = the product was deleted).
+#
+# a subscriber that needs every step, not just the latest state (a product that
+# went 6 -> 0 -> 6 between two drains did run out), passes keep=: keep(pid, product)
+# is called for each change as it is published, on the thread that made it,
+# and whatever it gives back (None = nothing) comes out in order as change.kept.
+#
+# queues are bounded: if a subscriber falls behind by more than max_pending
+# different products, its queue is dropped and the next drain gives one
+# RESET change instead ("too much changed, look at everything again").
+#
+# kinds of change:
+#   "added"     a new id
+#   "replaced"  a product was overwritten (name, price or details may be different)
+#   "removed"   deleted
+#   "stock"     set_stock / adjust_stock (selling, deliveries, cancelled orders)
+#   "category"  moved to another category
+#   "reset"     everything changed (inventory.clear(), or the queue overflowed)
+#
+# publishing runs on whichever thread made the change and only does a dict
+# update per subscriber; with no subscribers it costs one attribute check.
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+KINDS = ("added", "replaced", "removed", "stock", "category", "reset")
+RESET = "reset"
+
+# how many different products a subscriber can have waiting before it is reset
+MAX_PENDING = 10_000
+
+
+@dataclass(frozen=True)
+class Change:
+    pid: Optional[str]           # None for a reset
+    kinds: FrozenSet[str]        # every kind of change since the last drain
+    product: object = None       # the product as it is now (None = deleted, or a reset)
+    count: int = 1               # how many changes were coalesced into this one
+    kept: tuple = ()             # what the subscriber's keep() gave back for each of them
+
+    @property
+    def reset(self) -> bool:
+        return RESET in self.kinds
+
+
+class Subscription:
+    # one subscriber's queue of pending changes
+
+    def __init__(self, feed: "ChangeFeed", kinds: Optional[Iterable[str]] = None,
+                 max_pending: int = MAX_PENDING, wakeup: Optional[Callable[[], None]] = None,
+                 keep: Optional[Callable[[str, object], object]] = None):
+        # kinds = only queue these kinds of change (None = all of them), a reset is always queued
+        # wakeup() is called when the queue goes from empty to not empty (once per burst,
+        # not once per change) on the thread that made the change
+        # keep(pid, product) is called for every change (see the top of the file),
+        # it should be quick, the till that made the change waits for it
+        self.feed = feed
+        self.kinds: Optional[FrozenSet[str]] = None
+        if kinds is not None:
+            self.kinds = frozenset(kinds) | {RESET}
+            unknown = self.kinds.difference(KINDS)
+            if unknown:
+                raise ValueError(f"unknown kind of change: {', '.join(sorted(unknown))}")
+        self.max_pending = max_pending
+        self.wakeup = wakeup
+        self.keep = keep
+        self.closed = False
+        # pid -> [set of kinds, count, list of kept values] (dicts keep the order the products first changed)
+        self._pending: Dict[str, list] = {}
+        self._reset = False
+        # publish takes the plain lock (quicker than going through the Condition),
+        # wait() uses the Condition built on the same lock
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        # totals, for benchmarks and reports
+        self.published = 0       # changes queued (before coalescing)
+        self.delivered = 0       # changes handed out by drain()
+        self.overflows = 0       # times the queue was dropped for a reset
+
+    def __len__(self) -> int:
+        return len(self._pending) + self._reset
+
+    def _publish(self, pid: Optional[str], kind: str):
+        if self.kinds is not None and kind not in self.kinds:
+            return
+        kept = None
+        if self.keep is not None and pid is not None:
+            kept = self.keep(pid, self.feed.current(pid))
+        with self._lock:
+            was_empty = not self._pending and not self._reset
+            self.published += 1
+            if pid is None or self._reset:
+                # a reset replaces everything waiting (and swallows changes until it is drained,
+                # kept values too: keep() has already seen them, but they aren't handed out)
+                self._reset = True
+                self._pending.clear()
+            else:
+                entry = self._pending.get(pid)
+                if entry is not None:
+                    entry[0].add(kind)
+                    entry[1] += 1
+                    if kept is not None:
+                        entry[2].append(kept)
+                elif len(self._pending) >= self.max_pending:
+                    self.overflows += 1
+                    self._reset = True
+                    self._pending.clear()
+                else:
+                    self._pending[pid] = [{kind}, 1, [] if kept is None else [kept]]
+            if was_empty:
+                self._ready.notify_all()
+        if was_empty and self.wakeup is not None:
+            self.wakeup()
+
+    def drain(self) -> List[Change]:
+        # takes every pending change (oldest first), never waits
+        with self._lock:
+            pending, reset = self._pending, self._reset
+            self._pending, self._reset = {}, False
+        if reset:
+            self.delivered += 1
+            return [Change(None, frozenset((RESET,)))]
+        current = self.feed.current
+        changes = [Change(pid, frozenset(kinds), current(pid), count, tuple(kept))
+                   for pid, (kinds, count, kept) in pending.items()]
+        self.delivered += len(changes)
+        return changes
+
+    def wait(self, timeout: Optional[float] = None) -> List[Change]:
+        # like drain(), but waits up to timeout seconds for something to arrive
+        # (gives back [] on a timeout or once the subscription is closed)
+        with self._ready:
+            if not self._pending and not self._reset and not self.closed:
+                self._ready.wait(timeout)
+        return self.drain()
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+
+    def __init__(self, current: Callable[[str], object]):
+        # current(pid) gives back the product as it is now (or None),
+        # without loading anything (the inventory passes a plain dict lookup)
+        self.current = current
+        self._lock = threading.Lock()
+        # swapped for a new tuple on (un)subscribe, so publish never needs the lock
+        self._subscribers: tuple = ()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, kinds: Optional[Iterable[str]] = None, max_pending: int = MAX_PENDING,
+                  wakeup: Optional[Callable[[], None]] = None,
+                  keep: Optional[Callable[[str, object], object]] = None) -> Subscription:
+        sub = Subscription(self, kinds, max_pending, wakeup, keep)
+        with self._lock:
+            self._subscribers = self._subscribers + (sub,)
+        return sub
+
+    def listen(self, callback: Callable[[List[Change]], None], kinds: Optional[Iterable[str]] = None,
+               max_pending: int = MAX_PENDING, name: str = "change-listener") -> Subscription:
+        # calls callback(changes) on its own thread whenever something changed.
+        # anything that changes while the callback runs is coalesced into the next call,
+        # so a slow callback gets fewer, bigger batches rather than falling behind
+        sub = self.subscribe(kinds, max_pending)
+
+        def loop():
+            while not sub.closed:
+                changes = sub.wait(0.5)
+                if changes:
+                    callback(changes)
+
+        threading.Thread(target=loop, name=name, daemon=True).start()
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not sub)
+        with sub._ready:
+            sub.closed = True
+            sub._ready.notify_all()
+
+    def publish(self, pid: Optional[str], kind: str):
+        # pid None = everything changed
+        if pid is None:
+            kind = RESET
+        for sub in self._subscribers:
+            sub._publish(pid, kind)
@@ -0,0 +1,311 @@
+# a memory-saving inventory for very big catalogues (think 500k books)
+#
+# a normal Inventory keeps one Product object per item, and every Product has its
+# own __dict__ plus its own copy of strings like "books"
+# ColumnarInventory keeps each field in its own column instead:
+#   prices and stock -> array of whole numbers (8 bytes each, no objects)
+#   category         -> 1 byte per product, pointing at one shared "books" string
+#   delivery flag    -> 1 byte per product
+#   name / details   -> plain lists of strings
+#                       (or details read from a file only when asked for, see details.py)
+# a product is "row number N" in every column
+#
+# it still acts like Dict[str, Product]: inventory["B1"] gives back a ProductView,
+# which looks and behaves like a Product (p.name, p.price, p.stock -= 1 ...)
+# but is only made when you ask for it and just points at the row.
+# it has the same extras as Inventory too (in_category, set_stock, adjust_stock,
+# bulk, changes ...) so the order service and the tills can run on it
+
+from array import array
+from collections.abc import MutableMapping, Sequence
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from changefeed import ChangeFeed
+
+
+class ProductView:
+    # a tiny stand-in for a Product that reads/writes straight into the columns
+    # __slots__ means no __dict__, so each view is just two pointers
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ColumnarInventory", row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def id(self) -> str:
+        return self._store._ids[self._row]
+
+    @property
+    def category(self) -> str:
+        return self._store._categories[self._store._category_codes[self._row]]
+
+    @category.setter
+    def category(self, value: str):
+        # goes through the store so the category lists stay correct
+        self._store.set_category(self.id, value)
+
+    @property
+    def name(self) -> str:
+        return self._store._names[self._row]
+
+    @name.setter
+    def name(self, value: str):
+        self._store._names[self._row] = value
+
+    @property
+    def price(self) -> int:
+        return self._store._prices[self._row]
+
+    @price.setter
+    def price(self, value: int):
+        self._store._prices[self._row] = value
+
+    @property
+    def stock(self) -> int:
+        return self._store._stock[self._row]
+
+    @stock.setter
+    def stock(self, value: int):
+        self._store._stock[self._row] = value
+
+    @property
+    def details(self) -> str:
+        return self._store._details[self._row]
+
+    @details.setter
+    def details(self, value: str):
+        self._store._details[self._row] = value
+
+    @property
+    def delivery_eligible(self) -> bool:
+        return bool(self._store._delivery[self._row])
+
+    @delivery_eligible.setter
+    def delivery_eligible(self, value: bool):
+        self._store._delivery[self._row] = 1 if value else 0
+
+    # two views are "the same product" if they point at the same row
+    def __eq__(self, other):
+        if not isinstance(other, ProductView):
+            return NotImplemented
+        return self._store is other._store and self._row == other._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    def __repr__(self):
+        return (f"ProductView(id={self.id!r}, category={self.category!r}, name={self.name!r}, "
+                f"price={self.price!r}, stock={self.stock!r}, details={self.details!r}, "
+                f"delivery_eligible={self.delivery_eligible!r})")
+
+
+class CategoryView(Sequence):
+    # the products in one category, in the order they were added
+    # it reads the live row list, so it never goes out of date
+    __slots__ = ("_store", "_rows")
+
+    def __init__(self, store: "ColumnarInventory", rows: array):
+        self._store = store
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ProductView(self._store, row) for row in self._rows[index]]
+        return ProductView(self._store, self._rows[index])
+
+
+class ColumnarInventory(MutableMapping):
+    # product id -> ProductView, with the data itself kept in columns
+
+    def __init__(self, products: Optional[Dict[str, object]] = None):
+        # id -> row number (python dicts remember the order things were added)
+        self._rows: Dict[str, int] = {}
+
+        # the columns (row N in each one is the same product)
+        self._ids: List[Optional[str]] = []      # None = deleted row
+        self._names: List[str] = []
+        self._details: List[str] = []
+        self._prices = array("q")               # pence
+        self._stock = array("q")
+        self._category_codes = array("B")       # index into self._categories
+        self._delivery = bytearray()            # 1 = delivery eligible
+
+        # every category string is stored once, rows just hold its number
+        self._categories: List[str] = []
+        self._category_lookup: Dict[str, int] = {}
+
+        # category number -> row numbers in that category
+        self._by_category: Dict[int, array] = {}
+        self._views: Dict[int, CategoryView] = {}
+
+        # the change feed (see changes()), only made if someone subscribes
+        self._feed: Optional[ChangeFeed] = None
+
+        if products:
+            self.update(products)
+
+    # ----- adding rows -----
+
+    def _category_code(self, category: str) -> int:
+        code = self._category_lookup.get(category)
+        if code is None:
+            code = len(self._categories)
+            if code > 255:
+                raise ValueError("ColumnarInventory supports at most 256 categories")
+            self._categories.append(category)
+            self._category_lookup[category] = code
+            self._by_category[code] = array("l")
+        return code
+
+    def add(self, pid: str, category: str, name: str, price: int, stock: int,
+            details: str, delivery_eligible: bool = False):
+        # adds a product straight from its fields (no Product object needed)
+        # this is the fast way to load a big catalogue
+        if pid in self._rows:
+            self._overwrite(self._rows[pid], category, name, price, stock, details, delivery_eligible)
+            self._changed(pid, "replaced")
+            return
+
+        row = len(self._ids)
+        code = self._category_code(category)
+        self._ids.append(pid)
+        self._names.append(name)
+        self._details.append(details)
+        self._prices.append(price)
+        self._stock.append(stock)
+        self._category_codes.append(code)
+        self._delivery.append(1 if delivery_eligible else 0)
+        self._by_category[code].append(row)
+        self._rows[pid] = row
+        self._changed(pid, "added")
+
+    def _overwrite(self, row: int, category: str, name: str, price: int, stock: int,
+                   details: str, delivery_eligible: bool):
+        self._names[row] = name
+        self._details[row] = details
+        self._prices[row] = price
+        self._stock[row] = stock
+        self._delivery[row] = 1 if delivery_eligible else 0
+        self._move_row(row, self._category_code(category))
+
+    def _move_row(self, row: int, code: int):
+        old = self._category_codes[row]
+        if old == code:
+            return
+        self._by_category[old].remove(row)
+        self._by_category[code].append(row)
+        self._category_codes[row] = code
+
+    # ----- the dict parts -----
+
+    def __getitem__(self, pid: str) -> ProductView:
+        return ProductView(self, self._rows[pid])
+
+    def __setitem__(self, pid: str, product):
+        # accepts a Product (or anything with the same fields)
+        self.add(pid, product.category, product.name, product.price, product.stock,
+                 product.details, product.delivery_eligible)
+
+    def __delitem__(self, pid: str):
+        # the row is left empty rather than moving other rows around
+        # (moving them would break any ProductView someone is holding)
+        row = self._rows.pop(pid)
+        self._by_category[self._category_codes[row]].remove(row)
+        self._ids[row] = None
+        self._names[row] = ""
+        self._details[row] = ""
+        self._changed(pid, "removed")
+
+    def __contains__(self, pid) -> bool:
+        return pid in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ----- same extras as Inventory -----
+
+    def in_category(self, category: str) -> CategoryView:
+        code = self._category_lookup.get(category)
+        if code is None:
+            return CategoryView(self, array("l"))
+        view = self._views.get(code)
+        if view is None:
+            view = self._views[code] = CategoryView(self, self._by_category[code])
+        return view
+
+    def stream(self, category: Optional[str] = None) -> Iterator[ProductView]:
+        # products one at a time (one category, or all of them category by category)
+        for code in [self._category_lookup.get(category)] if category is not None else list(self._by_category):
+            if code is None:
+                return
+            rows = self._by_category[code]
+            i = 0
+            while i < len(rows):
+                yield ProductView(self, rows[i])
+                i += 1
+
+    def set_category(self, pid: str, category: str):
+        row = self._rows[pid]
+        code = self._category_code(category)
+        if self._category_codes[row] != code:
+            self._move_row(row, code)
+            self._changed(pid, "category")
+
+    def set_stock(self, pid: str, stock: int):
+        self._stock[self._rows[pid]] = stock
+        self._changed(pid, "stock")
+
+    def adjust_stock(self, pid: str, delta: int):
+        self._stock[self._rows[pid]] += delta
+        self._changed(pid, "stock")
+
+    def changes(self) -> ChangeFeed:
+        # the feed of changes to this inventory (changefeed.py), made the first time it is asked for
+        if self._feed is None:
+            self._feed = ChangeFeed(self.get)
+        return self._feed
+
+    def _changed(self, pid: Optional[str], kind: str):
+        if self._feed is not None:
+            self._feed.publish(pid, kind)
+
+    @contextmanager
+    def bulk(self):
+        # nothing to batch up, it only lives in memory (same as Inventory.bulk)
+        yield self
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def use_details(self, details: Sequence):
+        # swaps the details column for another one with the same rows
+        # (a DetailsFile, so details stay on disk until someone looks at them)
+        if len(details) != len(self._ids):
+            raise ValueError(f"details has {len(details):,} rows, the inventory has {len(self._ids):,}")
+        self._details = details
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], details: Optional[Sequence] = None) -> "ColumnarInventory":
+        # rows = (id, category, name, price, stock, details, delivery_eligible)
+        # with details given, the rows' own details are not kept (they can be "")
+        # and row N's details come from details[N] instead
+        inventory = cls()
+        if details is None:
+            for row in rows:
+                inventory.add(*row)
+            return inventory
+        for pid, category, name, price, stock, _, delivery_eligible in rows:
+            inventory.add(pid, category, name, price, stock, "", delivery_eligible)
+        inventory.use_details(details)
+        return inventory
@@ -0,0 +1,108 @@
+# bulk stock changes: delivery days and stock takes
+#
+# instead of typing one product id at a time into "Update stock", give a
+# list of changes, one per line:
+#
+#   D1 +24        24 more Flat Whites arrived
+#   F3, -2        two cheese cakes were dropped
+#   B1 =8         stock take: there are exactly 8 Atomic Habits
+#   B2 12         a plain number counts as received (same as +12)
+#   # lines starting with # are ignored
+#
+# (the id and the change can be split by spaces or a comma, so a CSV works too)
+#
+# the whole list is applied together by OrderService.change_stock: if any id is
+# unknown or any product would go below 0 stock (or above LARGEST, too big to
+# save), NOTHING changes and you get a list of the problems to fix first.
+#
+# run:
+#   python deliveries.py delivery.txt                 (into papercup.db)
+#   some_script | python deliveries.py -              (read from stdin)
+#   python deliveries.py delivery.txt --check         (only report problems)
+
+import argparse
+import re
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+from models import INVENTORY_DB, LARGEST, open_inventory
+from orders import OrderService, StockChange, StockReport
+
+_LINE = re.compile(r"^\s*([^\s,]+)\s*[\s,]\s*([+=-]?)\s*(\d+)\s*$")
+
+
+def parse_changes(lines: Iterable[str]) -> Tuple[List[StockChange], List[Tuple[int, str]]]:
+    # gives back (the changes, [(line number, text) of lines that made no sense])
+    changes: List[StockChange] = []
+    bad: List[Tuple[int, str]] = []
+    for line_no, line in enumerate(lines, start=1):
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        match = _LINE.match(text)
+        if match is None:
+            bad.append((line_no, text))
+            continue
+        pid, sign, number = match.groups()
+        amount = int(number)
+        if amount > LARGEST:
+            # (too big to save, better caught here than half way through saving)
+            bad.append((line_no, text))
+            continue
+        if sign == "=":
+            changes.append(StockChange(pid, amount, absolute=True))
+        else:
+            changes.append(StockChange(pid, -amount if sign == "-" else amount))
+    return changes, bad
+
+
+def print_report(report: StockReport, dry_run: bool = False, show: int = 20):
+    for pid in report.unknown[:show]:
+        print(f"unknown id: {pid}")
+    if len(report.unknown) > show:
+        print(f"... and {len(report.unknown) - show:,} more unknown ids")
+    for pid, stock in report.negative[:show]:
+        print(f"would go negative: {pid} (stock {stock})")
+    if len(report.negative) > show:
+        print(f"... and {len(report.negative) - show:,} more going negative")
+    for pid, stock in report.too_large[:show]:
+        print(f"too much stock to save: {pid} (stock {stock})")
+    if len(report.too_large) > show:
+        print(f"... and {len(report.too_large) - show:,} more with too much stock")
+    if report.ok:
+        print(f"stock {'would change' if dry_run else 'updated'} for {report.applied:,} products")
+    elif not dry_run:
+        print("nothing was changed")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Apply a list of stock changes to the PaperCup inventory")
+    parser.add_argument("path", help="file of changes, or - to read from stdin")
+    parser.add_argument("--db", default=INVENTORY_DB, help=f"inventory file to change (default: {INVENTORY_DB})")
+    parser.add_argument("--check", action="store_true", help="only report problems, don't change anything")
+    args = parser.parse_args(argv)
+
+    if args.path == "-":
+        changes, bad = parse_changes(sys.stdin)
+    else:
+        with open(args.path, encoding="utf-8-sig") as f:
+            changes, bad = parse_changes(f)
+
+    # a line we can't read might have been an important change, so stop before changing anything
+    if bad:
+        for line_no, text in bad:
+            print(f"line {line_no}: can't read {text!r} (expected: ID +N / -N / =N, N up to {LARGEST:,})")
+        parser.exit(1, "nothing was changed\n")
+
+    inventory = open_inventory(args.db)
+    try:
+        report = OrderService(inventory).change_stock(changes, dry_run=args.check)
+    finally:
+        inventory.close()
+    print_report(report, dry_run=args.check)
+    if not report.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
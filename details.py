@@ -0,0 +1,152 @@
+# product details (ingredients, author, the blurb on the back of a book) kept
+# on disk instead of in memory
+#
+# details are only ever read on the "View additional details?" screen, but in
+# a big book catalogue with long descriptions they are most of the memory the
+# catalogue takes, and most of the time spent loading it at startup.
+# a DetailsFile keeps them in two files and reads them through mmap:
+#
+#   details.dat       every product's details one after the other (UTF-8)
+#   details.dat.idx   a generation number, then where each one starts (8 bytes per product)
+#
+# row N's details are the bytes between the N+1th and N+2th offsets, so reading one is
+# an array lookup and a slice of the mapped file (the OS only reads the pages
+# that slice touches, and keeps them around for next time). the last
+# CACHE_SIZE details read are kept as strings too, so a customer going back
+# and forth on the details screen doesn't decode them again.
+#
+# the file is written once (write_details) and never changed in place, only
+# added to (append_details). details changed after that (the employee screen,
+# new products) are kept in memory, and either appended by whoever saves them
+# or written out with everything else by write_details(path, details_file).
+#
+#   write_details("details.dat", texts)            # in row order
+#   inventory = ColumnarInventory.from_rows(rows_without_details, details=DetailsFile("details.dat"))
+#   inventory["B1"].details                        # read from the file when asked for
+#
+# the saved inventory keeps one next to its database (SQLiteBackend.open_details
+# in persistence.py): each product's row says which row of the file its details are
+
+import mmap
+import os
+from array import array
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+# how many details are kept decoded (the most recently read ones)
+CACHE_SIZE = 256
+
+
+def write_details(path: str, texts: Iterable[str], generation: int = 0) -> int:
+    # writes every text (row 0 first) to path and its index to path.idx,
+    # gives back how many there were. generation is kept with it (see DetailsFile.generation)
+    # both are written to temporary files and renamed, so a crash never leaves half a file
+    # (named after the process, two programs making the same file don't write over each other)
+    offsets = array("q", [generation, 0])
+    end = 0
+    with open(f"{path}.{os.getpid()}.tmp", "wb") as data:
+        for text in texts:
+            blob = text.encode("utf-8")
+            data.write(blob)
+            end += len(blob)
+            offsets.append(end)
+    with open(f"{path}.idx.{os.getpid()}.tmp", "wb") as index:
+        offsets.tofile(index)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    os.replace(f"{path}.idx.{os.getpid()}.tmp", f"{path}.idx")
+    return len(offsets) - 2
+
+
+def append_details(path: str, texts: List[str]) -> int:
+    # adds texts to the end of a file write_details made, gives back the row number of the first.
+    # only one writer at a time (SQLiteBackend appends holding the database's write lock).
+    # DetailsFiles already open don't see the new rows, their len() is what it was
+    with open(f"{path}.idx", "r+b") as index, open(path, "r+b") as data:
+        size = index.seek(0, os.SEEK_END)
+        if size % 8 or size < 16:
+            raise ValueError(f"{path}.idx is broken")
+        index.seek(-8, os.SEEK_END)
+        end = array("q", index.read(8))[0]
+        # (anything past the last offset is from an append that crashed half way)
+        data.truncate(end)
+        data.seek(end)
+        offsets = array("q")
+        for text in texts:
+            blob = text.encode("utf-8")
+            data.write(blob)
+            end += len(blob)
+            offsets.append(end)
+        # the details first, then the index that points at them
+        data.flush()
+        index.seek(0, os.SEEK_END)
+        offsets.tofile(index)
+    return size // 8 - 2
+
+
+class DetailsFile(Sequence):
+    # row number -> details text, read from the file when asked for.
+    # it works like the plain list of strings ColumnarInventory keeps otherwise
+    # (details[row], details[row] = text, details.append(text))
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE):
+        self.path = path
+        self._offsets = array("q")
+        with open(f"{path}.idx", "rb") as index:
+            self._offsets.frombytes(index.read())
+        if not self._offsets:
+            raise ValueError(f"{path}.idx is empty")
+        # whatever the writer wanted to tell this file's readers apart by
+        # (SQLiteBackend counts the times it has made the file from scratch)
+        self.generation = self._offsets[0]
+        self._count = max(len(self._offsets) - 2, 0)
+        with open(path, "rb") as f:
+            # (mmap can't map an empty file, and there is nothing to read anyway)
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # (more data than the index says is fine, it's an append that crashed half way)
+        if len(self._offsets) < 2 or size < self._offsets[-1]:
+            self.close()
+            raise ValueError(f"{path} doesn't match its index (was it only half written?)")
+        # details changed since the file was written (row -> text), and rows added after it
+        self._changed: Dict[int, str] = {}
+        self._added: List[str] = []
+        self._read = lru_cache(maxsize=cache_size)(self._decode)
+
+    def _decode(self, row: int) -> str:
+        # (offsets[0] is the version, row N starts at offsets[N + 1])
+        return self._data[self._offsets[row + 1]:self._offsets[row + 2]].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._count + len(self._added)
+
+    def __getitem__(self, row: int) -> str:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        if row >= self._count:
+            return self._added[row - self._count]
+        text = self._changed.get(row)
+        return self._read(row) if text is None else text
+
+    def __setitem__(self, row: int, text: str):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        if row >= self._count:
+            self._added[row - self._count] = text
+        else:
+            self._changed[row] = text
+
+    def append(self, text: str):
+        self._added.append(text)
+
+    def cache_info(self):
+        return self._read.cache_info()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
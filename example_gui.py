@@ -1,52 +1,249 @@
+import argparse
+import time
 import tkinter as tk
 from tkinter import messagebox, simpledialog
-from dataclasses import dataclass
-from typing import Dict, List
-
-TEAM_NAME = "PaperCup"
-EMPLOYEE_PASSWORD = "password"
-
-
-# ---------- Data Models ----------
-@dataclass
-class Product:
-    id: str
-    category: str
-    name: str
-    price: float
-    stock: int
-    details: str
-    delivery_eligible: bool = False
+from typing import Dict, List, Optional, Sequence, Set
 
+from changefeed import Change
+from gui_worker import StallMonitor, UIBridge
+from models import Inventory, Product, money, percent_of
+from orders import EMPLOYEE_DISCOUNT_PERCENT, EMPLOYEE_PASSWORD, OrderService
+from reservations import OutOfStock
 
-@dataclass
-class BasketItem:
-    product_id: str
-    name: str
-    unit_price: float
-    qty: int
+TEAM_NAME = "PaperCup"
 
 
 # ---------- Inventory ----------
 def seed_inventory() -> Dict[str, Product]:
-    return {
-        "D1": Product("D1", "drinks", "Flat White", 3.60, 30, "Espresso + milk"),
-        "D2": Product("D2", "drinks", "Matcha Latte", 4.10, 20, "Matcha + milk"),
-        "F1": Product("F1", "food", "Brownie", 2.90, 15, "Chocolate brownie"),
-        "F2": Product("F2", "food", "Carrot Cake", 3.40, 10, "Carrot & cinnamon"),
-        "B1": Product("B1", "books", "Atomic Habits", 12.99, 8, "James Clear", True),
-        "B2": Product("B2", "books", "Deep Work", 11.50, 5, "Cal Newport", True),
-    }
+    return Inventory({
+        "D1": Product("D1", "drinks", "Flat White", 360, 30, "Espresso + milk"),
+        "D2": Product("D2", "drinks", "Matcha Latte", 410, 20, "Matcha + milk"),
+        "F1": Product("F1", "food", "Brownie", 290, 15, "Chocolate brownie"),
+        "F2": Product("F2", "food", "Carrot Cake", 340, 10, "Carrot & cinnamon"),
+        "B1": Product("B1", "books", "Atomic Habits", 1299, 8, "James Clear", True),
+        "B2": Product("B2", "books", "Deep Work", 1150, 5, "Cal Newport", True),
+    })
+
+
+# ---------- Product list ----------
+class ProductList(tk.Frame):
+    # a list that can hold any number of products without freezing:
+    # the Listbox only ever has the rows you can see (the rest are just
+    # a Python list), and when the inventory's change feed says a product
+    # changed we redraw that one row instead of the whole list
+
+    def __init__(self, master, inventory: Inventory, rows: int = 12, width: int = 50, notify=None):
+        # notify(func) gets the change over to the Tk thread if the inventory
+        # is changed on a worker (UIBridge.call_soon does that)
+        super().__init__(master)
+        self.inventory = inventory
+        self.rows = rows
+
+        self.listbox = tk.Listbox(self, width=width, height=rows, activestyle="none", exportselection=False)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-1, "units"))   # linux wheel up
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(1, "units"))    # linux wheel down
+        self.listbox.bind("<Up>", lambda e: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda e: self._move_selection(1))
+        self.listbox.bind("<Prior>", lambda e: self.scroll(-1, "pages"))
+        self.listbox.bind("<Next>", lambda e: self.scroll(1, "pages"))
+
+        self.category: Optional[str] = None
+        self.products: Sequence[Product] = []
+        self.top = 0                           # index of the first visible row
+        # the selected product's id. kept here, not read from the Listbox: the Listbox
+        # only has the visible rows, so scrolling the selection away clears it there
+        self.selected: Optional[str] = None
+        # Listbox row -> product id, kept in step with what is drawn, so a click
+        # turns straight into a product id (no reading the row's text back)
+        self.row_ids: List[str] = []
+        self._count = 0                        # len(self.products) when we last drew
+
+        # changes waiting to be drawn. the feed holds them (one per product) and
+        # wakes us once per burst, then we draw when Tk is idle, so a checkout
+        # that changes 10 products only redraws once
+        self._notify = notify
+        self._pending: Set[str] = set()
+        self._reload = False
+        self._scheduled = False
+        self._changes = inventory.changes().subscribe(wakeup=self._wake)
+
+    @staticmethod
+    def row_text(p: Product) -> str:
+        return f"{p.id} | {p.name} | {money(p.price)} | stock: {p.stock}"
+
+    # ----- what to show -----
+
+    def show(self, category: str, products: Sequence[Product]):
+        self.category = category
+        self.products = products
+        self.top = 0
+        self.selected = None
+        self._pending.clear()
+        self._render()
+
+    def selected_product(self) -> Optional[Product]:
+        index = self._selected_index()
+        return None if index is None else self.products[index]
+
+    def selected_id(self) -> Optional[str]:
+        return self.selected
+
+    def _selected_index(self) -> Optional[int]:
+        # where the selected product is in self.products (the rows on screen are checked first)
+        if self.selected is None:
+            return None
+        if self.selected in self.row_ids:
+            index = self.top + self.row_ids.index(self.selected)
+            if index < len(self.products) and self.products[index].id == self.selected:
+                return index
+        return next((i for i, p in enumerate(self.products) if p.id == self.selected), None)
+
+    # ----- drawing -----
+
+    def _render(self):
+        # puts just the visible slice of products into the Listbox
+        self.top = max(0, min(self.top, len(self.products) - self.rows))
+        visible = self.products[self.top:self.top + self.rows]
+        self.row_ids = [p.id for p in visible]
+        self._count = len(self.products)
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *(self.row_text(p) for p in visible))
+        self._show_selection()
+        self._update_scrollbar()
+
+    def _show_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected in self.row_ids:
+            self.listbox.selection_set(self.row_ids.index(self.selected))
+
+    def _update_scrollbar(self):
+        total = len(self.products)
+        if total <= self.rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.rows) / total)
+
+    def _redraw_row(self, index: int):
+        # swaps one visible row for its new text
+        row = index - self.top
+        if 0 <= row < len(self.row_ids) and index < len(self.products):
+            product = self.products[index]
+            self.row_ids[row] = product.id
+            self.listbox.delete(row)
+            self.listbox.insert(row, self.row_text(product))
+            if product.id == self.selected:
+                self.listbox.selection_set(row)
+
+    # ----- scrolling + selection -----
+
+    def scroll(self, amount: int, what: str = "units"):
+        step = self.rows if what == "pages" else 1
+        self.scroll_to(self.top + amount * step)
+        return "break"
+
+    def scroll_to(self, top: int):
+        top = max(0, min(top, len(self.products) - self.rows))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.products)))
+        elif action == "scroll":
+            self.scroll(int(args[0]), args[1])
+
+    def _on_select(self, _event=None):
+        rows = self.listbox.curselection()
+        if rows and rows[0] < len(self.row_ids):
+            self.selected = self.row_ids[rows[0]]
+
+    def _move_selection(self, step: int):
+        if not self.products:
+            return "break"
+        index = self._selected_index()
+        if index is None:
+            index = self.top   # start from the first row on screen
+        else:
+            index = max(0, min(index + step, len(self.products) - 1))
+        self.selected = self.products[index].id
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.rows:
+            self.scroll_to(index - self.rows + 1)
+        self._show_selection()
+        return "break"
+
+    # ----- inventory changes -----
+
+    def _wake(self):
+        # (any thread) the first change of a burst has arrived
+        if self._notify is None:
+            self._schedule()
+        else:
+            self._notify(self._schedule)
+
+    def _schedule(self):
+        # (always on the Tk thread, see notify above)
+        if not self._scheduled:
+            self._scheduled = True
+            self.after_idle(self._apply_changes)
+
+    def _on_change(self, change: Change):
+        # only the visible rows matter, so this never looks through the whole category
+        if change.reset:
+            self._reload = True
+        elif change.pid in self.row_ids:
+            product = change.product
+            if product is None or product.category != self.category:
+                self._reload = True     # it left this category
+            else:
+                self._pending.add(change.pid)
+        elif len(self.products) != self._count:
+            self._reload = True         # something off screen joined or left this category
+
+    def _apply_changes(self):
+        self._scheduled = False
+        for change in self._changes.drain():
+            self._on_change(change)
+        if self._reload:
+            self._reload = False
+            self._pending.clear()
+            if self.category is not None:
+                self.products = self.inventory.in_category(self.category)
+            # (the selection follows the product wherever it moved, unless it left the list)
+            if self._selected_index() is None:
+                self.selected = None
+            self._render()
+            return
+        for pid in self._pending:
+            if pid in self.row_ids:
+                self._redraw_row(self.top + self.row_ids.index(pid))
+        self._pending.clear()
 
 
 # ---------- GUI App ----------
 class BrewBoundApp:
-    def __init__(self, root):
+    def __init__(self, root, service: Optional[OrderService] = None, background: bool = True):
         self.root = root
         self.root.title(TEAM_NAME)
 
-        self.inventory = seed_inventory()
-        self.basket: List[BasketItem] = []
+        self.service = service or OrderService(seed_inventory())
+        self.inventory = self.service.inventory
+        self.order = self.service.new_order()
+        self.basket = self.order.basket
+
+        # anything that might be slow (reserving stock, placing the order, loading
+        # a category from disk) runs on a worker thread, the results come back here.
+        # background=False runs it all on the Tk thread like before
+        self.bridge = UIBridge(root, inline=not background)
 
         self.category = None
 
@@ -68,33 +265,62 @@ class BrewBoundApp:
                 command=lambda c=cat: self.show_category(c)
             ).pack(side=tk.LEFT, padx=5)
 
-        self.listbox = tk.Listbox(self.root, width=50)
-        self.listbox.pack(pady=10)
+        self.product_list = ProductList(self.root, self.inventory, notify=self.bridge.call_soon)
+        self.product_list.pack(pady=10)
 
         tk.Button(self.root, text="Add to Basket", command=self.add_to_basket).pack()
         tk.Button(self.root, text="View Basket", command=self.view_basket).pack(pady=5)
         tk.Button(self.root, text="Checkout", command=self.checkout).pack(pady=5)
 
+        self.status = tk.Label(self.root, text="", fg="grey")
+        self.status.pack(pady=5)
+
+    # ----- running jobs in the background -----
+
+    def run(self, label: str, func, *args, on_done=None, on_error=None) -> bool:
+        # one job at a time (they all share one basket); gives back False if we're still busy
+        if self.bridge.busy:
+            self.status.config(text="Still working, one moment...")
+            return False
+        self.status.config(text=f"{label}...")
+
+        def done(result):
+            self.status.config(text="")
+            if on_done is not None:
+                on_done(result)
+
+        def failed(error):
+            self.status.config(text="")
+            if on_error is not None:
+                on_error(error)
+            else:
+                messagebox.showerror("Error", str(error))
+
+        self.bridge.submit(func, *args, on_done=done, on_error=failed)
+        return True
+
+    # ----- buttons -----
+
     def show_category(self, category):
-        self.category = category
-        self.listbox.delete(0, tk.END)
+        # stock changes after this redraw themselves (the list subscribes to the inventory's changes)
+        # (browsing a saved inventory may read from disk, so it runs in the background)
+        self.run("Loading", self.service.browse, category, on_done=lambda products: self._show(category, products))
 
-        for p in self.inventory.values():
-            if p.category == category:
-                self.listbox.insert(
-                    tk.END,
-                    f"{p.id} | {p.name} | £{p.price:.2f} | stock: {p.stock}"
-                )
+    def _show(self, category, products):
+        self.category = category
+        self.product_list.show(category, products)
 
     def add_to_basket(self):
-        selection = self.listbox.curselection()
-        if not selection:
+        # the list knows which product id each row is showing
+        pid = self.product_list.selected_id()
+        if pid is None:
             messagebox.showwarning("Select item", "Please select a product.")
             return
 
-        item_text = self.listbox.get(selection[0])
-        pid = item_text.split("|")[0].strip()
-        product = self.inventory[pid]
+        product = self.inventory.get(pid)
+        if product is None:
+            messagebox.showerror("Gone", "Sorry, that product no longer exists.")
+            return
 
         if product.stock <= 0:
             messagebox.showerror("Out of stock", "This item is out of stock.")
@@ -108,56 +334,168 @@ class BrewBoundApp:
         if not qty:
             return
 
-        product.stock -= qty
+        self.buy(pid, qty, on_done=lambda _item: messagebox.showinfo("Added", "Item added to basket!"))
 
-        for item in self.basket:
-            if item.product_id == pid:
-                item.qty += qty
-                break
-        else:
-            self.basket.append(BasketItem(pid, product.name, product.price, qty))
+    def buy(self, pid, qty, on_done=None):
+        # reserves the stock on a worker (another till may have just taken it)
+        def out_of_stock(error):
+            if isinstance(error, OutOfStock):
+                messagebox.showerror("Out of stock", f"Sorry, only {error.available} left now.")
+            else:
+                messagebox.showerror("Error", str(error))
 
-        messagebox.showinfo("Added", "Item added to basket!")
-        self.show_category(self.category)
+        return self.run("Adding to basket", self.service.add, self.order, pid, qty,
+                        on_done=on_done, on_error=out_of_stock)
 
     def view_basket(self):
-        if not self.basket:
-            messagebox.showinfo("Basket", "Basket is empty.")
-            return
-
-        text = ""
-        total = 0
-        for item in self.basket:
-            line = item.unit_price * item.qty
-            total += line
-            text += f"{item.name} x{item.qty} = £{line:.2f}\n"
+        # the text is made on the worker too, so it can't see the basket half way through a change
+        def basket_text():
+            if not self.basket:
+                return None
+            text = ""
+            for item in self.basket:
+                line = item.unit_price * item.qty
+                text += f"{item.name} x{item.qty} = {money(line)}\n"
+            return text + f"\nTotal: {money(self.basket.total)}"
+
+        def show(text):
+            if text is None:
+                messagebox.showinfo("Basket", "Basket is empty.")
+            else:
+                messagebox.showinfo("Your Basket", text)
 
-        text += f"\nTotal: £{total:.2f}"
-        messagebox.showinfo("Your Basket", text)
+        self.run("Reading basket", basket_text, on_done=show)
 
     def checkout(self):
+        if self.bridge.busy:
+            self.status.config(text="Still working, one moment...")
+            return
         if not self.basket:
             messagebox.showwarning("Empty", "Basket is empty.")
             return
 
-        total = sum(i.unit_price * i.qty for i in self.basket)
-
-        if messagebox.askyesno("Employee", "Are you an employee?"):
+        discount = False
+        if not self.order.discount_percent and messagebox.askyesno("Employee", "Are you an employee?"):
             pw = simpledialog.askstring("Password", "Enter password:", show="*")
             if pw == EMPLOYEE_PASSWORD:
-                total *= 0.9
-                messagebox.showinfo("Discount", "10% discount applied!")
+                discount = True
+                messagebox.showinfo("Discount", f"{EMPLOYEE_DISCOUNT_PERCENT}% discount applied!")
             else:
                 messagebox.showerror("Error", "Incorrect password")
 
-        if messagebox.askyesno("Confirm", f"Place order for £{total:.2f}?"):
-            messagebox.showinfo("Success", "Order placed! ☕📚")
-            self.basket.clear()
+        bill = self.order.bill()
+        total = bill.total
+        if discount:
+            total -= percent_of(bill.subtotal - bill.savings, EMPLOYEE_DISCOUNT_PERCENT)
+        if messagebox.askyesno("Confirm", f"Place order for {money(total)}?"):
+            self.place_order(discount, on_done=lambda _receipt: messagebox.showinfo("Success", "Order placed! ☕📚"))
+
+    def place_order(self, discount=False, on_done=None):
+        def place():
+            if discount:
+                self.service.apply_discount(self.order)
+            return self.service.checkout(self.order)
+
+        def failed(error):
+            if isinstance(error, OutOfStock):
+                messagebox.showerror("Out of stock",
+                                     f"Sorry, only {error.available} more of {error.product_id} left now.")
+            else:
+                messagebox.showerror("Error", str(error))
 
+        return self.run("Placing order", place, on_done=on_done, on_error=failed)
 
-# ---------- Run ----------
-if __name__ == "__main__":
+
+def add_sample_products(inventory: Inventory, count: int):
+    # lots of extra products, to try the list with a big catalogue
+    # (python example_gui.py --products 100000)
+    for i in range(count):
+        category = ("drinks", "food", "books")[i % 3]
+        pid = f"X{i}"
+        inventory[pid] = Product(pid, category, f"Sample {category} {i}", 100 + i % 900, i % 40, "")
+
+
+# ---------- UI stall test harness ----------
+class SlowOrderService(OrderService):
+    # pretends the inventory is on a slow disk / another machine
+    def __init__(self, inventory, delay: float):
+        super().__init__(inventory)
+        self.delay = delay
+
+    def browse(self, category):
+        time.sleep(self.delay)
+        return super().browse(category)
+
+    def add(self, order, pid, qty):
+        time.sleep(self.delay)
+        return super().add(order, pid, qty)
+
+    def checkout(self, order):
+        time.sleep(self.delay)
+        return super().checkout(order)
+
+
+def measure_ui_stalls(background: bool, orders: int = 10, delay: float = 0.05) -> Dict[str, float]:
+    # clicks through `orders` orders (browse, add 2 items, checkout) with no one
+    # at the keyboard, while a StallMonitor records how long the Tk loop froze
     root = tk.Tk()
-    app = BrewBoundApp(root)
+    root.withdraw()
+    inventory = seed_inventory()
+    for pid in list(inventory):
+        inventory.set_stock(pid, 1000)
+    app = BrewBoundApp(root, SlowOrderService(inventory, delay), background=background)
+    monitor = StallMonitor(root)
+
+    steps = []
+    for n in range(orders):
+        steps += [lambda: app.run("Loading", app.service.browse, "drinks", on_done=lambda ps: app._show("drinks", ps)),
+                  lambda: app.buy("D1", 1),
+                  lambda: app.buy("B1", 1),
+                  lambda discount=n % 2 == 0: app.place_order(discount)]
+
+    def next_step():
+        # wait for the last job to finish, then start the next one
+        if app.bridge.busy:
+            root.after(1, next_step)
+        elif steps:
+            steps.pop(0)()
+            root.after(1, next_step)
+        else:
+            root.after(50, root.quit)   # a few quiet beats at the end
+
+    start = time.perf_counter()
+    monitor.start()
+    root.after(1, next_step)
     root.mainloop()
+    monitor.stop()
+    app.bridge.shutdown()
+    root.destroy()
+    return {**monitor.report(), "seconds": time.perf_counter() - start}
+
+
+def stall_report(orders: int, delay: float):
+    print(f"UI stalls over {orders} orders, every service call taking {delay * 1000:.0f} ms")
+    print(f"{'mode':<12} {'beats':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'seconds':>8}")
+    for background in (False, True):
+        r = measure_ui_stalls(background, orders, delay)
+        mode = "background" if background else "inline"
+        print(f"{mode:<12} {r['beats']:>6} {r['p50 ms']:>8.1f} {r['p99 ms']:>8.1f} {r['max ms']:>8.1f} {r['seconds']:>8.2f}")
 
+
+# ---------- Run ----------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PaperCup Tk app")
+    parser.add_argument("--products", type=int, default=0, help="add this many sample products")
+    parser.add_argument("--measure-stalls", action="store_true",
+                        help="don't open the app, measure how long the UI loop freezes instead")
+    parser.add_argument("--delay", type=float, default=50, help="(--measure-stalls) ms each service call takes")
+    args = parser.parse_args()
+
+    if args.measure_stalls:
+        stall_report(orders=10, delay=args.delay / 1000)
+    else:
+        root = tk.Tk()
+        app = BrewBoundApp(root)
+        add_sample_products(app.inventory, args.products)
+        root.protocol("WM_DELETE_WINDOW", lambda: (app.bridge.shutdown(), root.destroy()))
+        root.mainloop()
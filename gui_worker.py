@@ -0,0 +1,139 @@
+# runs slow jobs for the Tk app on worker threads, so the window never freezes
+#
+# Tk is not thread safe: only the main thread may touch widgets. so a worker
+# never calls back into Tk itself. it puts the result on a queue, and the main
+# thread checks that queue every few milliseconds (root.after) and runs the
+# callbacks there.
+#
+#   bridge = UIBridge(root)
+#   bridge.submit(service.checkout, order, on_done=show_receipt, on_error=show_problem)
+#
+# StallMonitor measures how long the Tk loop gets stuck: it asks to be woken
+# every few ms and records how late each wake-up was.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+class UIBridge:
+
+    def __init__(self, root, workers: int = 1, poll_ms: int = 10, inline: bool = False):
+        # workers=1 keeps jobs in the order they were submitted (one customer's
+        # basket must not be changed by two jobs at once).
+        # inline=True runs everything straight away on the Tk thread, like before
+        # (handy for comparing with StallMonitor)
+        self.root = root
+        self.poll_ms = poll_ms
+        self.inline = inline
+        self._executor = None if inline else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gui-worker")
+        self._results: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._in_flight = 0
+        self._closed = False
+        if not inline:
+            self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def busy(self) -> bool:
+        # True while a submitted job hasn't had its callback run yet
+        return self._in_flight > 0
+
+    def submit(self, func: Callable, *args, on_done: Optional[Callable] = None,
+               on_error: Optional[Callable[[BaseException], None]] = None) -> Optional[Future]:
+        # runs func(*args) on a worker; on_done(result) / on_error(exception) run on the Tk thread
+        # (without on_error, an exception is passed to Tk's normal error report)
+        if self.inline:
+            try:
+                result = func(*args)
+            except Exception as e:
+                self._finish(None, e, on_done, on_error)
+                return None
+            self._finish(result, None, on_done, on_error)
+            return None
+
+        self._in_flight += 1
+        future = self._executor.submit(func, *args)
+
+        def done(f: Future):
+            # (worker thread) hand the result over to the Tk thread
+            error = f.exception()
+            result = None if error is not None else f.result()
+            self._results.put(lambda: self._finish(result, error, on_done, on_error, counted=True))
+
+        future.add_done_callback(done)
+        return future
+
+    def call_soon(self, func: Callable, *args):
+        # safe from any thread: runs func(*args) on the Tk thread a moment later
+        # (for inventory change notifications that happen on a worker)
+        if self.inline or threading.current_thread() is threading.main_thread():
+            func(*args)
+        else:
+            self._results.put(lambda: func(*args))
+
+    def _finish(self, result, error, on_done, on_error, counted: bool = False):
+        if counted:
+            self._in_flight -= 1
+        if error is not None:
+            if on_error is None:
+                self.root.report_callback_exception(type(error), error, error.__traceback__)
+            else:
+                on_error(error)
+        elif on_done is not None:
+            on_done(result)
+
+    def _poll(self):
+        # (Tk thread) run every callback that is waiting, then check again soon
+        while True:
+            try:
+                callback = self._results.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        if not self._closed:
+            self.root.after(self.poll_ms, self._poll)
+
+    def shutdown(self):
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class StallMonitor:
+    # a heartbeat on the Tk loop: every interval_ms we note how late it ran.
+    # a late heartbeat = the loop was busy = the window was frozen for that long
+
+    def __init__(self, root, interval_ms: int = 5):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.stalls: List[float] = []
+        self._expected = 0.0
+        self._job = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval
+        self._job = self.root.after(int(self.interval * 1000), self._beat)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.stalls.append(max(0.0, now - self._expected))
+        self._expected = now + self.interval
+        self._job = self.root.after(int(self.interval * 1000), self._beat)
+
+    def report(self) -> Dict[str, float]:
+        # stall times in milliseconds
+        values = sorted(self.stalls)
+        if not values:
+            return {"beats": 0, "p50 ms": 0.0, "p99 ms": 0.0, "max ms": 0.0}
+
+        def pct(p: float) -> float:
+            return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000
+
+        return {"beats": len(values), "p50 ms": pct(50), "p99 ms": pct(99), "max ms": values[-1] * 1000}
@@ -0,0 +1,307 @@
+# an append-only journal of every order that was placed
+#
+# each placed order is one line at the end of the file:
+#   <crc32 of the json, 8 hex digits> <the order as json>\n
+# lines are only ever added, never changed, so a crash can at worst leave a
+# half-written last line. the crc lets us spot that (or any damaged line) and skip it.
+#
+# writing to disk is the slow part (fsync waits for the disk to really store it),
+# so with group commit many orders share one write + one fsync: orders are queued,
+# a writer thread writes everything waiting in one go, then wakes up everyone
+# whose order is now safely on disk.
+#
+# run:
+#   python journal.py replay orders.journal          (stock levels = seed - everything sold)
+#   python journal.py replay orders.journal --db rebuilt.db
+#   python journal.py summary orders.journal
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ORDER_JOURNAL = "orders.journal"   # default journal file next to papercup.db
+
+
+def encode_record(record: dict) -> bytes:
+    data = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+def decode_line(line: bytes) -> Optional[dict]:
+    # gives back the record, or None if the line is damaged / only half written
+    if len(line) < 10 or not line.endswith(b"\n") or line[8:9] != b" ":
+        return None
+    data = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(data):
+            return None
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class OrderJournal:
+
+    def __init__(self, path: str, fsync: bool = True, group_commit: bool = True,
+                 max_batch: int = 1024, max_delay: float = 0.0):
+        # fsync=False        -> faster, but the last few orders can be lost if the power goes
+        # group_commit=False -> every order is written + synced by itself
+        # max_batch/max_delay -> how many orders / how long the writer waits to fill a batch.
+        #   max_delay=0 means: take whatever is already waiting. orders that turn up
+        #   while the disk is busy with one batch simply go in the next one
+        self.path = path
+        self.fsync = fsync
+        self.group_commit = group_commit
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        repair_tail(path)
+        last = last_record(path)
+        # so order numbers carry on where the last run stopped
+        self.last_order_id = last.get("order_id", 0) if last else 0
+        self._file = open(path, "ab")
+
+        # sequence numbers: every append gets one, and _durable is the last one on disk
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._next_seq = 0
+        self._durable = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+        self._queue: "queue.Queue[Optional[Tuple[int, bytes]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if group_commit:
+            self._writer = threading.Thread(target=self._write_loop, name="order-journal", daemon=True)
+            self._writer.start()
+
+    def _write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def append(self, record: dict, wait: bool = True):
+        # adds one order. with wait=True we only return once it is safely written
+        # (raises ValueError once the journal is closed, rather than waiting for
+        # a writer that has stopped)
+        line = encode_record(record)
+        if not self.group_commit:
+            with self._lock:
+                self._check_open()
+                self._write(line)
+            return
+
+        with self._lock:
+            self._check_open()
+            self._next_seq += 1
+            seq = self._next_seq
+            self._queue.put((seq, line))
+        if wait:
+            self.wait_for(seq)
+
+    def _check_open(self):
+        # (call with self._lock held)
+        if self._closed:
+            raise ValueError(f"order journal {self.path} is closed")
+        # (the writer has stopped, this order would never be written)
+        if self._error is not None:
+            raise IOError(f"order journal write failed: {self._error}")
+
+    @property
+    def pending(self) -> bool:
+        # True if something has been appended but isn't on disk yet
+        with self._lock:
+            return self._durable < self._next_seq
+
+    @property
+    def appended(self) -> int:
+        # the sequence number of the last order appended (with group commit), for wait_for
+        with self._lock:
+            return self._next_seq
+
+    def wait_for(self, seq: int):
+        # waits until everything up to sequence number seq is on disk
+        with self._written:
+            while self._durable < seq and self._error is None:
+                self._written.wait()
+            if self._error is not None:
+                raise IOError(f"order journal write failed: {self._error}")
+
+    def flush(self):
+        # waits until everything appended so far is on disk
+        if self.group_commit:
+            with self._lock:
+                seq = self._next_seq
+            self.wait_for(seq)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # collect whatever else turns up in the next max_delay seconds
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)   # stop after this batch
+                    break
+                batch.append(item)
+
+            try:
+                self._write(b"".join(line for _, line in batch))
+            except BaseException as e:  # wake the waiters up with the error instead of hanging
+                with self._written:
+                    self._error = e
+                    self._written.notify_all()
+                return
+            with self._written:
+                self._durable = batch[-1][0]
+                self._written.notify_all()
+
+    def close(self):
+        # no more appends from here on, everything already appended is written first
+        # (the file is closed even if the last write failed, flush raises that afterwards)
+        with self._lock:
+            self._closed = True
+        try:
+            if self._writer is not None:
+                self.flush()
+        finally:
+            if self._writer is not None:
+                self._queue.put(None)
+                self._writer.join()
+                self._writer = None
+            self._file.close()
+
+
+# =========================
+# READING IT BACK
+# =========================
+
+def repair_tail(path: str) -> int:
+    # cuts off a half-written last line (from a crash mid-write)
+    # so new orders don't get glued onto it. gives back how many bytes were cut
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return 0
+        # look backwards for the last complete line
+        pos = size
+        block = 64 * 1024
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            pos = start
+        else:
+            end = 0
+        if end < size:
+            f.truncate(end)
+        return size - end
+
+
+def read_journal(path: str, problems: Optional[List[int]] = None) -> Iterator[dict]:
+    # every good record in order. line numbers of damaged lines go into "problems"
+    with open(path, "rb") as f:
+        for number, line in enumerate(f, start=1):
+            record = decode_line(line)
+            if record is None:
+                if problems is not None:
+                    problems.append(number)
+                continue
+            yield record
+
+
+def replay_stock(inventory, records) -> Dict[str, int]:
+    # takes everything sold in the journal off the inventory's stock
+    # gives back {product id: qty} for products the journal mentions that aren't in the inventory
+    unknown: Dict[str, int] = {}
+    for record in records:
+        for pid, _name, _unit_price, qty in record["lines"]:
+            if pid in inventory:
+                inventory.adjust_stock(pid, -qty)
+            else:
+                unknown[pid] = unknown.get(pid, 0) + qty
+    return unknown
+
+
+def last_record(path: str) -> Optional[dict]:
+    # the last good record, found by reading backwards from the end
+    # (so starting up doesn't mean reading the whole journal)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0:
+            start = max(0, pos - 64 * 1024)
+            f.seek(start)
+            tail = f.read(pos - start) + tail
+            pos = start
+            lines = tail.split(b"\n")
+            # lines[0] may be cut off unless we've reached the start of the file
+            for line in reversed(lines[1:] if pos > 0 else lines):
+                record = decode_line(line + b"\n")
+                if record is not None:
+                    return record
+            tail = lines[0]
+    return None
+
+
+def main(argv=None):
+    from models import money, open_inventory, seed_inventory
+
+    parser = argparse.ArgumentParser(description="PaperCup order journal tools")
+    parser.add_argument("command", choices=("replay", "summary"))
+    parser.add_argument("journal")
+    parser.add_argument("--db", help="(replay) save the rebuilt inventory to this SQLite file")
+    args = parser.parse_args(argv)
+
+    problems: List[int] = []
+    start = time.perf_counter()
+
+    if args.command == "summary":
+        orders = items = takings = 0
+        for record in read_journal(args.journal, problems):
+            orders += 1
+            items += sum(line[3] for line in record["lines"])
+            takings += record["total"]
+        print(f"orders: {orders:,}  items: {items:,}  takings: {money(takings)}")
+    else:
+        if args.db and os.path.exists(args.db):
+            parser.error(f"{args.db} already exists, replay needs a fresh file")
+        inventory = open_inventory(args.db) if args.db else seed_inventory()
+        unknown = replay_stock(inventory, read_journal(args.journal, problems))
+        for p in inventory.values():
+            print(f"{p.id} | {p.name} | stock={p.stock}")
+        if unknown:
+            print(f"not in the seed inventory: {unknown}")
+        inventory.close()
+
+    print(f"({time.perf_counter() - start:.2f}s)")
+    if problems:
+        print(f"skipped {len(problems)} damaged line(s): {problems[:10]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# load test for server.py: lots of pretend customers ordering at once
+#
+# each pretend customer keeps one connection open and, over and over:
+# starts a session, looks at a category, adds 1-3 items and checks out.
+# at the end we print how long requests took (p50 / p99) and orders per second.
+#
+# run:  python loadtest.py                          (starts its own server on a free port)
+#       python loadtest.py --journal /tmp/orders.journal    (same, with every order journalled)
+#       python loadtest.py --url http://127.0.0.1:8080 --clients 50 --orders 2000
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from journal import OrderJournal
+from models import seed_inventory
+from orders import CATEGORIES, OrderService
+from server import OrderingApp, OrderingServer
+
+
+class Client:
+    # one keep-alive HTTP connection that sends JSON and reads JSON back
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        payload = await self.reader.readexactly(length) if length else b"{}"
+        return status, json.loads(payload)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def customer(client: Client, rng: random.Random, orders: int, latencies: Dict[str, List[float]],
+                   results: Dict[str, int]):
+
+    async def timed(name: str, method: str, path: str, body=None):
+        start = time.perf_counter()
+        status, payload = await client.request(method, path, body)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        return status, payload
+
+    await client.connect()
+    try:
+        for _ in range(orders):
+            order_start = time.perf_counter()
+            _, session = await timed("new session", "POST", "/sessions")
+            sid = session["session"]
+
+            _, menu = await timed("browse", "GET", f"/categories/{rng.choice(CATEGORIES)}")
+            in_stock = [p["id"] for p in menu["products"] if p["stock"] > 0]
+            for pid in rng.sample(in_stock, min(len(in_stock), rng.randint(1, 3))):
+                await timed("add item", "POST", f"/sessions/{sid}/items", {"product_id": pid, "qty": 1})
+
+            status, _ = await timed("checkout", "POST", f"/sessions/{sid}/checkout")
+            if status == 200:
+                results["placed"] += 1
+                latencies.setdefault("whole order", []).append(time.perf_counter() - order_start)
+            else:
+                results["failed"] += 1
+                await timed("end session", "DELETE", f"/sessions/{sid}")
+    finally:
+        await client.close()
+
+
+async def run(host: str, port: int, clients: int, orders: int, seed: int = 1) -> dict:
+    latencies: Dict[str, List[float]] = {}
+    results = {"placed": 0, "failed": 0}
+    per_client = max(1, orders // clients)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        customer(Client(host, port), random.Random(seed + n), per_client, latencies, results)
+        for n in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "latencies": latencies, **results}
+
+
+def report(result: dict):
+    print(f"\n{'request':<14} {'count':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, values in sorted(result["latencies"].items()):
+        values.sort()
+        print(f"{name:<14} {len(values):>8,} {percentile(values, 50) * 1000:>9.2f} {percentile(values, 99) * 1000:>9.2f}")
+    total = result["placed"] + result["failed"]
+    print(f"\norders placed: {result['placed']:,}  failed: {result['failed']:,}")
+    print(f"time: {result['seconds']:.2f}s  ->  {total / result['seconds']:,.0f} orders/sec")
+
+
+async def run_with_own_server(clients: int, orders: int, restock: int, journal_path: Optional[str] = None) -> dict:
+    inventory = seed_inventory()
+    for pid in list(inventory):
+        inventory.set_stock(pid, restock)
+    journal = OrderJournal(journal_path) if journal_path else None
+    server = OrderingServer(OrderingApp(OrderService(inventory, journal=journal, wait_for_journal=False)), port=0)
+    await server.start()
+    try:
+        return await run(server.host, server.port, clients, orders)
+    finally:
+        await server.stop()
+        if journal is not None:
+            journal.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the PaperCup ordering server")
+    parser.add_argument("--url", help="server to test (default: start one in this process)")
+    parser.add_argument("--clients", type=int, default=20, help="customers ordering at the same time")
+    parser.add_argument("--orders", type=int, default=2000, help="orders in total")
+    parser.add_argument("--restock", type=int, default=1_000_000,
+                        help="stock per product for the built-in server")
+    parser.add_argument("--journal", help="the built-in server writes every order to this journal file")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        parts = urlsplit(args.url)
+        result = asyncio.run(run(parts.hostname, parts.port or 80, args.clients, args.orders))
+    else:
+        result = asyncio.run(run_with_own_server(args.clients, args.orders, args.restock, args.journal))
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,681 @@
+# the data side of the shop: money, products, the inventory and the basket
+# (no printing or input() in here, so the till, the GUI and any scripts can all use it)
+
+# dataclass = easy way to make "data objects" without writing loads of code
+from dataclasses import dataclass
+
+# os = file paths (for the details file kept next to the database)
+import os
+
+# threading = lets several tills share one inventory at the same time
+import threading
+
+# contextmanager = lets a function work with "with ...:"
+from contextlib import contextmanager
+
+# decimal = exact maths with decimals (we only use it to read prices typed as text)
+from decimal import Decimal, ROUND_HALF_UP
+
+# typing = not required, but helps me remember what type things are (list, dict etc)
+from typing import Callable, Dict, Iterator, List, Optional
+
+# our own file that saves the inventory to disk (SQLite)
+from persistence import InventoryBackend, SQLiteBackend
+
+# our own file that keeps product details on disk until someone looks at them
+from details import DetailsFile
+
+# our own file with the feed of inventory changes (for anything that subscribes)
+from changefeed import ChangeFeed
+
+
+INVENTORY_DB = "papercup.db"     # where the inventory is saved between runs
+
+# the biggest whole number SQLite can store: a price (in pence) or stock over
+# this would only fail when the inventory is saved, after it had changed in memory
+LARGEST = 2 ** 63 - 1
+
+
+# =========================
+# MONEY (stored as whole pence)
+# =========================
+
+# floats can't store most prices exactly (0.1 + 0.2 is 0.30000000000000004)
+# so every price and total in the app is a whole number of pence
+# example: £3.60 is stored as 360
+# adding ints is always exact (and quicker than Decimal)
+Pence = int
+
+
+def to_pence(value) -> Pence:
+    # turns a price in pounds ("3.60", 3.6, Decimal("3.6")) into pence (360)
+    # str(...) first so a float like 3.6 is read as "3.6" and not 3.5999999...
+    # anything smaller than a penny is rounded to the nearest penny (halves round up)
+    # (a huge one like "1e30" is too big for quantize, that is an ArithmeticError too)
+    try:
+        pounds = Decimal(str(value).strip())
+        if not pounds.is_finite():
+            raise ValueError(f"not a price: {value!r}")
+        return int((pounds * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except ArithmeticError:
+        raise ValueError(f"not a price: {value!r}") from None
+
+
+def percent_of(amount: Pence, percent: int) -> Pence:
+    # percent of an amount, rounded to the nearest penny
+    # exact halves round up, example: 10% of £0.05 = 0.5p -> 1p
+    # (+50 before // 100 is the "round to nearest" trick with whole numbers)
+    return (amount * percent + 50) // 100
+
+
+def money(pence: Pence) -> str:
+    # this just formats money nicely
+    # example: 360 -> "£3.60"
+    # divmod gives us (pounds, pence left over) in one go
+    pounds, left = divmod(abs(pence), 100)
+    sign = "-" if pence < 0 else ""
+    return f"{sign}£{pounds}.{left:02d}"
+
+
+# =========================
+# DATA MODELS (the "shapes" of our data)
+# =========================
+
+# dataclass makes python auto-create __init__ for us (so we can do Product(...))
+@dataclass
+class Product:
+    # this stores ONE product (like a menu item or a book)
+    id: str                # like "D1" or "F2"
+    category: str          # "drinks" or "food" or "books"
+    name: str              # product name
+    price: Pence           # how much it costs, in pence (360 = £3.60)
+    stock: int             # how many left in stock
+    details: str           # extra info (ingredients / author / etc)
+    delivery_eligible: bool = False  # only really used for books
+
+
+class StoredProduct(Product):
+    # a Product loaded from the saved inventory whose details are left on disk
+    # until something asks for them (only the details screen and saving do).
+    # read(pid, slot) fetches them; setting details keeps the new text in memory
+    # like any other Product
+
+    def __init__(self, read: Callable[[str, Optional[int]], str], id: str, category: str, name: str,
+                 price: Pence, stock: int, slot: Optional[int], delivery_eligible: bool = False):
+        self._read = read
+        self._slot = slot
+        self._text: Optional[str] = None
+        super().__init__(id, category, name, price, stock, None, delivery_eligible)
+
+    @property
+    def details(self) -> str:
+        text = self._text
+        return self._read(self.id, self._slot) if text is None else text
+
+    @details.setter
+    def details(self, text: Optional[str]):
+        # (None = "still on disk", it's what Product.__init__ sets it to)
+        if text is not None:
+            self._text = text
+
+
+@dataclass
+class BasketItem:
+    # this stores ONE line in the basket/order
+    product_id: str        # links back to a Product id
+    name: str              # name (we store it so we can print it easily)
+    unit_price: Pence      # price per 1 item, in pence
+    qty: int               # how many the customer wants
+
+
+# =========================
+# INVENTORY (all products)
+# =========================
+
+class Inventory(dict):
+    # this is still a normal dictionary (key = product id, value = Product)
+    # so inventory["D1"], "D1" in inventory, inventory.values() etc all still work
+    # BUT it also keeps a list of products for each category
+    # so showing "drinks" only looks at drinks, not the whole shop
+
+    def __init__(self, products: Optional[Dict[str, Product]] = None):
+        super().__init__()
+        # category -> products in that category (in the order they were added)
+        self._by_category: Dict[str, List[Product]] = {}
+        # the change feed (see changes()), only made if someone subscribes
+        self._feed: Optional[ChangeFeed] = None
+        if products:
+            self.update(products)
+
+    def __setitem__(self, pid: str, product: Product):
+        # if we are replacing a product, take the old one out of its category first
+        old = self.get(pid)
+        if old is not None:
+            if old.category == product.category:
+                # same category -> swap it in the same spot so the menu order stays the same
+                items = self._by_category[old.category]
+                items[_position(items, old)] = product
+                super().__setitem__(pid, product)
+                self._changed(pid, "replaced")
+                return
+            self._unindex(old)
+
+        super().__setitem__(pid, product)
+        self._index(product)
+        self._changed(pid, "added" if old is None else "replaced")
+
+    def __delitem__(self, pid: str):
+        product = self[pid]
+        super().__delitem__(pid)
+        self._unindex(product)
+        self._changed(pid, "removed")
+
+    def _index(self, product: Product):
+        # adds a product to the end of its category list
+        self._by_category.setdefault(product.category, []).append(product)
+
+    def _unindex(self, product: Product):
+        # removes a product from its category list (drops the list if it is now empty)
+        items = self._by_category[product.category]
+        del items[_position(items, product)]
+        if not items:
+            del self._by_category[product.category]
+
+    # dict has its own versions of these that skip __setitem__/__delitem__
+    # so we write them again to keep the category lists correct
+
+    def update(self, other=(), **kwargs):
+        pairs = other.items() if hasattr(other, "items") else other
+        for pid, product in pairs:
+            self[pid] = product
+        for pid, product in kwargs.items():
+            self[pid] = product
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, pid: str, product: Optional[Product] = None):
+        if pid not in self:
+            self[pid] = product
+        return self[pid]
+
+    def pop(self, pid: str, *default):
+        if pid not in self:
+            if default:
+                return default[0]
+            raise KeyError(pid)
+        product = self[pid]
+        del self[pid]
+        return product
+
+    def popitem(self):
+        pid, product = super().popitem()
+        self._unindex(product)
+        self._changed(pid, "removed")
+        return pid, product
+
+    def clear(self):
+        super().clear()
+        self._by_category.clear()
+        self._changed(None, "reset")
+
+    def in_category(self, category: str) -> List[Product]:
+        # gives back the stored list (no new list is made each time)
+        # so please don't change it - use inventory[...] = ... instead
+        return self._by_category.get(category, [])
+
+    def stream(self, category: Optional[str] = None) -> Iterator[Product]:
+        # products one at a time (one category, or all of them category by category)
+        # without copying anything first, for paging through a huge inventory.
+        # it's fine to keep one half used while tills change things, a product
+        # added or deleted meanwhile may or may not turn up
+        for cat in [category] if category is not None else list(self._by_category):
+            items = self.in_category(cat)
+            i = 0
+            while i < len(items):
+                yield items[i]
+                i += 1
+
+    def stock_at_most(self, max_stock: int) -> Dict[str, int]:
+        # id -> stock for every product with max_stock or less (for the low stock monitor)
+        return {p.id: p.stock for p in list(dict.values(self)) if p.stock <= max_stock}
+
+    def set_category(self, pid: str, category: str):
+        # moves a product to a different category
+        # (changing product.category directly would leave it in the old list)
+        product = self[pid]
+        if product.category == category:
+            return
+        self._unindex(product)
+        product.category = category
+        self._index(product)
+        self._changed(pid, "category")
+
+    def set_stock(self, pid: str, stock: int):
+        # please change stock through these two (not product.stock = ...)
+        # so an inventory that saves to disk (or a screen showing it) knows the product changed
+        self[pid].stock = stock
+        self._changed(pid, "stock")
+
+    def adjust_stock(self, pid: str, delta: int):
+        # delta can be negative (taking stock) or positive (giving it back)
+        self[pid].stock += delta
+        self._changed(pid, "stock")
+
+    # ----- change notifications -----
+
+    def changes(self) -> ChangeFeed:
+        # the feed of changes to this inventory (changefeed.py), made the first time it is asked for.
+        # this is how anything outside hears about a product being added, replaced,
+        # deleted, moved or having its stock changed
+        if self._feed is None:
+            self._feed = ChangeFeed(lambda pid: dict.get(self, pid))
+        return self._feed
+
+    def _changed(self, pid: Optional[str], kind: str):
+        # (nearly free when nobody is subscribed)
+        if self._feed is not None:
+            self._feed.publish(pid, kind)
+
+    @contextmanager
+    def bulk(self):
+        # "with inventory.bulk():" around lots of changes that belong together
+        # (nothing to do here, PersistentInventory saves them all in one go at the end)
+        yield self
+
+    def flush(self):
+        # nothing to save, this inventory only lives in memory
+        # (PersistentInventory writes its changes to disk here)
+        pass
+
+    def close(self):
+        self.flush()
+
+
+def _position(items: List[Product], product: Product) -> int:
+    # where this very product is in a category list. not items.index(product):
+    # that compares every product before it field by field (== on a dataclass),
+    # details and all, which for a StoredProduct means reading them from disk
+    for i, item in enumerate(items):
+        if item is product:
+            return i
+    raise ValueError(f"{product.id} is not in {product.category}")
+
+
+class PersistentInventory(Inventory):
+    # an Inventory that is saved in a backend (like SQLiteBackend in persistence.py)
+    #
+    # loading is lazy: nothing is read at startup. a category is read from the
+    # backend the first time it is listed, and a single product the first time
+    # its id is looked up. only "show me everything" reads the whole catalogue.
+    #
+    # saving is incremental: we remember which ids changed and flush() writes
+    # just those rows in one transaction (it also flushes by itself once
+    # batch_size changes have built up)
+    #
+    # with a DetailsFile made from the backend (see open_inventory) products are
+    # loaded without their details, which are read from that file when asked for
+
+    def __init__(self, backend: InventoryBackend, batch_size: int = 500,
+                 details: Optional[DetailsFile] = None):
+        super().__init__()
+        self.backend = backend
+        self.batch_size = batch_size
+        self.details = details
+        self._loaded_categories = set()
+        self._fully_loaded = False
+        # stops two tills (threads) loading the same product twice
+        self._load_lock = threading.RLock()
+        # ids waiting to be written / deleted on the next flush
+        self._dirty: Dict[str, None] = {}
+        self._deleted = set()
+        # > 0 while inside bulk() (no saving part way through)
+        self._bulk_depth = 0
+
+    # ----- loading -----
+
+    def _rows(self, category: Optional[str] = None):
+        return self.backend.rows(category, details=self.details is None)
+
+    def _product(self, row) -> Product:
+        # (without a details file the row has the details text, with one it has the rowid)
+        return Product(*row) if self.details is None else StoredProduct(self._read_details, *row)
+
+    def _read_details(self, pid: str, slot: Optional[int]) -> str:
+        if slot is not None and slot < len(self.details):
+            return self.details[slot]
+        # not in the file as we opened it (saved by another program since), ask the backend
+        row = self.backend.get_row(pid)
+        return "" if row is None else row[5]
+
+    def _adopt(self, row) -> Product:
+        # turns a backend row into a Product and stores it (without marking it changed)
+        product = self._product(row)
+        dict.__setitem__(self, product.id, product)
+        self._index(product)
+        return product
+
+    def _lookup(self, pid: str) -> Optional[Product]:
+        product = dict.get(self, pid)
+        if product is None and not self._fully_loaded and pid not in self._deleted:
+            with self._load_lock:
+                # check again, another thread may have loaded it while we waited
+                product = dict.get(self, pid)
+                if product is None:
+                    row = self.backend.get_row(pid, details=self.details is None)
+                    if row is not None:
+                        product = self._adopt(row)
+        return product
+
+    def _load_category(self, category: str):
+        if self._fully_loaded or category in self._loaded_categories:
+            return
+        with self._load_lock:
+            if category not in self._loaded_categories:
+                self._read_category(category)
+                self._loaded_categories.add(category)
+
+    def _read_category(self, category: str):
+        # rebuild the list in saved order, reusing any product we already loaded
+        loaded = []
+        for row in self._rows(category):
+            product = dict.get(self, row[0])
+            if product is None:
+                if row[0] in self._deleted:
+                    continue
+                product = self._product(row)
+                dict.__setitem__(self, product.id, product)
+            if product.category == category:
+                loaded.append(product)
+
+        # then anything added (or moved here) since the last save
+        seen = set(map(id, loaded))
+        extra = [p for p in self._by_category.get(category, []) if id(p) not in seen]
+        if loaded or extra:
+            self._by_category[category] = loaded + extra
+
+    def _load_all(self):
+        if self._fully_loaded:
+            return
+        with self._load_lock:
+            for category in self.backend.categories():
+                self._load_category(category)
+            self._fully_loaded = True
+
+    # ----- reading (load first, then act like a normal Inventory) -----
+
+    def __getitem__(self, pid: str) -> Product:
+        product = self._lookup(pid)
+        if product is None:
+            raise KeyError(pid)
+        return product
+
+    def get(self, pid: str, default=None):
+        product = self._lookup(pid)
+        return default if product is None else product
+
+    def __contains__(self, pid) -> bool:
+        return self._lookup(pid) is not None
+
+    def in_category(self, category: str) -> List[Product]:
+        self._load_category(category)
+        return super().in_category(category)
+
+    def stream(self, category: Optional[str] = None) -> Iterator[Product]:
+        # like Inventory.stream, but if the products aren't in memory yet they are
+        # read from disk a chunk at a time as they're asked for (not all loaded first)
+        if self._fully_loaded or category in self._loaded_categories:
+            yield from super().stream(category)
+            return
+        seen = set()
+        for row in self._rows(category):
+            pid = row[0]
+            seen.add(pid)
+            product = dict.get(self, pid)
+            if product is None:
+                if pid in self._deleted:
+                    continue
+                with self._load_lock:
+                    product = dict.get(self, pid) or self._adopt(row)
+            elif category is not None and product.category != category:
+                continue    # moved to another category since it was saved
+            yield product
+        # then anything that hasn't been saved yet
+        for pid in list(self._dirty):
+            product = dict.get(self, pid)
+            if pid not in seen and product is not None and category in (None, product.category):
+                yield product
+
+    def stock_at_most(self, max_stock: int) -> Dict[str, int]:
+        # asks the backend (nothing is loaded), then goes with what's in memory
+        # for anything loaded since (it may have changed and not been saved yet)
+        found = self.backend.stock_at_most(max_stock)
+        for product in list(dict.values(self)):
+            if product.stock <= max_stock:
+                found[product.id] = product.stock
+            else:
+                found.pop(product.id, None)
+        for pid in list(self._deleted):
+            found.pop(pid, None)
+        return found
+
+    def __len__(self) -> int:
+        self._load_all()
+        return super().__len__()
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def keys(self):
+        self._load_all()
+        return super().keys()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+    def popitem(self):
+        self._load_all()
+        pid, product = super().popitem()
+        self._deleted.add(pid)
+        self._dirty.pop(pid, None)
+        return pid, product
+
+    # ----- writing (act like a normal Inventory, then remember what changed) -----
+
+    def _mark(self, pid: str):
+        with self._load_lock:
+            self._dirty[pid] = None
+            self._deleted.discard(pid)
+            if len(self._dirty) >= self.batch_size and not self._bulk_depth:
+                self.flush()
+
+    def __setitem__(self, pid: str, product: Product):
+        super().__setitem__(pid, product)
+        self._mark(pid)
+
+    def __delitem__(self, pid: str):
+        super().__delitem__(pid)
+        with self._load_lock:
+            self._dirty.pop(pid, None)
+            self._deleted.add(pid)
+
+    def clear(self):
+        self._load_all()
+        self._deleted.update(dict.keys(self))
+        self._dirty.clear()
+        super().clear()
+
+    def set_category(self, pid: str, category: str):
+        super().set_category(pid, category)
+        self._mark(pid)
+
+    def set_stock(self, pid: str, stock: int):
+        super().set_stock(pid, stock)
+        self._mark(pid)
+
+    def adjust_stock(self, pid: str, delta: int):
+        super().adjust_stock(pid, delta)
+        self._mark(pid)
+
+    @contextmanager
+    def bulk(self):
+        # holds back the batch_size flushes until the end of the "with",
+        # then writes every change made inside it in one transaction
+        # (so a crash can't leave half of a delivery saved)
+        with self._load_lock:
+            self._bulk_depth += 1
+        try:
+            yield self
+        finally:
+            with self._load_lock:
+                self._bulk_depth -= 1
+                if not self._bulk_depth:
+                    self.flush()
+
+    def flush(self):
+        # writes every changed row (and every delete) in one transaction
+        with self._load_lock:
+            if not self._dirty and not self._deleted:
+                return
+            rows = [product_row(dict.__getitem__(self, pid)) for pid in list(self._dirty)]
+            self.backend.write(rows, list(self._deleted))
+            self._dirty.clear()
+            self._deleted.clear()
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+        if self.details is not None:
+            self.details.close()
+
+
+def product_row(product: Product) -> tuple:
+    # the plain tuple a backend stores for one product
+    # (a StoredProduct's details still on disk are None: "keep the saved ones", not read just to save them again)
+    details = product._text if isinstance(product, StoredProduct) else product.details
+    return (product.id, product.category, product.name, product.price,
+            product.stock, details, product.delivery_eligible)
+
+
+def seed_inventory() -> Dict[str, Product]:
+    # this function makes our starting inventory
+    # we return an Inventory (a dictionary) where:
+    # key = product id (like "D1")
+    # value = Product object
+    return Inventory({
+        # DRINKS
+        "D1": Product("D1", "drinks", "Flat White", 360, 30, "Espresso + steamed milk"),
+        "D2": Product("D2", "drinks", "Matcha Latte", 410, 20, "Matcha + milk"),
+        "D3": Product("D3", "drinks", "Iced Americano", 320, 25, "Espresso + water + ice"),
+        "D4": Product("D4", "drinks", "Tea", 200, 10, "Tea + hot water"),
+        "D5": Product("D5", "drinks", "Herbal Tea", 300, 15, "Tea + herbs + hot water"),
+
+        # FOOD
+        "F1": Product("F1", "food", "Chocolate Brownie", 290, 15, "Cocoa, butter, eggs, sugar, flour"),
+        "F2": Product("F2", "food", "Carrot Cake Slice", 340, 10, "Carrot, cinnamon, cream cheese frosting"),
+        "F3": Product("F3", "food", "Cheese Cake", 400, 10, "Cream cheese, digestive, vanilla"),
+        "F4": Product("F4", "food", "Croissant", 300, 15, "Bread"),
+        "F5": Product("F5", "food", "Chesse Bagel", 400, 7, "Cheese, Bread"),
+
+        # BOOKS
+        "B1": Product("B1", "books", "Atomic Habits", 1299, 8,
+                      "James Clear — Habit building", delivery_eligible=True),
+        "B2": Product("B2", "books", "The Midnight Library", 999, 6,
+                      "Matt Haig — Fiction", delivery_eligible=True),
+        "B3": Product("B3", "books", "Deep Work", 1150, 5,
+                      "Cal Newport — Focus & productivity", delivery_eligible=True),
+        "B4": Product("B4", "books", "Seven Habits of Highly Effective People", 1499, 7,
+                      "Steven Cohen — Habit building", delivery_eligible=True),
+        "B5": Product("B5", "books", "Harry Potter", 1499, 7,
+                      "J K Rowling — Fiction", delivery_eligible=True),
+    })
+
+
+def details_path(db_path: str) -> str:
+    # papercup.db -> papercup-details.dat (and papercup-details.dat.idx)
+    return f"{os.path.splitext(db_path)[0]}-details.dat"
+
+
+def open_inventory(db_path: str) -> PersistentInventory:
+    # opens the saved inventory (or makes a new one from seed_inventory the first time).
+    # details stay on disk in details_path(db_path) until the details screen asks for them
+    backend = SQLiteBackend(db_path)
+    if backend.is_empty():
+        backend.write(product_row(p) for p in seed_inventory().values())
+    return PersistentInventory(backend, details=backend.open_details(details_path(db_path)))
+
+
+# =========================
+# BASKET (the customer's order)
+# =========================
+
+class Basket:
+    # holds the BasketItem lines for one customer
+    # lines are kept in a dictionary (key = product id) so finding a line is instant
+    # python dictionaries remember the order things were added, so the receipt
+    # still prints in the order the customer picked things
+    # it also keeps the total up to date as we go, so we never have to add it all up again
+
+    def __init__(self):
+        self._lines: Dict[str, BasketItem] = {}
+        self._total: Pence = 0
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self):
+        # lets us do "for item in basket" like with a list
+        return iter(self._lines.values())
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self._lines
+
+    @property
+    def total(self) -> Pence:
+        return self._total
+
+    def get(self, pid: str) -> Optional[BasketItem]:
+        return self._lines.get(pid)
+
+    def line_at(self, index: int) -> BasketItem:
+        # finds a line by its position (0 = first line)
+        # only used when the customer picks a line number from the printed list
+        for pos, item in enumerate(self._lines.values()):
+            if pos == index:
+                return item
+        raise IndexError(index)
+
+    def add(self, product: Product, qty: int) -> BasketItem:
+        # if already there, just increase quantity
+        item = self._lines.get(product.id)
+        if item is None:
+            item = BasketItem(product.id, product.name, product.price, 0)
+            self._lines[product.id] = item
+        item.qty += qty
+        self._total += item.unit_price * qty
+        return item
+
+    def set_qty(self, pid: str, qty: int) -> BasketItem:
+        # changes the quantity of a line (please use this instead of item.qty = ...
+        # otherwise the total goes wrong)
+        item = self._lines[pid]
+        self._total += item.unit_price * (qty - item.qty)
+        item.qty = qty
+        return item
+
+    def remove(self, pid: str) -> BasketItem:
+        # takes a whole line out and gives it back
+        item = self._lines.pop(pid)
+        self._total -= item.unit_price * item.qty
+        return item
+
+    def clear(self):
+        self._lines.clear()
+        self._total = 0
@@ -0,0 +1,475 @@
+# the ordering rules of the shop: browse, add, adjust, remove, discount, checkout
+# plus the employee jobs (add a product, change stock)
+#
+# nothing in here uses input() or print(), it just does the work and returns
+# the result (or raises OrderError / OutOfStock with a message for the user)
+# so the till (project.py), the Tk app (example_gui.py) and scripts (replay.py)
+# all sit on top of the same code
+
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import LARGEST, Basket, BasketItem, Pence, Product, percent_of
+from pricing import Pricing, PricingEngine
+from reservations import ReservationService
+from search import SearchIndex
+
+
+# shop rules
+EMPLOYEE_PASSWORD = "password"   # simple password for employee stuff
+EMPLOYEE_DISCOUNT_PERCENT = 10   # the employee promotional discount
+CATEGORIES = ("drinks", "food", "books")
+LOW_STOCK = 5                    # at or below this, a product counts as running low
+
+
+class OrderError(Exception):
+    # something that was asked for can't be done
+    # the message is written so it can be shown to the customer/employee as it is
+    pass
+
+
+# =========================
+# SMALL BUILDING BLOCKS
+# =========================
+
+def list_products(inventory: Dict[str, Product], category: str) -> List[Product]:
+    # get all products in ONE category (drinks/food/books)
+    # an Inventory (or a ColumnarInventory) already keeps a list per category
+    # so we just ask it
+    in_category = getattr(inventory, "in_category", None)
+    if in_category is not None:
+        return in_category(category)
+
+    # a plain dict has no index, so we have to check every product
+    # inventory.values() gives all Product objects
+    return [p for p in inventory.values() if p.category == category]
+
+
+def find_products(inventory: Dict[str, Product], category: Optional[str] = None, prefix: str = "",
+                  max_stock: Optional[int] = None) -> Iterator[Product]:
+    # products matching every filter given, one at a time as they are asked for
+    # (nothing is copied or loaded up front, so the first page of a huge
+    # inventory comes back straight away)
+    #   category  - only this category
+    #   prefix    - only ids starting with this ("B1" finds B1, B10, B123...)
+    #   max_stock - only products with this much stock or less (LOW_STOCK for "running low")
+    stream = getattr(inventory, "stream", None)
+    if stream is not None:
+        products = stream(category)
+    elif category is not None:
+        products = iter(list_products(inventory, category))
+    else:
+        products = iter(list(inventory.values()))
+    prefix = prefix.strip().upper()
+    for p in products:
+        if prefix and not p.id.startswith(prefix):
+            continue
+        if max_stock is not None and p.stock > max_stock:
+            continue
+        yield p
+
+
+def add_to_basket(basket: Basket, product: Product, qty: int):
+    # adds items to basket
+    # if already there, just increase quantity
+    # (the Basket looks the line up by product id, no need to loop)
+    basket.add(product, qty)
+
+
+def basket_total(basket: Basket) -> Pence:
+    # total price of basket
+    # the Basket keeps this up to date every time something changes
+    if isinstance(basket, Basket):
+        return basket.total
+
+    # a plain list has no running total so we add it all up
+    # sum(...) adds up all the values
+    return sum(i.unit_price * i.qty for i in basket)
+
+
+def apply_discount(total: Pence, percent: int = EMPLOYEE_DISCOUNT_PERCENT) -> Tuple[Pence, Pence]:
+    # this applies a percentage off (10% unless we say otherwise)
+    # returns: (new_total, discount_amount)
+
+    # the discount is rounded to the nearest penny (halves round up, so the
+    # customer gets the extra half penny) and then taken off the total,
+    # so new_total + discount_amount is always exactly the old total
+    discount_amount = percent_of(total, percent)
+    new_total = total - discount_amount
+    return new_total, discount_amount
+
+
+# =========================
+# ORDERS
+# =========================
+
+@dataclass
+class Delivery:
+    name: str
+    address: str
+
+
+@dataclass
+class Bill:
+    # the money for an order, all worked out from ONE look at the promotions
+    # (so the numbers always add up, even if happy hour ends in between)
+    subtotal: Pence
+    savings: Pence
+    discount: Pence
+    total: Pence
+    promotions: List[Tuple[str, Pence]] = field(default_factory=list)   # (name, saving)
+
+
+@dataclass
+class Order:
+    # one customer's order while they are still shopping
+    basket: Basket = field(default_factory=Basket)
+    discount_percent: int = 0          # 0 = no discount
+    delivery: Optional[Delivery] = None
+    # works out the promotions for a basket (OrderService.new_order fills this in)
+    pricing: Optional[Callable[[Basket], Pricing]] = None
+
+    # the money, in the order it's worked out:
+    #   subtotal (menu prices) - savings (promotions) - discount (employee %) = total
+
+    @property
+    def subtotal(self) -> Pence:
+        return basket_total(self.basket)
+
+    def priced(self) -> Pricing:
+        # which promotions apply to the basket as it is now
+        return self.pricing(self.basket) if self.pricing is not None else Pricing()
+
+    def bill(self) -> Bill:
+        # everything to show for the basket as it is now (the basket is priced once).
+        # anything showing more than one of these numbers should use this, not the properties below
+        priced = self.priced()
+        subtotal = self.subtotal
+        # the employee discount comes off what's left after the promotions
+        total, discount = apply_discount(subtotal - priced.savings, self.discount_percent)
+        return Bill(subtotal, priced.savings, discount, total, priced.applied)
+
+    @property
+    def savings(self) -> Pence:
+        return self.bill().savings
+
+    @property
+    def discount(self) -> Pence:
+        return self.bill().discount
+
+    @property
+    def total(self) -> Pence:
+        return self.bill().total
+
+
+@dataclass
+class Receipt:
+    # what was actually sold when an order was placed
+    order_id: int
+    lines: List[BasketItem]
+    subtotal: Pence
+    discount: Pence
+    total: Pence
+    delivery: Optional[Delivery] = None
+    savings: Pence = 0                  # taken off by promotions (before the discount)
+    promotions: List[Tuple[str, Pence]] = field(default_factory=list)   # (name, saving)
+
+
+def receipt_record(receipt: Receipt) -> dict:
+    # a Receipt as plain JSON-friendly data, the way the order journal stores it
+    return {
+        "order_id": receipt.order_id,
+        "placed_at": time.time(),
+        "lines": [[i.product_id, i.name, i.unit_price, i.qty] for i in receipt.lines],
+        "subtotal": receipt.subtotal,
+        "savings": receipt.savings,
+        "discount": receipt.discount,
+        "total": receipt.total,
+        "delivery": None if receipt.delivery is None
+        else {"name": receipt.delivery.name, "address": receipt.delivery.address},
+    }
+
+
+@dataclass
+class StockChange:
+    # one line of a delivery / stock take
+    product_id: str
+    amount: int
+    absolute: bool = False   # False = add amount (can be negative), True = set stock to amount
+
+
+@dataclass
+class StockReport:
+    # what happened to a batch of stock changes
+    # if anything is in unknown, negative or too_large, NOTHING in the batch was changed
+    applied: int = 0                                          # products whose stock changed
+    unknown: List[str] = field(default_factory=list)          # ids not in the inventory
+    negative: List[Tuple[str, int]] = field(default_factory=list)  # (id, stock it would end up at)
+    too_large: List[Tuple[str, int]] = field(default_factory=list)  # (id, stock over LARGEST, can't be saved)
+
+    @property
+    def ok(self) -> bool:
+        return not self.unknown and not self.negative and not self.too_large
+
+
+class OrderService:
+
+    def __init__(self, inventory: Dict[str, Product], reservations: Optional[ReservationService] = None,
+                 journal=None, wait_for_journal: bool = True, pricing: Optional[PricingEngine] = None):
+        self.inventory = inventory
+        # tills that share an inventory should share one reservation service too
+        self.reservations = reservations or ReservationService(inventory)
+        # every placed order also goes into the journal (journal.py) if there is one.
+        # wait_for_journal=False: checkout doesn't wait for the disk, the caller
+        # does that itself later (the server does, so many orders share one fsync)
+        self.journal = journal
+        self.wait_for_journal = wait_for_journal
+        self._order_ids = itertools.count(1 + (journal.last_order_id if journal is not None else 0))
+        # built the first time someone searches, then kept up to date from the
+        # inventory's change feed (changefeed.py) if it has one
+        self._search: Optional[SearchIndex] = None
+        self._search_changes = None
+        # the promotions running (pricing.py), None = menu prices only
+        self.pricing = pricing
+
+    # ----- browsing -----
+
+    def browse(self, category: str) -> List[Product]:
+        return list_products(self.inventory, category)
+
+    def product(self, pid: str) -> Product:
+        product = self.inventory.get(pid)
+        if product is None:
+            raise OrderError(f"No product with ID {pid}.")
+        return product
+
+    def search(self, query: str, limit: int = 20) -> List[Product]:
+        # products whose name/details match every word of the query, best first
+        if self._search is None:
+            self._build_search()
+        elif self._search_changes is not None:
+            self._catch_up_search()
+        found = [self.inventory.get(pid) for pid, _score in self._search.search(query, limit)]
+        # (skip anything deleted from the inventory since it was indexed)
+        return [p for p in found if p is not None]
+
+    def _build_search(self):
+        # subscribe first, so nothing that changes while we index is missed
+        # (stock changes don't matter to search, so they aren't even queued)
+        changes = getattr(self.inventory, "changes", None)
+        if changes is not None and self._search_changes is None:
+            self._search_changes = changes().subscribe(kinds=("added", "replaced", "removed"))
+        self._search = SearchIndex(self.inventory.values())
+
+    def _catch_up_search(self):
+        # re-indexes just the products added, replaced or deleted since the last search
+        for change in self._search_changes.drain():
+            if change.reset:
+                self._build_search()
+                return
+            if change.product is None:
+                self._search.remove(change.pid)
+            else:
+                self._search.add(change.product)
+
+    # ----- the basket -----
+
+    def new_order(self) -> Order:
+        return Order(pricing=self.price_basket)
+
+    def price_basket(self, basket: Basket) -> Pricing:
+        if self.pricing is None:
+            return Pricing()
+        return self.pricing.price(basket, self._category_of)
+
+    def _category_of(self, pid: str) -> str:
+        product = self.inventory.get(pid)
+        return product.category if product is not None else ""
+
+    def max_qty(self, order: Order, pid: str) -> int:
+        # the most this order could have of pid: what it already holds + what's on the shelf
+        return self.reservations.held(order.basket, pid) + self.product(pid).stock
+
+    def add(self, order: Order, pid: str, qty: int) -> BasketItem:
+        if qty < 1:
+            raise OrderError("Quantity must be at least 1.")
+        product = self.product(pid)
+        # reserve the stock first (another till may have just taken it)
+        self.reservations.reserve(order.basket, pid, qty)
+        add_to_basket(order.basket, product, qty)
+        return order.basket.get(pid)
+
+    def adjust(self, order: Order, pid: str, qty: int) -> BasketItem:
+        if pid not in order.basket:
+            raise OrderError("That item isn't in the basket.")
+        if qty < 1:
+            raise OrderError("Quantity must be at least 1.")
+        if pid not in self.inventory:
+            raise OrderError("Sorry, that product no longer exists in inventory.")
+        self.reservations.set_qty(order.basket, pid, qty)
+        return order.basket.set_qty(pid, qty)
+
+    def remove(self, order: Order, pid: str) -> BasketItem:
+        if pid not in order.basket:
+            raise OrderError("That item isn't in the basket.")
+        removed = order.basket.remove(pid)
+        # give stock back into inventory (so it's available again)
+        self.reservations.release(order.basket, pid)
+        return removed
+
+    # ----- checkout -----
+
+    def apply_discount(self, order: Order, percent: int = EMPLOYEE_DISCOUNT_PERCENT) -> Pence:
+        # only once per order (checking the employee password is the caller's job)
+        if order.discount_percent:
+            raise OrderError("A discount has already been applied.")
+        order.discount_percent = percent
+        return order.discount
+
+    def has_books(self, order: Order) -> bool:
+        # checks if at least one basket item is a book
+        return any(
+            (self.inventory.get(i.product_id) or Product("", "", "", 0, 0, "")).category == "books"
+            for i in order.basket
+        )
+
+    def set_delivery(self, order: Order, name: str, address: str) -> Delivery:
+        if not self.has_books(order):
+            raise OrderError("Only orders with books can be delivered.")
+        if not name or not address:
+            raise OrderError("Delivery needs a name and an address.")
+        order.delivery = Delivery(name, address)
+        return order.delivery
+
+    def checkout(self, order: Order) -> Receipt:
+        # places the order: the reserved stock is sold for good
+        # (raises OutOfStock if the basket sat too long and someone else got the stock)
+        if not order.basket:
+            raise OrderError("Basket is empty.")
+        wanted = {i.product_id: i.qty for i in order.basket}
+        self.reservations.commit(order.basket, wanted)
+
+        # promotions are worked out once, so the receipt adds up even if the clock
+        # ticks past the end of happy hour while we're writing it
+        bill = order.bill()
+        receipt = Receipt(
+            order_id=next(self._order_ids),
+            lines=[BasketItem(i.product_id, i.name, i.unit_price, i.qty) for i in order.basket],
+            subtotal=bill.subtotal,
+            discount=bill.discount,
+            total=bill.total,
+            delivery=order.delivery,
+            savings=bill.savings,
+            promotions=bill.promotions,
+        )
+        if self.journal is not None:
+            try:
+                self.journal.append(receipt_record(receipt), wait=self.wait_for_journal)
+            except BaseException:
+                # an order that isn't in the journal wasn't placed: the stock goes back
+                # to being held for this basket (so the customer can try again or cancel)
+                self.reservations.undo_commit(order.basket, wanted)
+                raise
+        self._reset(order)
+        return receipt
+
+    def cancel(self, order: Order):
+        # the customer walked away: put everything back on the shelf
+        self.reservations.release(order.basket)
+        self._reset(order)
+
+    @staticmethod
+    def _reset(order: Order):
+        order.basket.clear()
+        order.discount_percent = 0
+        order.delivery = None
+
+    # ----- employee jobs -----
+
+    def add_product(self, pid: str, category: str, name: str, price: Pence, stock: int,
+                    details: str = "", delivery_eligible: bool = False, replace: bool = False) -> Product:
+        # replace=True overwrites a product that already has this id
+        # (the catalogue importer uses it to re-load an updated file)
+        pid = pid.strip().upper()
+        category = category.strip().lower()
+        if not pid:
+            raise OrderError("ID can't be empty.")
+        # don't allow duplicate ids
+        if not replace and pid in self.inventory:
+            raise OrderError("That ID already exists.")
+        if category not in CATEGORIES:
+            raise OrderError("Invalid category.")
+        if not name.strip():
+            raise OrderError("Name can't be empty.")
+        if price < 0:
+            raise OrderError("Price can't be negative.")
+        if stock < 0:
+            raise OrderError("Stock can't be negative.")
+        if price > LARGEST or stock > LARGEST:
+            raise OrderError("That number is too big.")
+
+        product = Product(
+            id=pid,
+            category=category,
+            name=name.strip(),
+            price=price,
+            stock=stock,
+            details=details.strip(),
+            # only books can be delivered
+            delivery_eligible=delivery_eligible and category == "books",
+        )
+        self.inventory[pid] = product
+        if self._search is not None and self._search_changes is None:
+            # (an inventory with a change feed tells the search index itself)
+            self._search.add(product)
+        return product
+
+    def set_stock(self, pid: str, stock: int) -> Product:
+        product = self.product(pid)
+        if stock < 0:
+            raise OrderError("Stock can't be negative.")
+        if stock > LARGEST:
+            raise OrderError("That number is too big.")
+        # (like change_stock: no till can reserve/return it while we change it)
+        with self.reservations.locked([pid]):
+            self.inventory.set_stock(pid, stock)
+        return product
+
+    def change_stock(self, changes: Iterable[StockChange], dry_run: bool = False) -> StockReport:
+        # applies a whole batch of stock changes (a delivery, a stock take) together:
+        # either every change is made, or - if any id is unknown or any product
+        # would end up below 0 - none are, and the report says why.
+        # an id can appear more than once, the changes are added up in order
+        # dry_run=True only works out the report (applied = how many would change)
+        changes = [(c.product_id.strip().upper(), c) for c in changes]
+        report = StockReport()
+
+        # no till can reserve/return these products while we work out and apply the batch
+        with self.reservations.locked(pid for pid, _ in changes):
+            final: Dict[str, int] = {}
+            unknown: Dict[str, None] = {}     # (a dict keeps them in file order, once each)
+            for pid, change in changes:
+                current = final.get(pid)
+                if current is None:
+                    product = self.inventory.get(pid)
+                    if product is None:
+                        unknown.setdefault(pid)
+                        continue
+                    current = product.stock
+                final[pid] = change.amount if change.absolute else current + change.amount
+
+            report.unknown = list(unknown)
+            report.negative = [(pid, stock) for pid, stock in final.items() if stock < 0]
+            report.too_large = [(pid, stock) for pid, stock in final.items() if stock > LARGEST]
+            if not report.ok:
+                return report
+
+            changed = [(pid, stock) for pid, stock in final.items() if self.inventory[pid].stock != stock]
+            report.applied = len(changed)
+            if not dry_run:
+                with self.inventory.bulk():
+                    for pid, stock in changed:
+                        self.inventory.set_stock(pid, stock)
+        return report
@@ -0,0 +1,270 @@
+# saving the inventory so it survives a restart
+#
+# a "backend" is anything that can store product rows. a row is a plain tuple:
+#   (id, category, name, price, stock, details, delivery_eligible)
+# backends only deal in rows (not Product objects) so any inventory can use them
+# and this file doesn't need to import the rest of the app
+#
+# SQLiteBackend keeps the rows in a single SQLite database file.
+# it only ever writes the rows it is given, so saving a handful of stock
+# changes costs the same whether the catalogue has 15 products or 500,000
+#
+# details can also be kept in a DetailsFile (details.py) next to the database,
+# see open_details. each product's row has a details_slot saying which row of
+# that file holds its details (our own column, so a VACUUM can't renumber it),
+# and rows can then be read without their details (details=False): the
+# details field is the slot instead (None = not in the file, read it from here).
+# saving a product whose details are new or changed appends them to the file,
+# so adding or editing products never means writing the whole file again.
+# a row whose details are None is saved without touching its details
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from details import DetailsFile, append_details, write_details
+
+Row = Tuple[str, str, str, int, int, str, bool]
+
+# the details file is made again from scratch at open_details once it is more
+# than this many times the number of products (the rest being old edited texts)
+DETAILS_SLACK = 2
+
+
+class InventoryBackend:
+    # the things every backend has to be able to do
+    # (make a new backend by subclassing this and filling them in)
+
+    def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get_row(self, pid: str, details: bool = True) -> Optional[Row]:
+        raise NotImplementedError
+
+    def rows(self, category: Optional[str] = None, details: bool = True) -> Iterator[Row]:
+        # every row (or every row in one category) in the order they were first saved
+        # (details=False: the slot in the details file instead of the text, see the top of the file)
+        raise NotImplementedError
+
+    def categories(self) -> List[str]:
+        raise NotImplementedError
+
+    def stock_at_most(self, max_stock: int) -> Dict[str, int]:
+        # id -> stock for every product with max_stock or less (for the low stock monitor)
+        raise NotImplementedError
+
+    def write(self, upserts: Iterable[Row], deletes: Iterable[str] = ()):
+        # saves new/changed rows and removes deleted ids, all in one go
+        # (either everything is saved or nothing is). details None = leave them as saved
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend(InventoryBackend):
+
+    def __init__(self, path: str, synchronous: str = "FULL"):
+        self.path = path
+        # several tills (threads) may share one inventory, so one connection is
+        # shared between threads and every use of it goes through self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        # the details file and its generation, once open_details has been called
+        self._details_path: Optional[str] = None
+        self._generation: Optional[int] = None
+
+        # WAL = changes are appended to a log instead of rewriting pages in place
+        # synchronous=FULL waits for the disk on every commit (safest);
+        # NORMAL is faster but the very last commit can be lost if the power goes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+
+        with self._conn:
+            # rowid keeps the order products were first added in,
+            # an upsert keeps the same rowid so the menu order never changes
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                " id TEXT NOT NULL UNIQUE,"
+                " category TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " price INTEGER NOT NULL,"
+                " stock INTEGER NOT NULL,"
+                " details TEXT NOT NULL,"
+                " delivery_eligible INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS products_category ON products (category)")
+            # so "what's running low?" reads just the low rows, not the whole table
+            self._conn.execute("CREATE INDEX IF NOT EXISTS products_stock ON products (stock)")
+            # where each product's details are in the details file (databases made
+            # before there was one get the column here, empty until open_details fills it)
+            columns = [c[1] for c in self._conn.execute("PRAGMA table_info(products)")]
+            if "details_slot" not in columns:
+                self._conn.execute("ALTER TABLE products ADD COLUMN details_slot INTEGER")
+            # which details file the slots are for: it goes up every time the file is made from scratch
+            self._conn.execute("CREATE TABLE IF NOT EXISTS details_file (generation INTEGER NOT NULL)")
+            if self._conn.execute("SELECT 1 FROM details_file").fetchone() is None:
+                self._conn.execute("INSERT INTO details_file VALUES (0)")
+
+    @staticmethod
+    def _row(raw) -> Row:
+        # sqlite hands back 0/1 for the delivery flag, turn it back into True/False
+        return raw[0], raw[1], raw[2], raw[3], raw[4], raw[5], bool(raw[6])
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def _details_column(self, details: bool) -> str:
+        if details:
+            return "details"
+        # the slot, but only while the database is still on the file we opened
+        # (another program may have made a new one since, the slots are for that one)
+        return ("CASE WHEN (SELECT generation FROM details_file) = "
+                f"{-1 if self._generation is None else int(self._generation)} THEN details_slot END")
+
+    def get_row(self, pid: str, details: bool = True) -> Optional[Row]:
+        with self._lock:
+            raw = self._conn.execute(
+                f"SELECT id, category, name, price, stock, {self._details_column(details)}, delivery_eligible"
+                " FROM products WHERE id = ?", (pid,)
+            ).fetchone()
+        return None if raw is None else self._row(raw)
+
+    def rows(self, category: Optional[str] = None, details: bool = True) -> Iterator[Row]:
+        sql = ("SELECT rowid, id, category, name, price, stock, "
+               f"{self._details_column(details)}, delivery_eligible FROM products")
+        # reads rows from disk as we go, 1000 at a time, it doesn't load them all first.
+        # every chunk is its own query starting after the last rowid we saw, so nothing
+        # is left open in between: the employee inventory view can stop half way
+        # through for as long as it likes while other tills save their changes
+        where = "WHERE rowid > ?" if category is None else "WHERE category = ? AND rowid > ?"
+        sql = f"{sql} {where} ORDER BY rowid LIMIT 1000"
+        last = 0
+        while True:
+            with self._lock:
+                chunk = self._conn.execute(sql, (last,) if category is None else (category, last)).fetchall()
+            if not chunk:
+                return
+            last = chunk[-1][0]
+            for raw in chunk:
+                yield self._row(raw[1:])
+
+    def categories(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT category FROM products")]
+
+    def stock_at_most(self, max_stock: int) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, stock FROM products WHERE stock <= ?", (max_stock,)))
+
+    # ----- the details file -----
+
+    def open_details(self, path: str) -> DetailsFile:
+        # the details file for this database (path and path.idx), from now on kept up
+        # to date by write(). it is made from scratch first if it's missing, half
+        # written, not the one the slots are for, missing some products, or mostly old texts
+        with self._lock:
+            generation = self._conn.execute("SELECT generation FROM details_file").fetchone()[0]
+            products, slotted = self._conn.execute("SELECT COUNT(*), COUNT(details_slot) FROM products").fetchone()
+        try:
+            details = DetailsFile(path)
+        except (OSError, ValueError):
+            details = None
+        if details is not None:
+            if (details.generation == generation and slotted == products
+                    and len(details) <= DETAILS_SLACK * products + 1000):
+                with self._lock:
+                    self._details_path, self._generation = path, generation
+                return details
+            details.close()
+        self._make_details(path)
+        return DetailsFile(path)
+
+    def _make_details(self, path: str):
+        # writes every product's details to a new file and points the rows at it, in one
+        # transaction (the file is renamed into place before the database says it's the
+        # one, so a crash in between only means making it again next time)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._conn.execute("SELECT generation FROM details_file").fetchone()[0] + 1
+                ids = []
+
+                def texts():
+                    for pid, text in self._conn.execute("SELECT id, details FROM products ORDER BY rowid"):
+                        ids.append(pid)
+                        yield text
+
+                write_details(path, texts(), generation=generation)
+                self._conn.executemany("UPDATE products SET details_slot = ? WHERE id = ?", enumerate(ids))
+                self._conn.execute("UPDATE details_file SET generation = ?", (generation,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._details_path, self._generation = path, generation
+
+    def _append_details(self, rows: List[Row]) -> List[Optional[int]]:
+        # (inside write's transaction) appends the details that are new or different
+        # from what's saved, gives back each row's slot (None = keep the saved one)
+        slots: List[Optional[int]] = [None] * len(rows)
+        if self._details_path is None or not rows:
+            return slots
+        # the write lock, now: two programs never append at once, and the appended
+        # rows and the slots pointing at them are saved together
+        self._conn.execute("BEGIN IMMEDIATE")
+        if self._conn.execute("SELECT generation FROM details_file").fetchone()[0] != self._generation:
+            # another program has made a new file, leave it to that one
+            self._details_path = None
+            return slots
+        changed = []
+        for i, row in enumerate(rows):
+            saved = self._conn.execute("SELECT details, details_slot FROM products WHERE id = ?", (row[0],)).fetchone()
+            if saved is None or saved[0] != row[5] or saved[1] is None:
+                changed.append(i)
+        if changed:
+            try:
+                first = append_details(self._details_path, [rows[i][5] for i in changed])
+            except (OSError, ValueError):
+                # the details are saved here anyway, the next open_details makes the file again
+                self._details_path = None
+                return slots
+            for slot, i in enumerate(changed, first):
+                slots[i] = slot
+        return slots
+
+    def write(self, upserts: Iterable[Row], deletes: Iterable[str] = ()):
+        upserts = list(upserts)
+        full = [r for r in upserts if r[5] is not None]
+        # "with self._conn" = one transaction, committed at the end
+        with self._lock, self._conn:
+            slots = self._append_details(full)
+            # (details_slot only changes with the details: a row saved with the same text keeps its slot)
+            self._conn.executemany(
+                "INSERT INTO products (id, category, name, price, stock, details, delivery_eligible, details_slot)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET"
+                " category = excluded.category, name = excluded.name, price = excluded.price,"
+                " stock = excluded.stock, delivery_eligible = excluded.delivery_eligible,"
+                " details_slot = CASE WHEN excluded.details_slot IS NOT NULL THEN excluded.details_slot"
+                " WHEN details IS excluded.details THEN details_slot END,"
+                " details = excluded.details",
+                (row + (slot,) for row, slot in zip(full, slots)),
+            )
+            self._conn.executemany(
+                "UPDATE products SET category = ?, name = ?, price = ?, stock = ?, delivery_eligible = ? WHERE id = ?",
+                ((r[1], r[2], r[3], r[4], r[6], r[0]) for r in upserts if r[5] is None),
+            )
+            self._conn.executemany("DELETE FROM products WHERE id = ?", ((pid,) for pid in deletes))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
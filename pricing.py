@@ -0,0 +1,367 @@
+# promotions: meal deals, multi-buys and time-of-day prices
+#
+#   MealDeal    one item from `first` + one from `second` for a fixed price
+#               ("any drink + any cake for £5")
+#   MultiBuy    every `buy` items from `items`, only pay for `pay` of them
+#               ("books 3 for 2": the cheapest one in each 3 is free)
+#   TimedPrice  percent off `items` between two times of day ("happy hour")
+#
+# the rules are "compiled" once into two lookup tables:
+#   product id -> the rules that mention that product
+#   category   -> the rules that mention that category
+# so pricing a basket only looks at the rules its own lines can trigger.
+# with 10,000 promotions running, a 3 line basket still only checks a handful,
+# and the work grows with the basket size, not with the number of promotions.
+#
+# order of play:
+#   1. time-of-day prices lower the unit price (a line gets the best one going)
+#   2. meal deals and multi-buys, in the order they were listed, on what's left.
+#      each item can only be used by one deal
+#   3. (the employee discount in orders.py comes off whatever is left after that)
+#
+# rules can be saved in a JSON file (see load_rules / sample_rules), for example:
+#   [{"type": "meal_deal", "name": "Drink + cake for £5", "price": "5.00",
+#     "first": {"categories": ["drinks"]}, "second": {"categories": ["food"]}},
+#    {"type": "multi_buy", "name": "Books 3 for 2", "items": {"categories": ["books"]}, "buy": 3, "pay": 2},
+#    {"type": "timed", "name": "Happy hour", "items": {"categories": ["drinks"]},
+#     "percent": 20, "start": "15:00", "end": "17:00"}]
+#
+# run:
+#   python pricing.py sample > promotions.json      (write the example rules)
+#   python pricing.py check promotions.json          (read a file and list what's in it)
+
+import datetime
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from models import BasketItem, Pence, money, percent_of, to_pence
+
+PROMOTIONS_FILE = "promotions.json"   # the till uses this if it exists
+
+
+# =========================
+# RULES
+# =========================
+
+@dataclass(frozen=True)
+class Selector:
+    # which products a rule is about: these ids and/or everything in these categories
+    products: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+
+    def matches(self, pid: str, category: str) -> bool:
+        return pid in self.products or category in self.categories
+
+
+@dataclass
+class MealDeal:
+    name: str
+    first: Selector
+    second: Selector
+    price: Pence              # what one first + one second cost together
+
+
+@dataclass
+class MultiBuy:
+    name: str
+    items: Selector
+    buy: int                  # take this many...
+    pay: int                  # ...and pay for this many (the cheapest ones are free)
+
+
+@dataclass
+class TimedPrice:
+    name: str
+    items: Selector
+    percent: int              # percent off the unit price
+    start: datetime.time      # from (included)...
+    end: datetime.time        # ...until (not included). end before start = over midnight
+
+    def active(self, now: datetime.datetime) -> bool:
+        t = now.time()
+        if self.start <= self.end:
+            return self.start <= t < self.end
+        return t >= self.start or t < self.end
+
+
+def _selectors(rule) -> Tuple[Selector, ...]:
+    if isinstance(rule, MealDeal):
+        return rule.first, rule.second
+    return (rule.items,)
+
+
+@dataclass
+class Pricing:
+    # what the promotions did to one basket
+    savings: Pence = 0
+    applied: List[Tuple[str, Pence]] = field(default_factory=list)   # (promotion name, saving)
+
+
+# =========================
+# WORKING OUT A BASKET
+# =========================
+
+class _Line:
+    # one basket line while it's being priced
+    __slots__ = ("pid", "category", "price", "left")
+
+    def __init__(self, pid: str, category: str, price: Pence, qty: int):
+        self.pid = pid
+        self.category = category
+        self.price = price        # unit price after any time-of-day price
+        self.left = qty           # units not used by a deal yet
+
+
+def _free_positions(n: int, buy: int, pay: int) -> int:
+    # with units lined up most expensive first and put in groups of `buy`,
+    # how many of the first n positions are free ones (the last buy - pay of each group)
+    return (n // buy) * (buy - pay) + max(0, n % buy - pay)
+
+
+def _multi_buy(rule: MultiBuy, lines: List[_Line]) -> Pence:
+    lines = sorted((l for l in lines if l.left), key=lambda l: -l.price)
+    units = sum(l.left for l in lines)
+    used = units - units % rule.buy        # only whole groups count
+    saving = 0
+    start = 0
+    for line in lines:
+        if start >= used:
+            break
+        end = min(start + line.left, used)
+        free = _free_positions(end, rule.buy, rule.pay) - _free_positions(start, rule.buy, rule.pay)
+        saving += free * line.price
+        line.left -= end - start
+        start = end
+    return saving
+
+
+def _meal_deal(rule: MealDeal, firsts: List[_Line], seconds: List[_Line]) -> Pence:
+    # pairs the most expensive first with the most expensive second, and so on,
+    # while a pair costs more than the deal price (after that it's no saving)
+    firsts = sorted((l for l in firsts if l.left), key=lambda l: -l.price)
+    seconds = sorted((l for l in seconds if l.left), key=lambda l: -l.price)
+    saving = 0
+    i = j = 0
+    while i < len(firsts) and j < len(seconds):
+        a, b = firsts[i], seconds[j]
+        per_pair = a.price + b.price - rule.price
+        if per_pair <= 0:
+            break
+        pairs = min(a.left, b.left)
+        saving += pairs * per_pair
+        a.left -= pairs
+        b.left -= pairs
+        if not a.left:
+            i += 1
+        if not b.left:
+            j += 1
+    return saving
+
+
+def _evaluate(rules: List[object], matched: Dict[int, List[_Line]], now: datetime.datetime,
+              second_of: Dict[int, List[_Line]]) -> Pricing:
+    # matched = rule number -> the lines it could use (for a meal deal: the "first" lines,
+    # with its "second" lines in second_of)
+    result = Pricing()
+    order = sorted(set(matched) | set(second_of))
+
+    # 1. time-of-day prices: each line gets the best one going
+    best: Dict[int, Tuple[int, int]] = {}      # id(line) -> (percent, rule number)
+    lines_by_id: Dict[int, _Line] = {}
+    for n in order:
+        rule = rules[n]
+        if isinstance(rule, TimedPrice) and rule.active(now):
+            for line in matched.get(n, ()):
+                if rule.percent > best.get(id(line), (0, 0))[0]:
+                    best[id(line)] = (rule.percent, n)
+                    lines_by_id[id(line)] = line
+    per_rule: Dict[int, Pence] = {}
+    for key, (percent, n) in best.items():
+        line = lines_by_id[key]
+        off = percent_of(line.price, percent)
+        line.price -= off
+        per_rule[n] = per_rule.get(n, 0) + off * line.left
+    for n in sorted(per_rule):
+        if per_rule[n]:
+            result.applied.append((rules[n].name, per_rule[n]))
+
+    # 2. the deals, in the order they were listed
+    for n in order:
+        rule = rules[n]
+        if isinstance(rule, MultiBuy):
+            saving = _multi_buy(rule, matched.get(n, []))
+        elif isinstance(rule, MealDeal):
+            saving = _meal_deal(rule, matched.get(n, []), second_of.get(n, []))
+        else:
+            continue
+        if saving:
+            result.applied.append((rule.name, saving))
+
+    result.savings = sum(s for _name, s in result.applied)
+    return result
+
+
+class PricingEngine:
+
+    def __init__(self, rules: Iterable[object] = (), clock: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.rules: List[object] = list(rules)
+        self.clock = clock
+        # the lookup tables: (rule number, which selector) for each product id / category
+        # (which selector: 0 = items / first, 1 = second of a meal deal)
+        self._by_product: Dict[str, List[Tuple[int, int]]] = {}
+        self._by_category: Dict[str, List[Tuple[int, int]]] = {}
+        self._compile()
+
+    def _compile(self):
+        for n, rule in enumerate(self.rules):
+            # (anything else could take more off than the items cost)
+            if isinstance(rule, MultiBuy) and not 0 < rule.pay < rule.buy:
+                raise ValueError(f"{rule.name}: pay must be at least 1 and less than buy")
+            if isinstance(rule, TimedPrice) and not 0 <= rule.percent <= 100:
+                raise ValueError(f"{rule.name}: percent must be between 0 and 100")
+            if isinstance(rule, MealDeal) and rule.price <= 0:
+                raise ValueError(f"{rule.name}: the deal price must be more than 0")
+            for which, selector in enumerate(_selectors(rule)):
+                # (dict.fromkeys: an id or category named twice is still one entry)
+                for pid in dict.fromkeys(selector.products):
+                    self._by_product.setdefault(pid, []).append((n, which))
+                for category in dict.fromkeys(selector.categories):
+                    self._by_category.setdefault(category, []).append((n, which))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def price(self, items: Iterable[BasketItem], category_of: Callable[[str], str],
+              now: Optional[datetime.datetime] = None) -> Pricing:
+        # category_of(pid) -> the product's category (the basket doesn't keep it)
+        if not self.rules:
+            return Pricing()
+        matched: Dict[int, List[_Line]] = {}
+        second_of: Dict[int, List[_Line]] = {}
+        by_product, by_category = self._by_product, self._by_category
+        for item in items:
+            category = category_of(item.product_id)
+            for_product = by_product.get(item.product_id)
+            for_category = by_category.get(category)
+            if for_product and for_category:
+                # a rule that names both the product and its category only counts the line once
+                hits = list(dict.fromkeys(for_product + for_category))
+            else:
+                hits = for_product or for_category
+            if not hits:
+                continue
+            line = _Line(item.product_id, category, item.unit_price, item.qty)
+            # a line in both halves of a meal deal only counts as its "first"
+            firsts = {n for n, which in hits if which == 0}
+            for n, which in hits:
+                if which == 0:
+                    matched.setdefault(n, []).append(line)
+                elif n not in firsts:
+                    second_of.setdefault(n, []).append(line)
+        if not matched and not second_of:
+            return Pricing()
+        return _evaluate(self.rules, matched, now or self.clock(), second_of)
+
+
+def scan_price(rules: List[object], items: Iterable[BasketItem], category_of: Callable[[str], str],
+               now: datetime.datetime) -> Pricing:
+    # the slow way, for comparison: check every rule against every line
+    matched: Dict[int, List[_Line]] = {}
+    second_of: Dict[int, List[_Line]] = {}
+    for item in items:
+        category = category_of(item.product_id)
+        line = _Line(item.product_id, category, item.unit_price, item.qty)
+        for n, rule in enumerate(rules):
+            selectors = _selectors(rule)
+            if selectors[0].matches(item.product_id, category):
+                matched.setdefault(n, []).append(line)
+            elif len(selectors) > 1 and selectors[1].matches(item.product_id, category):
+                second_of.setdefault(n, []).append(line)
+    return _evaluate(rules, matched, now, second_of)
+
+
+# =========================
+# SAVING / LOADING RULES
+# =========================
+
+def _selector(data: dict) -> Selector:
+    return Selector(tuple(p.strip().upper() for p in data.get("products", ())),
+                    tuple(c.strip().lower() for c in data.get("categories", ())))
+
+
+def _time(text: str) -> datetime.time:
+    return datetime.datetime.strptime(text, "%H:%M").time()
+
+
+def rule_from_json(data: dict):
+    kind = data.get("type")
+    name = data.get("name") or kind
+    if kind == "meal_deal":
+        return MealDeal(name, _selector(data["first"]), _selector(data["second"]), to_pence(data["price"]))
+    if kind == "multi_buy":
+        return MultiBuy(name, _selector(data["items"]), int(data["buy"]), int(data["pay"]))
+    if kind == "timed":
+        return TimedPrice(name, _selector(data["items"]), int(data["percent"]),
+                          _time(data["start"]), _time(data["end"]))
+    raise ValueError(f"unknown promotion type {kind!r}")
+
+
+def rule_to_json(rule) -> dict:
+    def sel(s: Selector) -> dict:
+        out = {}
+        if s.products:
+            out["products"] = list(s.products)
+        if s.categories:
+            out["categories"] = list(s.categories)
+        return out
+
+    if isinstance(rule, MealDeal):
+        return {"type": "meal_deal", "name": rule.name, "price": f"{rule.price / 100:.2f}",
+                "first": sel(rule.first), "second": sel(rule.second)}
+    if isinstance(rule, MultiBuy):
+        return {"type": "multi_buy", "name": rule.name, "items": sel(rule.items), "buy": rule.buy, "pay": rule.pay}
+    return {"type": "timed", "name": rule.name, "items": sel(rule.items), "percent": rule.percent,
+            "start": rule.start.strftime("%H:%M"), "end": rule.end.strftime("%H:%M")}
+
+
+def load_rules(path: str) -> List[object]:
+    # raises ValueError (with the rule number) if a rule can't be read
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    rules = []
+    for n, item in enumerate(data, start=1):
+        try:
+            rules.append(rule_from_json(item))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: promotion {n}: {e}") from None
+    return rules
+
+
+def sample_rules() -> List[object]:
+    # a few example promotions for the seed menu
+    return [
+        MealDeal("Drink + cake for £5", Selector(categories=("drinks",)), Selector(categories=("food",)), 500),
+        MultiBuy("Books 3 for 2", Selector(categories=("books",)), buy=3, pay=2),
+        TimedPrice("Happy hour: 20% off drinks", Selector(categories=("drinks",)), 20,
+                   datetime.time(15, 0), datetime.time(17, 0)),
+    ]
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["sample"]:
+        print(json.dumps([rule_to_json(r) for r in sample_rules()], indent=2, ensure_ascii=False))
+    elif argv[:1] == ["check"] and len(argv) == 2:
+        engine = PricingEngine(load_rules(argv[1]))
+        for rule in engine.rules:
+            print(f"{type(rule).__name__:<10} {rule.name}"
+                  + (f" ({money(rule.price)})" if isinstance(rule, MealDeal) else ""))
+        print(f"{len(engine):,} promotions")
+    else:
+        raise SystemExit("usage: python pricing.py sample | python pricing.py check FILE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# opt-in timing of the shop's hot paths: how often each step of an order runs
+# and how long it takes (a call count plus a histogram of wall times)
+#
+#   import profiling
+#   metrics = profiling.enable()         # start timing
+#   ... run orders ...
+#   print(metrics.report())              # a text table
+#   metrics.write_snapshot("papercup.prom")   # Prometheus text format
+#   profiling.disable()                  # put everything back
+#
+# when profiling is off NOTHING is wrapped: enable() swaps timing wrappers in for
+# the functions below (everywhere they were imported) and disable() swaps the
+# originals back, so a normal run costs exactly what it did before.
+#
+# the till turns it on with PAPERCUP_PROFILE=papercup.prom python project.py
+# (the snapshot is written when the till exits), replay.py with --profile
+
+import bisect
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_ENV = "PAPERCUP_PROFILE"
+
+# histogram bucket upper bounds in seconds (1 microsecond up to 1 second)
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+           1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+# what gets timed: (module, attribute, name in the report)
+# "Class.method" attributes are methods, everything else is a plain function
+TARGETS = (
+    ("orders", "list_products", "list_products"),
+    ("orders", "add_to_basket", "add_to_basket"),
+    ("orders", "basket_total", "basket_total"),
+    ("orders", "apply_discount", "apply_discount"),
+    ("orders", "OrderService.browse", "order.browse"),
+    ("orders", "OrderService.search", "order.search"),
+    ("orders", "OrderService.add", "order.add"),
+    ("orders", "OrderService.adjust", "order.adjust"),
+    ("orders", "OrderService.remove", "order.remove"),
+    ("orders", "OrderService.apply_discount", "order.apply_discount"),
+    ("orders", "OrderService.checkout", "order.checkout"),
+    ("orders", "OrderService.cancel", "order.cancel"),
+    ("orders", "OrderService.add_product", "employee.add_product"),
+    ("orders", "OrderService.set_stock", "employee.set_stock"),
+    ("orders", "OrderService.change_stock", "employee.change_stock"),
+)
+
+
+class Timing:
+    # call count, total time and a histogram for one operation
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        # buckets[i] = calls that took <= BUCKETS[i] (and more than the one before),
+        # the last one is "slower than every bound"
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def quantile(self, q: float) -> float:
+        # an estimate: the upper bound of the bucket the q-th call fell into
+        if not self.count:
+            return 0.0
+        wanted = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= wanted:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings: Dict[str, Timing] = {}
+
+    def record(self, name: str, seconds: float):
+        slot = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.count += 1
+            timing.total += seconds
+            timing.buckets[slot] += 1
+
+    def clear(self):
+        with self._lock:
+            self.timings.clear()
+
+    def _snapshot(self) -> List[Tuple[str, Timing]]:
+        # a copy, so reporting doesn't race with tills still recording
+        with self._lock:
+            copies = []
+            for name, timing in sorted(self.timings.items()):
+                copy = Timing()
+                copy.count, copy.total, copy.buckets = timing.count, timing.total, list(timing.buckets)
+                copies.append((name, copy))
+            return copies
+
+    # ----- exporting -----
+
+    def report(self) -> str:
+        # a lined-up text table, slowest (by total time) first
+        rows = sorted(self._snapshot(), key=lambda item: -item[1].total)
+        if not rows:
+            return "no calls recorded"
+        lines = [f"{'operation':<24} {'calls':>10} {'total ms':>10} {'mean us':>10} {'p50 us':>9} {'p99 us':>9}"]
+        for name, t in rows:
+            lines.append(f"{name:<24} {t.count:>10,} {t.total * 1000:>10,.1f} {t.total / t.count * 1e6:>10,.1f}"
+                         f" {_us(t.quantile(0.5)):>9} {_us(t.quantile(0.99)):>9}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        # the Prometheus text format (a histogram per operation)
+        lines = [
+            "# HELP papercup_call_seconds Time spent in PaperCup operations.",
+            "# TYPE papercup_call_seconds histogram",
+        ]
+        for name, t in self._snapshot():
+            label = f'op="{name}"'
+            seen = 0
+            for bound, n in zip(BUCKETS, t.buckets):
+                seen += n
+                lines.append(f'papercup_call_seconds_bucket{{{label},le="{bound:g}"}} {seen}')
+            lines.append(f'papercup_call_seconds_bucket{{{label},le="+Inf"}} {t.count}')
+            lines.append(f"papercup_call_seconds_sum{{{label}}} {t.total:.9f}")
+            lines.append(f"papercup_call_seconds_count{{{label}}} {t.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: str):
+        # written to a temporary file and renamed, so a scraper never reads half a file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+def _us(seconds: float) -> str:
+    return "inf" if seconds == float("inf") else f"{seconds * 1e6:,.0f}"
+
+
+# =========================
+# SWITCHING IT ON AND OFF
+# =========================
+
+_active: Optional[Metrics] = None
+# (owner, attribute, original, wrapper) for everything swapped by enable()
+_patched: List[Tuple[object, str, object, object]] = []
+
+
+def _timed(func, name: str, metrics: Metrics):
+    clock = time.perf_counter
+    record = metrics.record
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, clock() - start)
+
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, "__name__", name)
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _modules_holding(attr: str, value):
+    # every loaded module that has `value` under the name `attr`
+    return [m for m in list(sys.modules.values()) if getattr(m, "__dict__", {}).get(attr) is value]
+
+
+def _swap(owner, attr: str, old, new):
+    setattr(owner, attr, new)
+    _patched.append((owner, attr, old, new))
+
+
+def enable(metrics: Optional[Metrics] = None) -> Metrics:
+    # starts timing every TARGET (calling it again just gives back the running Metrics)
+    global _active
+    if _active is not None:
+        return _active
+    metrics = metrics or Metrics()
+
+    for module_name, attr, name in TARGETS:
+        __import__(module_name)
+        owner = sys.modules[module_name]
+        if "." in attr:
+            class_name, attr = attr.split(".")
+            owner = getattr(owner, class_name)
+            original = owner.__dict__[attr]
+            _swap(owner, attr, original, _timed(original, name, metrics))
+            continue
+
+        # a plain function may also have been imported by name elsewhere
+        # ("from orders import basket_total"), so swap every copy we can find
+        original = getattr(owner, attr)
+        wrapper = _timed(original, name, metrics)
+        for module in _modules_holding(attr, original):
+            _swap(module, attr, original, wrapper)
+
+    _active = metrics
+    return metrics
+
+
+def disable():
+    # puts every original function back (the Metrics keep what they recorded)
+    global _active
+    while _patched:
+        owner, attr, original, wrapper = _patched.pop()
+        if getattr(owner, attr, None) is wrapper:
+            setattr(owner, attr, original)
+        # modules imported while profiling was on picked up the wrapper too
+        if not isinstance(owner, type):
+            for module in _modules_holding(attr, wrapper):
+                setattr(module, attr, original)
+    _active = None
+
+
+def active() -> Optional[Metrics]:
+    return _active
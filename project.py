@@ -1,90 +1,42 @@
 # importing stuff we need from python
-# dataclass = easy way to make "data objects" without writing loads of code
-from dataclasses import dataclass
+# os = lets us read settings from environment variables
+import os
+
+# lru_cache = remembers what a function gave back, so the same screen isn't built twice
+from functools import lru_cache
+
+# islice = takes the next N things from an iterator (without going through the rest)
+from itertools import islice
 
 # typing = not required, but helps me remember what type things are (list, dict etc)
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# our own files:
+# models = money, Product, BasketItem, Inventory and Basket (the data)
+# orders = the shop rules (add to basket, discount, checkout...) with no input()/print()
+# this file is just the till screens on top of them
+from deliveries import parse_changes, print_report
+from journal import ORDER_JOURNAL, OrderJournal
+from pricing import PROMOTIONS_FILE, PricingEngine, load_rules
+from models import INVENTORY_DB, Basket, Product, money, open_inventory, seed_inventory, to_pence
+from orders import (
+    CATEGORIES, EMPLOYEE_DISCOUNT_PERCENT, EMPLOYEE_PASSWORD, LOW_STOCK, Order, OrderError, OrderService,
+    basket_total, find_products, list_products,
+)
+from reservations import OutOfStock
+from stockalerts import REORDER_FILE, LowStockMonitor, load_thresholds, save_thresholds
+import profiling
 
 
 # these are like settings / constants for the app
 TEAM_NAME = "PaperCup"           # name that shows in the header
-EMPLOYEE_PASSWORD = "password"   # simple password for employee stuff
-
-
-# =========================
-# DATA MODELS (the "shapes" of our data)
-# =========================
-
-# dataclass makes python auto-create __init__ for us (so we can do Product(...))
-@dataclass
-class Product:
-    # this stores ONE product (like a menu item or a book)
-    id: str                # like "D1" or "F2"
-    category: str          # "drinks" or "food" or "books"
-    name: str              # product name
-    price: float           # how much it costs
-    stock: int             # how many left in stock
-    details: str           # extra info (ingredients / author / etc)
-    delivery_eligible: bool = False  # only really used for books
-
-
-@dataclass
-class BasketItem:
-    # this stores ONE line in the basket/order
-    product_id: str        # links back to a Product id
-    name: str              # name (we store it so we can print it easily)
-    unit_price: float      # price per 1 item
-    qty: int               # how many the customer wants
-
-
-# =========================
-# INVENTORY (all products)
-# =========================
-
-def seed_inventory() -> Dict[str, Product]:
-    # this function makes our starting inventory
-    # we return a dictionary where:
-    # key = product id (like "D1")
-    # value = Product object
-    return {
-        # DRINKS
-        "D1": Product("D1", "drinks", "Flat White", 3.60, 30, "Espresso + steamed milk"),
-        "D2": Product("D2", "drinks", "Matcha Latte", 4.10, 20, "Matcha + milk"),
-        "D3": Product("D3", "drinks", "Iced Americano", 3.20, 25, "Espresso + water + ice"),
-        "D4": Product("D4", "drinks", "Tea", 2.00, 10, "Tea + hot water"),
-        "D5": Product("D5", "drinks", "Herbal Tea", 3.00, 15, "Tea + herbs + hot water"),
-
-        # FOOD
-        "F1": Product("F1", "food", "Chocolate Brownie", 2.90, 15, "Cocoa, butter, eggs, sugar, flour"),
-        "F2": Product("F2", "food", "Carrot Cake Slice", 3.40, 10, "Carrot, cinnamon, cream cheese frosting"),
-        "F3": Product("F3", "food", "Cheese Cake", 4.00, 10, "Cream cheese, digestive, vanilla"),
-        "F4": Product("F4", "food", "Croissant", 3.00, 15, "Bread"),
-        "F5": Product("F5", "food", "Chesse Bagel", 4.00, 7, "Cheese, Bread"),
-
-        # BOOKS
-        "B1": Product("B1", "books", "Atomic Habits", 12.99, 8,
-                      "James Clear — Habit building", delivery_eligible=True),
-        "B2": Product("B2", "books", "The Midnight Library", 9.99, 6,
-                      "Matt Haig — Fiction", delivery_eligible=True),
-        "B3": Product("B3", "books", "Deep Work", 11.50, 5,
-                      "Cal Newport — Focus & productivity", delivery_eligible=True),
-        "B4": Product("B4", "books", "Seven Habits of Highly Effective People", 14.99, 7,
-                      "Steven Cohen — Habit building", delivery_eligible=True),
-        "B5": Product("B5", "books", "Harry Potter", 14.99, 7,
-                      "J K Rowling — Fiction", delivery_eligible=True),
-    }
+PAGE_SIZE = 20                   # products per page in the employee inventory view
 
 
 # =========================
 # SMALL HELPER FUNCTIONS
 # =========================
 
-def money(x: float) -> str:
-    # this just formats money nicely
-    # example: 3.6 -> "£3.60"
-    return f"£{x:.2f}"
-
-
 def pause():
     # this pauses the program so the user has time to read the screen
     input("\nPress Enter to continue...")
@@ -126,35 +78,69 @@ def ask_yes_no(prompt: str) -> bool:
 # SCREEN / UI FUNCTIONS (printing menus etc)
 # =========================
 
-def print_header(title: str):
+# every screen is built up as text first and then written with ONE show() call.
+# print() per line means one write to the terminal per line (the terminal is
+# line buffered), which you can see drawing line by line on a slow SSH/serial till
+
+def show(*lines: str):
+    # writes a whole screen in one go (a "line" may already have several lines in it)
+    # end="" because the text already ends in a newline, so the terminal gets exactly one write
+    print("\n".join(lines) + "\n", end="")
+
+
+@lru_cache(maxsize=256)
+def header(title: str) -> str:
     # makes a nice header so the app looks neat
-    print("\n" + "=" * 60)
-    print(f"{TEAM_NAME} — {title}")
-    print("=" * 60)
+    # (cached, the same few titles come up over and over)
+    rule = "=" * 60
+    return f"\n{rule}\n{TEAM_NAME} — {title}\n{rule}"
+
 
+def print_header(title: str):
+    show(header(title))
 
-def list_products(inventory: Dict[str, Product], category: str) -> List[Product]:
-    # get all products in ONE category (drinks/food/books)
-    # inventory.values() gives all Product objects
-    return [p for p in inventory.values() if p.category == category]
 
+class LineCache:
+    # remembers the text of each product's line on screen and only builds it
+    # again when something on that line changed (stock, price, name or category).
+    # showing the same category again after one sale re-formats one line, not all of them.
+    # (it goes by the values, not by which object it was given, so a ColumnarInventory's
+    # ProductViews, made new on every lookup, are cached too)
 
-def show_category(inventory: Dict[str, Product], category: str):
-    # prints a category list like:
-    # 1. Flat White — £3.60 (stock: 30)
-    print_header(category.upper())
+    def __init__(self, render: Callable[[Product], str], limit: int = 100_000):
+        self.render = render
+        self.limit = limit
+        # product id -> ((stock, price, name, category), text)
+        self._lines: Dict[str, tuple] = {}
 
-    products = list_products(inventory, category)
+    def __call__(self, p: Product) -> str:
+        shown = (p.stock, p.price, p.name, p.category)
+        hit = self._lines.get(p.id)
+        if hit is not None and hit[0] == shown:
+            return hit[1]
+        if len(self._lines) >= self.limit:
+            self._lines.clear()     # (keeps a huge inventory view from holding on to everything)
+        text = self.render(p)
+        self._lines[p.id] = (shown, text)
+        return text
 
-    # if there are none, show message and return (stop this function)
-    if not products:
-        print("No items found.")
-        return
 
+# 1. Flat White — £3.60 (stock: 30)       (the number is added in front when it is shown)
+menu_line = LineCache(lambda p: f"{p.name} — {money(p.price)} (stock: {p.stock})")
+# D1 | drinks | Flat White | £3.60 | stock=30
+inventory_line = LineCache(lambda p: f"{p.id} | {p.category} | {p.name} | {money(p.price)} | stock={p.stock}")
+
+
+def numbered(products: Iterable[Product]) -> List[str]:
     # enumerate gives us numbers starting at 1
-    for idx, p in enumerate(products, start=1):
-        stock_note = f"(stock: {p.stock})"
-        print(f"{idx}. {p.name} — {money(p.price)} {stock_note}")
+    return [f"{idx}. {menu_line(p)}" for idx, p in enumerate(products, start=1)]
+
+
+def show_category(inventory: Dict[str, Product], category: str):
+    # prints a category list like:
+    # 1. Flat White — £3.60 (stock: 30)
+    products = list_products(inventory, category)
+    show(header(category.upper()), *(numbered(products) or ["No items found."]))
 
 
 def choose_product(inventory: Dict[str, Product], category: str) -> Optional[Product]:
@@ -166,8 +152,7 @@ def choose_product(inventory: Dict[str, Product], category: str) -> Optional[Pro
     if not products:
         return None
 
-    show_category(inventory, category)
-    print("\n0. Back")
+    show(header(category.upper()), *numbered(products), "\n0. Back")
 
     # user chooses a number from the list
     choice = ask_int("Select an item number: ", 0, len(products))
@@ -180,62 +165,84 @@ def choose_product(inventory: Dict[str, Product], category: str) -> Optional[Pro
     return products[choice - 1]
 
 
-# =========================
-# BASKET / ORDER FUNCTIONS
-# =========================
+def search_products(service: OrderService) -> Optional[Product]:
+    # search names and details (e.g. "cheese", "habit", an author)
+    # returns the Product they pick, or None if they go back
+    query = input("Search for: ").strip()
+    products = service.search(query)
 
-def show_product_details(product: Product):
-    # prints extra details about the product
-    print_header("DETAILS")
-    print(f"Item: {product.name}")
-    print(f"Price: {money(product.price)}")
-    print(f"Stock: {product.stock}")
-    print(f"Details: {product.details}")
+    if not products:
+        show(header(f"RESULTS FOR '{query}'"), "No items found.")
+        pause()
+        return None
 
-    # only books have delivery info
-    if product.category == "books":
-        print(f"Delivery eligible: {'Yes' if product.delivery_eligible else 'No'}")
+    show(header(f"RESULTS FOR '{query}'"), *numbered(products), "\n0. Back")
 
+    choice = ask_int("Select an item number: ", 0, len(products))
+    if choice == 0:
+        return None
+    return products[choice - 1]
 
-def add_to_basket(basket: List[BasketItem], product: Product, qty: int):
-    # adds items to basket
-    # if already there, just increase quantity
 
-    for item in basket:
-        if item.product_id == product.id:
-            item.qty += qty
-            return
+# the menus never change, so each one is built once
+HOME_MENU = "\n".join([header("HOME"), "1. Customer ordering", "2. Employee admin", "0. Exit"])
+WELCOME_MENU = "\n".join([
+    header("WELCOME TO PAPERCUP"),
+    "What would you like to order today?",
+    "1. Drinks", "2. Food", "3. Books", "4. Review order", "5. Checkout", "6. Search", "0. Exit",
+])
+REVIEW_MENU = "\n".join(["\n1. Remove an item", "2. Adjust quantity", "0. Back"])
+PORTAL_MENU = "\n".join([
+    header("EMPLOYEE PORTAL"),
+    "1. Add new menu/book item", "2. Update stock", "3. View inventory",
+    "4. Receive delivery (many products)", "5. Low stock / reorder levels", "0. Back",
+])
 
-    # if not already in basket, add a new BasketItem line
-    basket.append(BasketItem(product.id, product.name, product.price, qty))
 
+# =========================
+# BASKET / ORDER FUNCTIONS
+# =========================
 
-def basket_total(basket: List[BasketItem]) -> float:
-    # adds up total price of basket
-    # sum(...) adds up all the values
-    return sum(i.unit_price * i.qty for i in basket)
+def show_product_details(product: Product):
+    # prints extra details about the product
+    lines = [
+        header("DETAILS"),
+        f"Item: {product.name}",
+        f"Price: {money(product.price)}",
+        f"Stock: {product.stock}",
+        f"Details: {product.details}",
+    ]
 
+    # only books have delivery info
+    if product.category == "books":
+        lines.append(f"Delivery eligible: {'Yes' if product.delivery_eligible else 'No'}")
+    show(*lines)
 
-def print_basket(basket: List[BasketItem]):
-    # shows the basket like a mini receipt
-    print_header("YOUR ORDER")
 
+def basket_lines(basket: Basket) -> List[str]:
+    # the basket like a mini receipt
     if not basket:
-        print("Basket is empty.")
-        return
+        return [header("YOUR ORDER"), "Basket is empty."]
 
+    lines = [header("YOUR ORDER")]
     for idx, item in enumerate(basket, start=1):
         line_total = item.unit_price * item.qty
-        print(f"{idx}. {item.name} x{item.qty} — {money(item.unit_price)} each = {money(line_total)}")
+        lines.append(f"{idx}. {item.name} x{item.qty} — {money(item.unit_price)} each = {money(line_total)}")
+
+    lines.append("-" * 60)
+    lines.append(f"Total: {money(basket_total(basket))}")
+    return lines
 
-    print("-" * 60)
-    print(f"Total: {money(basket_total(basket))}")
 
+def print_basket(basket: Basket):
+    show(*basket_lines(basket))
 
-def remove_from_basket(basket: List[BasketItem], inventory: Dict[str, Product]):
+
+def remove_from_basket(service: OrderService, order: Order):
     # removes a whole line from the basket
-    # IMPORTANT: we must give stock back when removing
+    # (the order service gives the stock back for us)
 
+    basket = order.basket
     if not basket:
         return
 
@@ -245,20 +252,17 @@ def remove_from_basket(basket: List[BasketItem], inventory: Dict[str, Product]):
     if choice == 0:
         return
 
-    # pop removes and returns the item at that index
-    removed = basket.pop(choice - 1)
-
-    # give stock back into inventory (so it's available again)
-    if removed.product_id in inventory:
-        inventory[removed.product_id].stock += removed.qty
+    # find the line they picked, then remove it (remove gives us the line back)
+    removed = service.remove(order, basket.line_at(choice - 1).product_id)
 
     print(f"Removed: {removed.name}")
 
 
-def adjust_basket_qty(basket: List[BasketItem], inventory: Dict[str, Product]):
+def adjust_basket_qty(service: OrderService, order: Order):
     # changes how many of something is in the basket
     # IMPORTANT: we must not let qty go above stock
 
+    basket = order.basket
     if not basket:
         return
 
@@ -268,21 +272,15 @@ def adjust_basket_qty(basket: List[BasketItem], inventory: Dict[str, Product]):
     if choice == 0:
         return
 
-    item = basket[choice - 1]
+    item = basket.line_at(choice - 1)
 
     # if product id is missing somehow, just stop
-    if item.product_id not in inventory:
+    if item.product_id not in service.inventory:
         print("Sorry, that product no longer exists in inventory.")
         return
 
-    product = inventory[item.product_id]
-
-    old_qty = item.qty
-
-    # key idea:
-    # we already took old_qty from stock when we added to basket
-    # so max we can go to = old_qty + whatever is left in stock
-    max_allowed = old_qty + product.stock
+    # max we can go to = what this basket already holds + whatever is left in stock
+    max_allowed = service.max_qty(order, item.product_id)
 
     new_qty = ask_int(
         f"New quantity for {item.name} (1-{max_allowed}): ",
@@ -290,32 +288,20 @@ def adjust_basket_qty(basket: List[BasketItem], inventory: Dict[str, Product]):
         max_allowed
     )
 
-    # delta tells us how much we changed by
-    # example: old 3 -> new 5 => delta = +2 (we need 2 more stock)
-    # example: old 5 -> new 2 => delta = -3 (we return 3 stock)
-    delta = new_qty - old_qty
-
-    # update stock:
-    # if delta is positive, this subtracts more stock
-    # if delta is negative, subtracting a negative adds stock back
-    product.stock -= delta
-
-    # update basket quantity
-    item.qty = new_qty
+    # the service takes more stock or gives some back, and fixes the basket
+    # (another till might have bought the last ones while we were typing)
+    try:
+        service.adjust(order, item.product_id, new_qty)
+    except OutOfStock as e:
+        print(f"Sorry, only {e.available} more left now.")
+        return
+    except OrderError as e:
+        print(e)
+        return
 
     print("Updated.")
 
 
-def apply_discount(total: float) -> Tuple[float, float]:
-    # this applies 10% off
-    # returns: (new_total, discount_amount)
-
-    discount_rate = 0.10
-    discount_amount = total * discount_rate
-    new_total = total - discount_amount
-    return new_total, discount_amount
-
-
 # =========================
 # EMPLOYEE FUNCTIONS
 # =========================
@@ -327,27 +313,27 @@ def employee_login() -> bool:
     return pw == EMPLOYEE_PASSWORD
 
 
-def employee_add_item(inventory: Dict[str, Product]):
+def employee_add_item(service: OrderService):
     # lets employee add a new product to the inventory
     print_header("ADD NEW ITEM")
 
     new_id = input("New ID (e.g. D4 / F3 / B9): ").strip().upper()
 
-    # don't allow duplicate ids
-    if new_id in inventory:
+    # don't allow duplicate ids (checked now so they don't type everything for nothing)
+    if new_id in service.inventory:
         print("That ID already exists.")
         return
 
     category = input("Category (drinks/food/books): ").strip().lower()
-    if category not in ("drinks", "food", "books"):
+    if category not in CATEGORIES:
         print("Invalid category.")
         return
 
     name = input("Name: ").strip()
 
-    # NOTE: float(...) and int(...) can crash if user types letters
+    # NOTE: to_pence(...) and int(...) can crash if user types letters
     # (but it's ok for now, could improve later)
-    price = float(input("Price (e.g. 3.50): ").strip())
+    price = to_pence(input("Price (e.g. 3.50): "))
     stock = int(input("Stock (e.g. 10): ").strip())
 
     details = input("Details (ingredients/author/etc): ").strip()
@@ -356,74 +342,173 @@ def employee_add_item(inventory: Dict[str, Product]):
     if category == "books":
         delivery_eligible = ask_yes_no("Delivery eligible?")
 
-    # actually add to inventory dict
-    inventory[new_id] = Product(
-        id=new_id,
-        category=category,
-        name=name,
-        price=price,
-        stock=stock,
-        details=details,
-        delivery_eligible=delivery_eligible,
-    )
+    # actually add to inventory (the service checks everything again)
+    try:
+        service.add_product(new_id, category, name, price, stock, details, delivery_eligible)
+    except OrderError as e:
+        print(e)
+        return
 
     print("Item added!")
 
 
-def employee_update_stock(inventory: Dict[str, Product]):
+def employee_update_stock(service: OrderService):
     # lets employee change stock for a product
     print_header("UPDATE STOCK")
 
     pid = input("Enter product ID: ").strip().upper()
-    if pid not in inventory:
+    if pid not in service.inventory:
         print("Not found.")
         return
 
-    p = inventory[pid]
+    p = service.inventory[pid]
     print(f"Current: {p.name} stock={p.stock}")
 
     new_stock = int(input("New stock value: ").strip())
-    p.stock = new_stock
+    try:
+        service.set_stock(pid, new_stock)
+    except OrderError as e:
+        print(e)
+        return
 
     print("Stock updated.")
 
 
+class Pager:
+    # splits an iterator into pages, only pulling from it as far as the pages asked for
+    # (pages already seen are kept, so going back doesn't pull anything again)
+
+    def __init__(self, items: Iterator, size: int = PAGE_SIZE):
+        self._items = items
+        self.size = size
+        self.pages: List[list] = []
+        self.done = False     # True once the iterator has run out
+
+    def page(self, n: int) -> list:
+        # page n (0 = the first), or [] if there aren't that many
+        while len(self.pages) <= n and not self.done:
+            chunk = list(islice(self._items, self.size))
+            if len(chunk) < self.size:
+                self.done = True
+            if chunk:
+                self.pages.append(chunk)
+        return self.pages[n] if n < len(self.pages) else []
+
+    def has_next(self, n: int) -> bool:
+        # (pulls the next page to find out, that's only `size` more products)
+        return bool(self.page(n + 1))
+
+
+def employee_view_inventory(service: OrderService):
+    # the whole inventory a page at a time, optionally only one category,
+    # only products running low, or only ids starting with something.
+    # only the page on screen is ever read and formatted, so this opens
+    # straight away even with a million products
+    print_header("VIEW INVENTORY")
+    category = input("Category (drinks/food/books, Enter = all): ").strip().lower() or None
+    if category is not None and category not in CATEGORIES:
+        print("Invalid category.")
+        return
+    max_stock = LOW_STOCK if ask_yes_no(f"Only products running low (stock {LOW_STOCK} or less)?") else None
+    prefix = input("Only IDs starting with (Enter = any): ").strip().upper()
+
+    title = " / ".join(["INVENTORY", *([category.upper()] if category else []),
+                        *([f"STOCK <= {max_stock}"] if max_stock is not None else []),
+                        *([f"ID {prefix}..."] if prefix else [])])
+    pager = Pager(find_products(service.inventory, category, prefix, max_stock))
+    n = 0
+    while True:
+        products = pager.page(n)
+        if not products:
+            show(header(title), "No items found.")
+            pause()
+            return
+        more = pager.has_next(n)
+        first = n * pager.size + 1
+        show(
+            header(title),
+            *map(inventory_line, products),
+            f"\nPage {n + 1}{f' of {len(pager.pages)}' if pager.done else ''}"
+            f" (products {first:,}-{first + len(products) - 1:,})",
+            ("N. Next page  " if more else "") + ("P. Previous page  " if n else "") + "0. Back",
+        )
+        choice = input("Select: ").strip().lower()
+        if choice == "0":
+            return
+        if choice == "n" and more:
+            n += 1
+        elif choice == "p" and n:
+            n -= 1
+
+
+def employee_receive_delivery(service: OrderService):
+    # lots of stock changes in one go (delivery day / stock take)
+    # the format is explained at the top of deliveries.py
+    show(header("RECEIVE DELIVERY"), "One product per line: ID +N (received), ID -N (taken off) or ID =N (counted).")
+    path = input("File with the changes (or press Enter to type them): ").strip()
+
+    if path:
+        try:
+            with open(path, encoding="utf-8-sig") as f:
+                changes, bad = parse_changes(f)
+        except OSError as e:
+            print(f"Can't open that file: {e}")
+            return
+    else:
+        print("Type the changes, then an empty line to finish:")
+        lines = []
+        while True:
+            line = input()
+            if not line.strip():
+                break
+            lines.append(line)
+        changes, bad = parse_changes(lines)
+
+    # don't change anything if a line couldn't be read
+    if bad:
+        for line_no, text in bad:
+            print(f"Line {line_no}: can't read {text!r}")
+        print("Nothing was changed.")
+        return
+    if not changes:
+        print("No changes given.")
+        return
+
+    # either all of it goes in, or none of it does
+    print_report(service.change_stock(changes))
+
+
 # =========================
 # CUSTOMER FLOW (main ordering journey)
 # =========================
 
-def customer_flow(inventory: Dict[str, Product]):
-    # basket starts empty
-    basket: List[BasketItem] = []
-
-    # discount flags
-    discounted = False
-    discount_amount = 0.0
+def customer_flow(service: OrderService):
+    # a new order with an empty basket
+    order = service.new_order()
+    basket = order.basket
 
     # main loop so the app keeps running until user exits
     while True:
-        print_header("WELCOME TO PAPERCUP")
-        print("What would you like to order today?")
-        print("1. Drinks")
-        print("2. Food")
-        print("3. Books")
-        print("4. Review order")
-        print("5. Checkout")
-        print("0. Exit")
+        show(WELCOME_MENU)
 
-        choice = ask_int("Select an option: ", 0, 5)
+        choice = ask_int("Select an option: ", 0, 6)
 
         # exit the customer journey
         if choice == 0:
+            # they are leaving without ordering, so put their basket back on the shelf
+            # (otherwise that stock would be gone for good once it is saved)
+            service.cancel(order)
             print("Thank you for visitng, hope to see you soon!")
             return
 
-        # choose from categories
-        if choice in (1, 2, 3):
-            # using a dictionary to map menu choice -> category string
-            category = {1: "drinks", 2: "food", 3: "books"}[choice]
-
-            product = choose_product(inventory, category)
+        # choose from categories (or from search results)
+        if choice in (1, 2, 3, 6):
+            if choice == 6:
+                product = search_products(service)
+            else:
+                # using a dictionary to map menu choice -> category string
+                category = {1: "drinks", 2: "food", 3: "books"}[choice]
+                product = choose_product(service.inventory, category)
             if not product:
                 continue  # goes back to the main menu
 
@@ -441,9 +526,14 @@ def customer_flow(inventory: Dict[str, Product]):
             # only allow qty up to current stock
             qty = ask_int(f"How many '{product.name}'? ", 1, min(99, product.stock))
 
-            # add to basket and reduce stock (so we "reserve" it)
-            add_to_basket(basket, product, qty)
-            product.stock -= qty
+            # the service reserves the stock (another till may have just taken it)
+            # and adds it to the basket
+            try:
+                service.add(order, product.id, qty)
+            except OutOfStock as e:
+                print(f"Sorry, only {e.available} left now.")
+                pause()
+                continue
 
             print("Added to basket!")
             pause()
@@ -452,10 +542,7 @@ def customer_flow(inventory: Dict[str, Product]):
         # REVIEW ORDER
         if choice == 4:
             while True:
-                print_basket(basket)
-                print("\n1. Remove an item")
-                print("2. Adjust quantity")
-                print("0. Back")
+                show(*basket_lines(basket), REVIEW_MENU)
 
                 sub = ask_int("Select: ", 0, 2)
 
@@ -463,11 +550,11 @@ def customer_flow(inventory: Dict[str, Product]):
                     break
 
                 if sub == 1:
-                    remove_from_basket(basket, inventory)
+                    remove_from_basket(service, order)
                     pause()
 
                 elif sub == 2:
-                    adjust_basket_qty(basket, inventory)
+                    adjust_basket_qty(service, order)
                     pause()
 
             continue
@@ -481,16 +568,12 @@ def customer_flow(inventory: Dict[str, Product]):
                 continue
 
             print_basket(basket)
-            total = basket_total(basket)
 
-            # employee discount option
+            # employee discount option (only once per order)
             if ask_yes_no("Are you an employee?"):
                 if employee_login():
-                    if not discounted and ask_yes_no("Apply 10% promotional discount?"):
-                        new_total, disc = apply_discount(total)
-                        discounted = True
-                        discount_amount = disc
-                        total = new_total
+                    if not order.discount_percent and ask_yes_no(f"Apply {EMPLOYEE_DISCOUNT_PERCENT}% promotional discount?"):
+                        discount_amount = service.apply_discount(order)
                         print(f"Discount applied: -{money(discount_amount)}")
                     else:
                         print("No discount applied.")
@@ -498,32 +581,43 @@ def customer_flow(inventory: Dict[str, Product]):
                     print("Incorrect password. Continuing as customer.")
 
             # delivery part (only if basket includes books)
-            # NOTE: this line is a bit advanced: "any(... for ... in ...)"
-            # it checks if at least one basket item is a book
-            has_books = any(
-                inventory.get(i.product_id, Product("", "", "", 0, 0, "")).category == "books"
-                for i in basket
-            )
-
-            delivery = False
-            if has_books:
-                delivery = ask_yes_no("Do you want book delivery (where eligible)?")
-                if delivery:
+            order.delivery = None
+            if service.has_books(order):
+                if ask_yes_no("Do you want book delivery (where eligible)?"):
                     name = input("Delivery name: ").strip()
                     address = input("Delivery address: ").strip()
-                    print(f"Delivery set for: {name}, {address}")
-
-            print_header("CONFIRMATION")
-            if discounted:
-                print(f"Discount: -{money(discount_amount)}")
-            print(f"Final total: {money(total)}")
+                    try:
+                        service.set_delivery(order, name, address)
+                        print(f"Delivery set for: {name}, {address}")
+                    except OrderError as e:
+                        print(e)
+
+            # the order works out the discount from the basket as it is now
+            bill = order.bill()
+            lines = [header("CONFIRMATION")]
+            for promotion, saving in bill.promotions:
+                lines.append(f"{promotion}: -{money(saving)}")
+            if order.discount_percent:
+                lines.append(f"Discount: -{money(bill.discount)}")
+            lines.append(f"Final total: {money(bill.total)}")
+            show(*lines)
 
             if ask_yes_no("Place order?"):
-                print_header("STATUS")
-                print("Preparing your order ☕📚")
-                if delivery:
-                    print("Your books will be delivered as requested.")
-                print("Thank you!")
+                # the reserved stock is now sold for good
+                # (if the basket sat too long, its stock may have gone to someone else)
+                try:
+                    receipt = service.checkout(order)
+                except OutOfStock as e:
+                    name = basket.get(e.product_id).name
+                    print(f"Sorry, only {e.available} more '{name}' left now. Please adjust your order.")
+                    pause()
+                    continue
+
+                lines = [header("STATUS"), "Preparing your order ☕📚"]
+                if receipt.delivery:
+                    lines.append("Your books will be delivered as requested.")
+                lines.append("Thank you!")
+                show(*lines)
                 pause()
                 return
             else:
@@ -536,66 +630,144 @@ def customer_flow(inventory: Dict[str, Product]):
 # EMPLOYEE PORTAL (admin menu)
 # =========================
 
-def employee_portal(inventory: Dict[str, Product]):
+def employee_low_stock(low_stock: LowStockMonitor, reorder_path: Optional[str] = REORDER_FILE):
+    # what's at or below its reorder level (most urgent first), and changing a level
+    while True:
+        low = low_stock.low(limit=PAGE_SIZE)
+        lines = [header("LOW STOCK")]
+        lines += [f"{p.id} | {p.name} | stock={p.stock} | reorder at {level}" for p, level in low]
+        if not low:
+            lines.append("Nothing is running low.")
+        elif len(low_stock) > len(low):
+            lines.append(f"... and {len(low_stock) - len(low):,} more")
+        lines.append(f"\n(reorder level is {low_stock.default} unless set for a product)")
+        show(*lines)
+
+        entry = input("Set a reorder level as ID=N (N=default to reset, Enter = back): ").strip().upper()
+        if not entry:
+            return
+        pid, _, level = entry.partition("=")
+        pid, level = pid.strip(), level.strip()
+        if pid not in low_stock.inventory:
+            print("Not found.")
+        elif level == "DEFAULT":
+            low_stock.set_threshold(pid, None)
+        elif level.isdigit():
+            low_stock.set_threshold(pid, int(level))
+        else:
+            print("Please type it like D1=10.")
+            continue
+        if reorder_path:
+            save_thresholds(low_stock.thresholds, reorder_path)
+
+
+def employee_portal(service: OrderService, low_stock: Optional[LowStockMonitor] = None,
+                    reorder_path: Optional[str] = REORDER_FILE):
     # must login first
     if not employee_login():
         print("Access denied.")
         pause()
         return
 
+    # the alerts that came in since the portal was last opened are shown above the menu
+    # (by alert number, several alerts can have the same time)
+    seen = 0
     while True:
-        print_header("EMPLOYEE PORTAL")
-        print("1. Add new menu/book item")
-        print("2. Update stock")
-        print("3. View inventory")
-        print("0. Back")
+        lines = [PORTAL_MENU]
+        if low_stock is not None:
+            new = low_stock.since(seen)
+            if new:
+                seen = new[-1].seq
+                lines[:0] = ["", *map(str, new)]
+        show(*lines)
 
-        choice = ask_int("Select: ", 0, 3)
+        choice = ask_int("Select: ", 0, 5)
 
         if choice == 0:
             return
 
         if choice == 1:
-            employee_add_item(inventory)
+            employee_add_item(service)
             pause()
 
         elif choice == 2:
-            employee_update_stock(inventory)
+            employee_update_stock(service)
             pause()
 
         elif choice == 3:
-            print_header("INVENTORY")
-            for p in inventory.values():
-                print(f"{p.id} | {p.category} | {p.name} | {money(p.price)} | stock={p.stock}")
+            employee_view_inventory(service)
+
+        elif choice == 4:
+            employee_receive_delivery(service)
             pause()
 
+        elif choice == 5:
+            if low_stock is None:
+                print("Low stock alerts are off.")
+                pause()
+            else:
+                employee_low_stock(low_stock, reorder_path)
+
 
 # =========================
 # MAIN APP START
 # =========================
 
-def main():
+def main(db_path: Optional[str] = INVENTORY_DB, journal_path: Optional[str] = ORDER_JOURNAL,
+         promotions_path: Optional[str] = PROMOTIONS_FILE, reorder_path: Optional[str] = REORDER_FILE):
     # get starting inventory
-    inventory = seed_inventory()
-
-    # home loop (choose customer or employee)
-    while True:
-        print_header("HOME")
-        print("1. Customer ordering")
-        print("2. Employee admin")
-        print("0. Exit")
-
-        choice = ask_int("Select: ", 0, 2)
-
-        if choice == 0:
-            print("Goodbye!")
-            break
-
-        elif choice == 1:
-            customer_flow(inventory)
-
-        elif choice == 2:
-            employee_portal(inventory)
+    # (from the saved file if we have one, db_path=None = fresh one every run like before)
+    inventory = open_inventory(db_path) if db_path else seed_inventory()
+    # the promotions running today, if there's a promotions file (see pricing.py)
+    pricing = None
+    if promotions_path and os.path.exists(promotions_path):
+        pricing = PricingEngine(load_rules(promotions_path))
+    # every placed order is written to the journal before the receipt is shown
+    journal = OrderJournal(journal_path) if journal_path else None
+    # PAPERCUP_PROFILE=papercup.prom times every step of every order (see profiling.py)
+    profile_path = os.environ.get(profiling.PROFILE_ENV)
+    metrics = profiling.enable() if profile_path else None
+
+    try:
+        home_loop(inventory, journal, pricing, reorder_path)
+    finally:
+        # save whatever changed (even if something crashed) and close the files
+        inventory.close()
+        if journal is not None:
+            journal.close()
+        if metrics is not None:
+            profiling.disable()
+            metrics.write_snapshot(profile_path)
+
+
+def home_loop(inventory: Dict[str, Product], journal: Optional[OrderJournal] = None,
+              pricing: Optional[PricingEngine] = None, reorder_path: Optional[str] = REORDER_FILE):
+    # one order service (and so one set of reservations) for the whole till
+    service = OrderService(inventory, journal=journal, pricing=pricing)
+    # watches every stock change from here on (see stockalerts.py)
+    low_stock = LowStockMonitor(inventory, load_thresholds(reorder_path) if reorder_path else {})
+
+    try:
+        # home loop (choose customer or employee)
+        while True:
+            show(HOME_MENU)
+
+            choice = ask_int("Select: ", 0, 2)
+
+            if choice == 0:
+                print("Goodbye!")
+                break
+
+            elif choice == 1:
+                customer_flow(service)
+
+            elif choice == 2:
+                employee_portal(service, low_stock, reorder_path)
+
+            # save what changed in that visit (only the changed products are written)
+            inventory.flush()
+    finally:
+        low_stock.close()
 
 
 # this means: only run main() if we run this file directly
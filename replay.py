@@ -0,0 +1,141 @@
+# runs scripted orders through the order service, no terminal needed
+#
+# each line of the orders file is one order in JSON, for example:
+#   {"lines": [["D1", 2], ["B1", 1]], "discount": true,
+#    "delivery": {"name": "Sam", "address": "1 High St"}}
+# ("discount" and "delivery" are optional)
+#
+# run:
+#   python replay.py orders.jsonl              (replay a file)
+#   python replay.py --random 10000            (make up 10,000 random orders)
+#   python replay.py --random 10000 --restock 1000000
+#   python replay.py orders.jsonl --db papercup.db   (against the saved inventory)
+#   python replay.py --random 10000 --promotions promotions.json
+#   python replay.py --random 10000 --profile        (time every step, see profiling.py)
+#   python replay.py --random 10000 --profile papercup.prom
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, Iterable, Iterator, List
+
+from models import Product, money, open_inventory, seed_inventory
+from orders import OrderError, OrderService
+from pricing import PricingEngine, load_rules
+from reservations import OutOfStock
+import profiling
+
+
+def read_orders(path: str) -> Iterator[dict]:
+    # reads one order per line, skipping blank lines
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def random_orders(inventory: Dict[str, Product], count: int, seed: int = 1) -> Iterator[dict]:
+    # makes up orders: 1-5 random products, 1-3 of each,
+    # 1 in 10 get the employee discount and half of the book orders are delivered
+    rng = random.Random(seed)
+    pids = list(inventory)
+    books = {pid for pid, p in inventory.items() if p.category == "books"}
+    for n in range(count):
+        lines = [[pid, rng.randint(1, 3)] for pid in rng.sample(pids, rng.randint(1, min(5, len(pids))))]
+        order = {"lines": lines, "discount": rng.random() < 0.1}
+        if any(pid in books for pid, _ in lines) and rng.random() < 0.5:
+            order["delivery"] = {"name": f"Customer {n}", "address": f"{n} High Street"}
+        yield order
+
+
+def place(service: OrderService, script: dict):
+    # runs one scripted order from start to finish, gives back the Receipt
+    order = service.new_order()
+    try:
+        for pid, qty in script["lines"]:
+            service.add(order, pid, qty)
+        if script.get("discount"):
+            service.apply_discount(order)
+        delivery = script.get("delivery")
+        if delivery:
+            service.set_delivery(order, delivery["name"], delivery["address"])
+        return service.checkout(order)
+    except (OrderError, OutOfStock):
+        # give back anything this order was holding before passing the problem on
+        service.cancel(order)
+        raise
+
+
+def replay(service: OrderService, scripts: Iterable[dict]) -> dict:
+    placed = failed = 0
+    takings = 0
+    errors: Dict[str, int] = {}
+    start = time.perf_counter()
+    for script in scripts:
+        try:
+            receipt = place(service, script)
+        except (OrderError, OutOfStock) as e:
+            failed += 1
+            kind = type(e).__name__
+            errors[kind] = errors.get(kind, 0) + 1
+            continue
+        placed += 1
+        takings += receipt.total
+    elapsed = time.perf_counter() - start
+    return {
+        "placed": placed,
+        "failed": failed,
+        "errors": errors,
+        "takings": takings,
+        "seconds": elapsed,
+        "orders_per_sec": (placed + failed) / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Replay scripted orders through the PaperCup order service")
+    parser.add_argument("orders", nargs="?", help="JSON-lines file of orders")
+    parser.add_argument("--random", type=int, metavar="N", help="make up N random orders instead")
+    parser.add_argument("--db", help="use the saved inventory in this SQLite file (default: a fresh seed)")
+    parser.add_argument("--restock", type=int, metavar="N", help="set every product's stock to N first")
+    parser.add_argument("--promotions", help="run the promotions in this JSON file (see pricing.py)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="time every step and print a report (and write a Prometheus snapshot to FILE)")
+    args = parser.parse_args(argv)
+
+    if not args.orders and not args.random:
+        parser.error("give an orders file or --random N")
+
+    inventory = open_inventory(args.db) if args.db else seed_inventory()
+    try:
+        if args.restock is not None:
+            for pid in list(inventory):
+                inventory.set_stock(pid, args.restock)
+
+        pricing = PricingEngine(load_rules(args.promotions)) if args.promotions else None
+        service = OrderService(inventory, pricing=pricing)
+        scripts = random_orders(inventory, args.random) if args.random else read_orders(args.orders)
+        metrics = profiling.enable() if args.profile is not None else None
+        try:
+            result = replay(service, scripts)
+        finally:
+            profiling.disable()
+    finally:
+        inventory.close()
+
+    print(f"placed:   {result['placed']:,}")
+    print(f"failed:   {result['failed']:,} {result['errors'] or ''}")
+    print(f"takings:  {money(result['takings'])}")
+    print(f"time:     {result['seconds']:.2f}s ({result['orders_per_sec']:,.0f} orders/sec)")
+
+    if metrics is not None:
+        print()
+        print(metrics.report())
+        if args.profile:
+            metrics.write_snapshot(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# holding stock for baskets, safely, when several tills share one inventory
+#
+# the old way was "if product.stock >= qty: product.stock -= qty" straight on the
+# Product. with two tills (threads) doing that at once, both can pass the check
+# before either takes the stock, and we sell more than we have.
+#
+# ReservationService does the check and the take while holding a lock for that
+# product, so only one till at a time can touch a given product's stock.
+# (tills buying *different* products don't wait for each other, unless you pick
+# the "global" lock strategy)
+#
+# reserved stock is taken off product.stock straight away (so menus show what is
+# really left) and every reservation has a time limit (ttl). if a basket is
+# abandoned, its stock goes back on the shelf by itself once the time is up.
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_TTL = 15 * 60   # seconds a basket can sit untouched before its stock is released
+
+
+class OutOfStock(Exception):
+    # raised when there isn't enough stock left to reserve
+    def __init__(self, product_id: str, wanted: int, available: int):
+        super().__init__(f"{product_id}: wanted {wanted}, only {available} available")
+        self.product_id = product_id
+        self.wanted = wanted
+        self.available = available
+
+
+@dataclass
+class Reservation:
+    holder: object         # whoever is holding the stock (usually a Basket)
+    product_id: str
+    qty: int
+    # (all of a holder's reservations time out together, see ReservationService.expires_at)
+
+
+# =========================
+# LOCK STRATEGIES (how products are given locks)
+# =========================
+
+class GlobalLock:
+    # one lock for the whole shop (simple, but tills queue up behind each other)
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def lock_for(self, pid: str):
+        return self._lock
+
+
+class StripedLocks:
+    # a fixed number of locks, each product always uses the same one
+    # (two products can share a lock, but it's cheap and the number never grows)
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock_for(self, pid: str):
+        return self._locks[hash(pid) % len(self._locks)]
+
+
+class PerProductLocks:
+    # one lock per product, made the first time that product is touched
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def lock_for(self, pid: str):
+        lock = self._locks.get(pid)
+        if lock is None:
+            # setdefault is atomic, so two threads can't end up with different locks
+            lock = self._locks.setdefault(pid, threading.Lock())
+        return lock
+
+
+class NoLocks:
+    # NOT SAFE - no locking at all. only here so benchmarks can show the oversell
+    def lock_for(self, pid: str):
+        return nullcontext()
+
+
+LOCK_STRATEGIES = {
+    "global": GlobalLock,
+    "striped": StripedLocks,
+    "per-product": PerProductLocks,
+    "none": NoLocks,
+}
+
+
+# =========================
+# RESERVATION SERVICE
+# =========================
+
+class ReservationService:
+    # lock order (to avoid deadlocks): a product's lock first, then self._book.
+    # nothing ever waits for a product lock while holding self._book.
+
+    def __init__(self, inventory, ttl: float = DEFAULT_TTL, locks="per-product", clock=time.monotonic):
+        self.inventory = inventory
+        self.ttl = ttl
+        self.clock = clock
+        self.locks = LOCK_STRATEGIES[locks]() if isinstance(locks, str) else locks
+
+        # self._book protects the bookkeeping below
+        self._book = threading.Lock()
+        self._holds: Dict[object, Dict[str, Reservation]] = {}
+        # every holder has one deadline for all of its reservations
+        # (any activity refreshes them all, so they always time out together)
+        self._deadlines: Dict[object, float] = {}
+        # (deadline, tie-breaker, holder) - old entries are skipped when popped
+        self._expiry: List[tuple] = []
+        self._seq = itertools.count()
+
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ----- small helpers (call with the product's lock held) -----
+
+    def _take(self, pid: str, qty: int):
+        available = self.inventory[pid].stock
+        if available < qty:
+            raise OutOfStock(pid, qty, available)
+        self.inventory.adjust_stock(pid, -qty)
+
+    def _give_back(self, pid: str, qty: int):
+        # the product may have been deleted by an employee in the meantime
+        if qty and pid in self.inventory:
+            self.inventory.adjust_stock(pid, qty)
+
+    # ----- the main operations -----
+
+    def expires_at(self, holder) -> Optional[float]:
+        # clock time when holder's reservations are released (None = holds nothing)
+        with self._book:
+            return self._deadlines.get(holder) if self._holds.get(holder) else None
+
+    def held(self, holder, pid: str) -> int:
+        with self._book:
+            res = self._holds.get(holder, {}).get(pid)
+            return res.qty if res else 0
+
+    def reserve(self, holder, pid: str, qty: int) -> Reservation:
+        # takes qty more of pid for holder (or raises OutOfStock)
+        self.expire_stale()
+        with self.locks.lock_for(pid):
+            self._take(pid, qty)
+            with self._book:
+                holds = self._holds.setdefault(holder, {})
+                res = holds.get(pid)
+                if res is None:
+                    res = holds[pid] = Reservation(holder, pid, 0)
+                res.qty += qty
+                self._touch(holder)
+        return res
+
+    def set_qty(self, holder, pid: str, qty: int):
+        # changes how many of pid holder has (0 = let go of all of it)
+        self.expire_stale()
+        with self.locks.lock_for(pid):
+            with self._book:
+                holds = self._holds.setdefault(holder, {})
+                res = holds.get(pid)
+                current = res.qty if res else 0
+                delta = qty - current
+
+                if delta > 0:
+                    self._take(pid, delta)
+                else:
+                    self._give_back(pid, -delta)
+
+                if qty == 0:
+                    holds.pop(pid, None)
+                else:
+                    if res is None:
+                        res = holds[pid] = Reservation(holder, pid, 0)
+                    res.qty = qty
+                self._touch(holder)
+
+    def release(self, holder, pid: Optional[str] = None):
+        # gives stock back for one product, or for everything the holder has
+        with self._book:
+            pids = [pid] if pid is not None else list(self._holds.get(holder, {}))
+        for p in pids:
+            with self.locks.lock_for(p):
+                with self._book:
+                    holds = self._holds.get(holder, {})
+                    res = holds.pop(p, None)
+                    if not holds:
+                        self._holds.pop(holder, None)
+                        self._deadlines.pop(holder, None)
+                if res is not None:
+                    self._give_back(p, res.qty)
+
+    def commit(self, holder, wanted: Dict[str, int]):
+        # the order is placed: the stock is sold for good
+        # wanted = product id -> qty in the basket. if a reservation ran out of time
+        # we try to take the stock again; if we can't, nothing changes and we raise OutOfStock
+        #
+        # the holder's reservations are taken out of the book first, so expire_stale
+        # can't give them back to the shelf while we are selling them
+        # (they are put back as they were if the order can't be placed)
+        with self._book:
+            holds = self._holds.pop(holder, {})
+            self._deadlines.pop(holder, None)
+        taken: List[tuple] = []
+        try:
+            for pid, qty in wanted.items():
+                if qty <= 0:
+                    continue
+                res = holds.get(pid)
+                short = qty - (res.qty if res else 0)
+                if short > 0:
+                    with self.locks.lock_for(pid):
+                        self._take(pid, short)
+                    taken.append((pid, short))
+        except OutOfStock:
+            # put back anything we took in this commit, and hand the reservations back
+            for pid, qty in taken:
+                with self.locks.lock_for(pid):
+                    self._give_back(pid, qty)
+            with self._book:
+                mine = self._holds.setdefault(holder, {})
+                for pid, res in holds.items():
+                    if pid in mine:
+                        mine[pid].qty += res.qty
+                    else:
+                        mine[pid] = res
+                if mine:
+                    self._touch(holder)
+                else:
+                    del self._holds[holder]
+            raise
+
+        # anything held that isn't in the order goes back, the rest is now sold
+        # (and anything reserved for this holder while we were working)
+        with self._book:
+            late = self._holds.pop(holder, {})
+            self._deadlines.pop(holder, None)
+        extra = []
+        for pid, res in holds.items():
+            left_over = res.qty - wanted.get(pid, 0)
+            if left_over > 0:
+                extra.append((pid, left_over))
+        extra.extend((pid, res.qty) for pid, res in late.items())
+        for pid, qty in extra:
+            with self.locks.lock_for(pid):
+                self._give_back(pid, qty)
+
+    def undo_commit(self, holder, wanted: Dict[str, int]):
+        # after commit(holder, wanted): the sale didn't go through after all (the order
+        # couldn't be written down), so the stock it sold is the holder's reservations
+        # again, like before checkout. (nothing moves on the shelf, it's still off it)
+        with self._book:
+            holds = self._holds.setdefault(holder, {})
+            for pid, qty in wanted.items():
+                if qty <= 0:
+                    continue
+                res = holds.get(pid)
+                if res is None:
+                    res = holds[pid] = Reservation(holder, pid, 0)
+                res.qty += qty
+            if holds:
+                self._touch(holder)
+            else:
+                del self._holds[holder]
+
+    @contextmanager
+    def locked(self, pids: Iterable[str]):
+        # holds the locks of many products at once, for changes that must all
+        # happen together (like a delivery of hundreds of products).
+        # the locks are always taken in the same order, so two batches can't
+        # deadlock each other, and the tills only ever hold one product lock.
+        # (with striped/global locks several products share a lock, take it once)
+        locks = {id(lock): lock for lock in map(self.locks.lock_for, set(pids))}
+        held = []
+        try:
+            for key in sorted(locks):
+                lock = locks[key]
+                lock.__enter__()
+                held.append(lock)
+            yield
+        finally:
+            for lock in reversed(held):
+                lock.__exit__(None, None, None)
+
+    def _touch(self, holder):
+        # any activity on a basket resets the timer on all of its reservations
+        # (one deadline per holder, so this costs the same for 1 line or 10,000)
+        # (call with self._book held)
+        deadline = self.clock() + self.ttl
+        self._deadlines[holder] = deadline
+        heapq.heappush(self._expiry, (deadline, next(self._seq), holder))
+
+    # ----- timing out abandoned baskets -----
+
+    def expire_stale(self) -> List[Reservation]:
+        # releases every reservation whose time is up, gives back what was released
+        now = self.clock()
+        expired = []
+        with self._book:
+            while self._expiry and self._expiry[0][0] <= now:
+                deadline, _, holder = heapq.heappop(self._expiry)
+                # an old entry for a holder that has since been refreshed (or let go of everything)
+                if self._deadlines.get(holder) != deadline:
+                    continue
+                del self._deadlines[holder]
+                expired.extend(self._holds.pop(holder, {}).values())
+
+        # nobody can find these reservations any more, so their qty can't change
+        for res in expired:
+            with self.locks.lock_for(res.product_id):
+                self._give_back(res.product_id, res.qty)
+        return expired
+
+    def start_reaper(self, interval: float = 1.0):
+        # a background thread that calls expire_stale() every "interval" seconds
+        if self._reaper is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.expire_stale()
+
+        self._reaper = threading.Thread(target=run, name="reservation-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        if self._reaper is None:
+            return
+        self._stop.set()
+        self._reaper.join()
+        self._reaper = None
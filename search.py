@@ -0,0 +1,148 @@
+# full-text product search over names and details
+#
+# an inverted index: for every word we keep which products use it (and how much),
+# so a search only looks at the products that contain the words typed in,
+# instead of reading every product's text.
+#
+#   "cheese"        -> every product with cheese in its name or details
+#   "habit"         -> also finds "Habits" (every word typed is also a prefix)
+#   "james clear"   -> products matching BOTH words, best match first
+#
+# words in the name count more than words in the details, and rare words count
+# more than common ones, so "harry" ranks Harry Potter above a book that
+# mentions Harry once in its blurb.
+
+import bisect
+import heapq
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import Product
+
+NAME_WEIGHT = 3.0      # a word in the name is worth this many words in the details
+PREFIX_FACTOR = 0.7    # "habit" matching "habits" scores a bit less than an exact word
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    # lower-cases (casefold also handles things like ß -> ss) and splits into words
+    return _WORD.findall(text.casefold())
+
+
+class SearchIndex:
+
+    def __init__(self, products: Iterable[Product] = ()):
+        # word -> {product id: weight}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # product id -> {word: weight}, so a product can be taken out again
+        self._terms: Dict[str, Dict[str, float]] = {}
+        # every word, sorted, for prefix lookups (rebuilt only after new words turn up)
+        self._vocab: List[str] = []
+        self._vocab_stale = False
+        for product in products:
+            self.add(product)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self._terms
+
+    # ----- keeping it up to date -----
+
+    def add(self, product: Product):
+        # adds a product (or re-indexes it if its name/details changed)
+        if product.id in self._terms:
+            self.remove(product.id)
+
+        terms: Dict[str, float] = {}
+        for word in tokenize(product.name):
+            terms[word] = terms.get(word, 0.0) + NAME_WEIGHT
+        for word in tokenize(product.details):
+            terms[word] = terms.get(word, 0.0) + 1.0
+        # the id itself is searchable too ("d1"), like the old find_product
+        terms[product.id.casefold()] = terms.get(product.id.casefold(), 0.0) + NAME_WEIGHT
+
+        self._terms[product.id] = terms
+        for word, weight in terms.items():
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = {}
+                self._vocab_stale = True
+            posting[product.id] = weight
+
+    def remove(self, pid: str):
+        terms = self._terms.pop(pid, None)
+        if terms is None:
+            return
+        for word in terms:
+            posting = self._postings[word]
+            del posting[pid]
+            if not posting:
+                del self._postings[word]
+                self._vocab_stale = True
+
+    # ----- searching -----
+
+    def _expand(self, word: str) -> List[str]:
+        # every indexed word that starts with `word`
+        if self._vocab_stale:
+            self._vocab = sorted(self._postings)
+            self._vocab_stale = False
+        start = bisect.bisect_left(self._vocab, word)
+        end = bisect.bisect_left(self._vocab, word + "\U0010ffff")
+        return self._vocab[start:end]
+
+    def search(self, query: str, limit: Optional[int] = 20) -> List[Tuple[str, float]]:
+        # gives back [(product id, score)], best first
+        words = tokenize(query)
+        if not words:
+            return []
+        total = len(self._terms)
+
+        scores: Optional[Dict[str, float]] = None
+        # rarest words first: the candidate set shrinks fastest that way
+        for word in sorted(set(words), key=lambda w: len(self._postings.get(w, ()))):
+            matched: Dict[str, float] = {}
+            for term in self._expand(word):
+                posting = self._postings[term]
+                # rare words count more (idf)
+                idf = math.log(1 + total / len(posting))
+                factor = idf if term == word else idf * PREFIX_FACTOR
+                # only score products that matched every word so far
+                if scores is not None and len(posting) > len(scores):
+                    pairs = ((pid, posting[pid]) for pid in scores if pid in posting)
+                else:
+                    pairs = posting.items()
+                for pid, weight in pairs:
+                    if scores is not None and pid not in scores:
+                        continue
+                    score = weight * factor
+                    if score > matched.get(pid, 0.0):
+                        matched[pid] = score
+            if scores is None:
+                scores = matched
+            else:
+                scores = {pid: scores[pid] + s for pid, s in matched.items()}
+            if not scores:
+                return []
+
+        # only the top few need sorting (a common word can match thousands)
+        key = lambda item: (-item[1], item[0])
+        if limit is None:
+            return sorted(scores.items(), key=key)
+        return heapq.nsmallest(limit, scores.items(), key=key)
+
+
+def scan_search(products: Iterable[Product], query: str) -> List[str]:
+    # the slow way, for comparison: read every product's text for every search
+    # (it has to read them all, otherwise it can't know which matches are best)
+    words = tokenize(query)
+    found = []
+    for p in products:
+        text = tokenize(f"{p.id} {p.name} {p.details}")
+        if all(any(t.startswith(w) for t in text) for w in words):
+            found.append(p.id)
+    return found
@@ -0,0 +1,370 @@
+# a small HTTP/JSON ordering server so kiosks and phones can order at the same time
+#
+# it uses asyncio (one thread, lots of connections at once) and only the python
+# standard library. every customer gets a session with its own basket, and all
+# the real work is done by the same OrderService the till uses.
+#
+# run:   python server.py                  (http://127.0.0.1:8080, fresh inventory)
+#        python server.py --db papercup.db --port 9000
+#        python server.py --journal orders.journal   (write every order to a journal)
+#
+#   GET    /categories/<category>            products in a category (like the menu)
+#   GET    /products/<id>                    one product
+#   POST   /sessions                         start a basket -> {"session": "..."}
+#   GET    /sessions/<sid>                   the basket and its totals
+#   DELETE /sessions/<sid>                   walk away (stock goes back)
+#   POST   /sessions/<sid>/items             {"product_id": "D1", "qty": 2}
+#   PUT    /sessions/<sid>/items/<id>        {"qty": 3}
+#   DELETE /sessions/<sid>/items/<id>
+#   POST   /sessions/<sid>/discount          {"password": "..."}
+#   POST   /sessions/<sid>/checkout          {"delivery": {"name": "...", "address": "..."}}  (delivery optional)
+
+import argparse
+import asyncio
+import json
+import re
+import secrets
+import time
+from typing import Dict, Optional, Tuple
+
+from journal import OrderJournal
+from models import Product, open_inventory, seed_inventory
+from orders import EMPLOYEE_PASSWORD, Order, OrderError, OrderService, Receipt
+from pricing import PricingEngine, load_rules
+from reservations import DEFAULT_TTL, OutOfStock
+
+SESSION_TTL = DEFAULT_TTL   # seconds an untouched session lives (same as its reservations)
+MAX_BODY = 64 * 1024        # biggest request body we accept
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+# =========================
+# TURNING SHOP OBJECTS INTO JSON
+# =========================
+
+def product_json(p: Product) -> dict:
+    return {"id": p.id, "category": p.category, "name": p.name, "price": p.price,
+            "stock": p.stock, "details": p.details, "delivery_eligible": p.delivery_eligible}
+
+
+def order_json(sid: str, order: Order) -> dict:
+    bill = order.bill()
+    return {
+        "session": sid,
+        "lines": [{"product_id": i.product_id, "name": i.name, "unit_price": i.unit_price, "qty": i.qty}
+                  for i in order.basket],
+        "subtotal": bill.subtotal,
+        "savings": bill.savings,
+        "discount": bill.discount,
+        "total": bill.total,
+    }
+
+
+def receipt_json(r: Receipt) -> dict:
+    return {
+        "order_id": r.order_id,
+        "lines": [{"product_id": i.product_id, "name": i.name, "unit_price": i.unit_price, "qty": i.qty}
+                  for i in r.lines],
+        "subtotal": r.subtotal,
+        "promotions": [{"name": name, "saving": saving} for name, saving in r.promotions],
+        "savings": r.savings,
+        "discount": r.discount,
+        "total": r.total,
+        "delivery": None if r.delivery is None else {"name": r.delivery.name, "address": r.delivery.address},
+    }
+
+
+# =========================
+# THE APP (routes -> OrderService)
+# =========================
+
+class OrderingApp:
+
+    def __init__(self, service: OrderService, session_ttl: float = SESSION_TTL):
+        self.service = service
+        self.session_ttl = session_ttl
+        # session id -> (order, last time it was used)
+        self.sessions: Dict[str, Tuple[Order, float]] = {}
+        self.routes = [
+            ("GET", re.compile(r"/categories/(\w+)"), self.get_category),
+            ("GET", re.compile(r"/products/(\w+)"), self.get_product),
+            ("POST", re.compile(r"/sessions"), self.new_session),
+            ("GET", re.compile(r"/sessions/(\w+)"), self.get_session),
+            ("DELETE", re.compile(r"/sessions/(\w+)"), self.end_session),
+            ("POST", re.compile(r"/sessions/(\w+)/items"), self.add_item),
+            ("PUT", re.compile(r"/sessions/(\w+)/items/(\w+)"), self.adjust_item),
+            ("DELETE", re.compile(r"/sessions/(\w+)/items/(\w+)"), self.remove_item),
+            ("POST", re.compile(r"/sessions/(\w+)/discount"), self.discount),
+            ("POST", re.compile(r"/sessions/(\w+)/checkout"), self.checkout),
+        ]
+
+    def handle(self, method: str, path: str, body: Optional[dict]) -> Tuple[int, dict]:
+        # finds the route for this request and runs it
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                return handler(body or {}, *match.groups())
+            except OutOfStock as e:
+                raise HTTPError(409, str(e), product_id=e.product_id, available=e.available)
+            except OrderError as e:
+                raise HTTPError(400, str(e))
+        if allowed:
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"nothing at {path}")
+
+    def _order(self, sid: str) -> Order:
+        entry = self.sessions.get(sid)
+        if entry is None:
+            raise HTTPError(404, "unknown or expired session")
+        self.sessions[sid] = (entry[0], time.monotonic())
+        return entry[0]
+
+    def expire_sessions(self) -> int:
+        # ends sessions nobody has used for session_ttl seconds (their stock goes back)
+        cutoff = time.monotonic() - self.session_ttl
+        stale = [sid for sid, (_, used) in self.sessions.items() if used < cutoff]
+        for sid in stale:
+            order, _ = self.sessions.pop(sid)
+            self.service.cancel(order)
+        return len(stale)
+
+    # ----- routes -----
+
+    def get_category(self, body, category):
+        return 200, {"category": category, "products": [product_json(p) for p in self.service.browse(category)]}
+
+    def get_product(self, body, pid):
+        return 200, product_json(self.service.product(pid.upper()))
+
+    def new_session(self, body):
+        sid = secrets.token_hex(8)
+        self.sessions[sid] = (self.service.new_order(), time.monotonic())
+        return 201, {"session": sid}
+
+    def get_session(self, body, sid):
+        return 200, order_json(sid, self._order(sid))
+
+    def end_session(self, body, sid):
+        order = self._order(sid)
+        self.service.cancel(order)
+        del self.sessions[sid]
+        return 200, {"session": sid, "ended": True}
+
+    def add_item(self, body, sid):
+        order = self._order(sid)
+        self.service.add(order, str(body.get("product_id", "")).upper(), _qty(body))
+        return 200, order_json(sid, order)
+
+    def adjust_item(self, body, sid, pid):
+        order = self._order(sid)
+        self.service.adjust(order, pid.upper(), _qty(body))
+        return 200, order_json(sid, order)
+
+    def remove_item(self, body, sid, pid):
+        order = self._order(sid)
+        self.service.remove(order, pid.upper())
+        return 200, order_json(sid, order)
+
+    def discount(self, body, sid):
+        order = self._order(sid)
+        if body.get("password") != EMPLOYEE_PASSWORD:
+            raise HTTPError(403, "Incorrect password.")
+        self.service.apply_discount(order)
+        return 200, order_json(sid, order)
+
+    def checkout(self, body, sid):
+        order = self._order(sid)
+        delivery = body.get("delivery")
+        if delivery:
+            self.service.set_delivery(order, str(delivery.get("name", "")), str(delivery.get("address", "")))
+        receipt = self.service.checkout(order)
+        del self.sessions[sid]
+        return 200, receipt_json(receipt)
+
+
+def _qty(body: dict) -> int:
+    qty = body.get("qty", 1)
+    if not isinstance(qty, int) or isinstance(qty, bool):
+        raise HTTPError(400, "qty must be a whole number")
+    return qty
+
+
+# =========================
+# HTTP (just enough of HTTP/1.1 for JSON clients, with keep-alive)
+# =========================
+
+async def read_request(reader: asyncio.StreamReader):
+    # gives back (method, path, headers, body bytes) or None when the client hangs up
+    line = await _read_line(reader)
+    if not line:
+        return None
+    try:
+        method, path, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "bad request line")
+
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get("content-length", "0") or "0"
+    if not length.isdigit():
+        raise HTTPError(400, "bad content-length")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HTTPError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    # (a line longer than the reader's limit is a ValueError from asyncio, not our problem to crash on)
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HTTPError(400, "request line or header too long")
+
+
+def encode_response(status: int, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+class OrderingServer:
+
+    def __init__(self, app: OrderingApp, host: str = "127.0.0.1", port: int = 8080, flush_every: float = 1.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.flush_every = flush_every
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._housekeeping: Optional[asyncio.Task] = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = True
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, raw = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    try:
+                        body = json.loads(raw) if raw else None
+                    except ValueError:
+                        raise HTTPError(400, "body is not valid JSON")
+                    if body is not None and not isinstance(body, dict):
+                        raise HTTPError(400, "body must be a JSON object")
+                    journal = self.app.service.journal
+                    before = journal.appended if journal is not None else 0
+                    status, payload = self.app.handle(method, path, body)
+                    # a placed order isn't confirmed until it's in the journal. waiting in a
+                    # worker thread lets other connections keep going, and all the orders
+                    # placed meanwhile go to disk together (one fsync for the lot).
+                    # (only a request that placed an order waits, and only for its own)
+                    if journal is not None and journal.appended != before:
+                        await asyncio.to_thread(journal.wait_for, journal.appended)
+                except HTTPError as e:
+                    status, payload = e.status, e.body
+                    # if we couldn't even read the request, we don't know where the next one starts
+                    if request is None:
+                        keep_alive = False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:  # a bug shouldn't take the whole server down
+                    status, payload, keep_alive = 500, {"error": f"internal error: {e}"}, False
+
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def housekeeping(self):
+        # every so often: end abandoned sessions, time out reservations, save changes
+        # (saving runs in a worker thread so a slow disk doesn't hold up requests)
+        while True:
+            await asyncio.sleep(self.flush_every)
+            self.app.expire_sessions()
+            self.app.service.reservations.expire_stale()
+            await asyncio.to_thread(self.app.service.inventory.flush)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        # port 0 = let the system pick one, find out which
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._housekeeping = asyncio.create_task(self.housekeeping())
+
+    async def stop(self):
+        if self._housekeeping:
+            self._housekeeping.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.app.service.inventory.flush()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"PaperCup ordering server on http://{self.host}:{self.port}")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PaperCup HTTP/JSON ordering server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", help="use the saved inventory in this SQLite file (default: a fresh seed)")
+    parser.add_argument("--journal", help="append every placed order to this journal file")
+    parser.add_argument("--no-fsync", action="store_true",
+                        help="don't wait for the disk (faster, but a power cut can lose the last orders)")
+    parser.add_argument("--promotions", help="run the promotions in this JSON file (see pricing.py)")
+    args = parser.parse_args(argv)
+
+    inventory = open_inventory(args.db) if args.db else seed_inventory()
+    journal = OrderJournal(args.journal, fsync=not args.no_fsync) if args.journal else None
+    # checkout doesn't wait for the journal itself, handle_connection does
+    pricing = PricingEngine(load_rules(args.promotions)) if args.promotions else None
+    service = OrderService(inventory, journal=journal, wait_for_journal=False, pricing=pricing)
+    server = OrderingServer(OrderingApp(service), args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        inventory.close()
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# low stock alerts: every product has a reorder level, and staff hear about it
+# the moment a product drops to it (instead of when a customer is told
+# "Sorry, out of stock")
+#
+#   monitor = LowStockMonitor(inventory, load_thresholds("reorder.json"))
+#   monitor.listen(lambda alert: print(alert))   # called as soon as a product crosses
+#   monitor.low()                                # everything at or below its level, most urgent first
+#
+# the monitor subscribes to the inventory's change feed (changefeed.py). every
+# stock change (tills reserving and selling, baskets changing, cancelled
+# orders, the employee screens, deliveries) is checked against its level on
+# the till's thread as it happens (a dict lookup), so a product that goes
+# 6 -> 0 -> 6 in a rush still gives "out" then "restocked". the listeners are
+# told on the monitor's own thread, so a slow one never holds up a till.
+# it keeps the products that are at or below their level in a dict, so
+# "what's low?" only looks at the low products, never the whole inventory.
+# that dict is filled when the monitor starts by asking the inventory for its
+# low products (stock_at_most, an index in SQLite) without loading anything else.
+#
+# reorder levels live in reorder.json ({"D1": 10, "B3": 2}), any product not
+# in there uses LOW_STOCK.
+#
+# run:
+#   python stockalerts.py                  (what's low in papercup.db right now)
+#   python stockalerts.py --set D1=10      (change a reorder level)
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import INVENTORY_DB, Product, open_inventory
+from orders import LOW_STOCK, find_products
+
+REORDER_FILE = "reorder.json"
+
+# how many recent alerts are kept for the employee screen
+KEEP_ALERTS = 100
+
+
+# the kinds of change that can move a product across its level (a reset is always sent)
+WATCHED = ("added", "replaced", "removed", "stock")
+
+
+@dataclass(frozen=True)
+class Alert:
+    kind: str          # "low", "out" (stock reached 0) or "restocked" (back above its level)
+    pid: str
+    name: str
+    stock: int
+    threshold: int
+    at: float          # time.time() when it happened
+    seq: int = 0       # 1, 2, 3 ... in the order they happened (see LowStockMonitor.since)
+
+    def __str__(self) -> str:
+        if self.kind == "out":
+            return f"OUT OF STOCK: {self.pid} {self.name}"
+        if self.kind == "low":
+            return f"Running low: {self.pid} {self.name} (stock {self.stock}, reorder at {self.threshold})"
+        return f"Restocked: {self.pid} {self.name} (stock {self.stock})"
+
+
+class LowStockMonitor:
+
+    def __init__(self, inventory: Dict[str, Product], thresholds: Optional[Dict[str, int]] = None,
+                 default: int = LOW_STOCK):
+        self.inventory = inventory
+        self.thresholds: Dict[str, int] = dict(thresholds or {})
+        self.default = default
+        # pid -> stock, for every product at or below its reorder level
+        self._low: Dict[str, int] = {}
+        # guards _low and alerts (taken on the tills' threads too, so only for a moment)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Alert], None]] = []
+        self.alerts: "deque[Alert]" = deque(maxlen=KEEP_ALERTS)
+        self._numbers = itertools.count(1)
+        # subscribed before the first look, and holding the lock until it is done,
+        # so a change made meanwhile waits and is then checked against what we found
+        # (and a product that was already low when we started isn't mistaken for one
+        # that just went low)
+        with self._lock:
+            self._changes = inventory.changes().subscribe(kinds=WATCHED, keep=self._crossed)
+            self._low = self._scan()
+        self._thread = threading.Thread(target=self._run, name="low-stock", daemon=True)
+        self._thread.start()
+
+    def threshold(self, pid: str) -> int:
+        return self.thresholds.get(pid, self.default)
+
+    def listen(self, callback: Callable[[Alert], None]):
+        # callback(alert) runs on the monitor's thread (or in catch_up), soon after the change
+        self._listeners.append(callback)
+        return callback
+
+    def set_threshold(self, pid: str, threshold: Optional[int]):
+        # None = back to the default level
+        if threshold is None:
+            self.thresholds.pop(pid, None)
+        else:
+            self.thresholds[pid] = threshold
+        product = self.inventory.get(pid)
+        with self._lock:
+            alert = self._step(pid, product)
+        if alert is not None:
+            self._tell(alert)
+
+    def close(self):
+        # stops listening to the inventory (the thread finishes by itself)
+        self._changes.close()
+
+    # ----- keeping up with the inventory -----
+
+    def _crossed(self, pid: str, product: Optional[Product]) -> Optional[Alert]:
+        # the change feed's keep(): runs on the till's thread for every change,
+        # the alert it gives back reaches the listeners through the feed
+        with self._lock:
+            return self._step(pid, product)
+
+    def _run(self):
+        while not self._changes.closed:
+            self._apply(self._changes.wait(0.5))
+
+    def catch_up(self):
+        # tells the listeners about any alerts still waiting, on this thread
+        self._apply(self._changes.drain())
+
+    def _apply(self, changes):
+        for change in changes:
+            if change.reset:
+                # everything changed (inventory.clear(), or too much at once), look again.
+                # (rare, and done holding the lock so no till's change is checked half way)
+                with self._lock:
+                    self._low = self._scan()
+            for alert in change.kept:
+                self._tell(alert)
+
+    def _tell(self, alert: Alert):
+        for callback in list(self._listeners):
+            callback(alert)
+
+    def _step(self, pid: str, product: Optional[Product]) -> Optional[Alert]:
+        # the product's stock now against what we knew (called holding self._lock),
+        # gives back the alert if it crossed a line
+        if product is None:
+            self._low.pop(pid, None)
+            return None
+        threshold = self.threshold(pid)
+        stock = product.stock
+        if stock <= threshold:
+            before = self._low.get(pid)
+            self._low[pid] = stock
+        else:
+            before = self._low.pop(pid, None)
+        # only a product crossing a line makes an alert (selling the 3rd of 4 low ones doesn't)
+        kind = None
+        if stock <= threshold:
+            if stock <= 0 and (before is None or before > 0):
+                kind = "out"
+            elif before is None and stock > 0:
+                kind = "low"
+        elif before is not None:
+            kind = "restocked"
+        if kind is None:
+            return None
+        alert = Alert(kind, product.id, product.name, stock, threshold, time.time(), next(self._numbers))
+        self.alerts.append(alert)
+        return alert
+
+    def _scan(self) -> Dict[str, int]:
+        # pid -> stock for everything at or below its level right now.
+        # the inventory is asked for anything at or below the highest level
+        # (without loading the rest), then each one is checked against its own
+        highest = max([self.default, *self.thresholds.values()])
+        stock_at_most = getattr(self.inventory, "stock_at_most", None)
+        if stock_at_most is not None:
+            found = stock_at_most(highest)
+        else:
+            found = {p.id: p.stock for p in find_products(self.inventory, max_stock=highest)}
+        return {pid: stock for pid, stock in found.items() if stock <= self.threshold(pid)}
+
+    # ----- asking what's low -----
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._low)
+
+    def since(self, seq: int) -> List[Alert]:
+        # the alerts after number seq that are still kept (seq=0: all of them), oldest first
+        with self._lock:
+            return [a for a in self.alerts if a.seq > seq]
+
+    def low(self, limit: Optional[int] = None) -> List[Tuple[Product, int]]:
+        # [(product, its reorder level)] at or below their level, furthest below first
+        with self._lock:
+            pids = list(self._low)
+        found = [(p, self.threshold(p.id)) for p in map(self.inventory.get, pids) if p is not None]
+        urgency = lambda item: (item[0].stock - item[1], item[0].id)
+        if limit is None:
+            return sorted(found, key=urgency)
+        return heapq.nsmallest(limit, found, key=urgency)
+
+
+def scan_low(inventory: Dict[str, Product], thresholds: Dict[str, int], default: int = LOW_STOCK) -> List[str]:
+    # the same question answered the slow way (every product, every time), for checking and benchmarks
+    return [p.id for p in inventory.values() if p.stock <= thresholds.get(p.id, default)]
+
+
+def load_thresholds(path: str = REORDER_FILE) -> Dict[str, int]:
+    # {} if there is no file yet
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {str(pid).upper(): int(level) for pid, level in data.items()}
+
+
+def save_thresholds(thresholds: Dict[str, int], path: str = REORDER_FILE):
+    # written to a temporary file and renamed, so a crash never leaves half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(thresholds.items())), f, indent=2)
+    os.replace(tmp, path)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Show the PaperCup products at or below their reorder level")
+    parser.add_argument("--db", default=INVENTORY_DB, help=f"inventory file (default: {INVENTORY_DB})")
+    parser.add_argument("--levels", default=REORDER_FILE, help=f"reorder levels file (default: {REORDER_FILE})")
+    parser.add_argument("--set", action="append", default=[], metavar="ID=N",
+                        help="change a product's reorder level (N = 'default' to go back to the default)")
+    args = parser.parse_args(argv)
+
+    thresholds = load_thresholds(args.levels)
+    if args.set:
+        for item in args.set:
+            pid, _, level = item.partition("=")
+            pid = pid.strip().upper()
+            if not pid or not (level.strip().isdigit() or level.strip() == "default"):
+                parser.error(f"--set wants ID=N, got {item!r}")
+            if level.strip() == "default":
+                thresholds.pop(pid, None)
+            else:
+                thresholds[pid] = int(level)
+        save_thresholds(thresholds, args.levels)
+
+    inventory = open_inventory(args.db)
+    try:
+        monitor = LowStockMonitor(inventory, thresholds)
+        low = monitor.low()
+        monitor.close()
+        for p, level in low:
+            print(f"{p.id} | {p.name} | stock={p.stock} | reorder at {level}")
+        print(f"{len(low):,} products at or below their reorder level")
+    finally:
+        inventory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# several PaperCup shops, each with its own inventory, and one place to ask
+# "which shop has Atomic Habits?" or "send these books from the nearest shop
+# that has them"
+#
+# every store is a shard: its own process with its own inventory and order
+# service (so the shops never share a dict or a lock). a StoreNetwork talks
+# to all of them over pipes. a question is sent to every shard first and only
+# then are the answers collected, so the shards work on it at the same time
+# and asking 8 stores takes about as long as asking the slowest one.
+#
+#   network = StoreNetwork(DEFAULT_STORES)              # starts one process per store
+#   network.where("atomic habits")                      # [(store, product id, name, stock)]
+#   network.deliver([("B1", 1)], near=(53.48, -2.24), name="Sam", address="1 High St")
+#   network.close()
+#
+# each store's inventory is a fresh seed with its own stock levels, or with
+# --db-dir every store keeps its own papercup-<store id>.db in that folder.
+#
+# run (the local test harness, one process per store on this machine):
+#   python stores.py where "atomic habits"
+#   python stores.py deliver B1:1 B3:2 --near 53.48,-2.24
+#   python stores.py --db-dir stores/ where habits
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from models import open_inventory, seed_inventory
+from orders import OrderError, OrderService, receipt_record
+from reservations import OutOfStock
+
+
+@dataclass(frozen=True)
+class Store:
+    id: str
+    name: str
+    location: Tuple[float, float]     # (latitude, longitude)
+
+
+DEFAULT_STORES = (
+    Store("LDN", "London", (51.507, -0.128)),
+    Store("MAN", "Manchester", (53.481, -2.243)),
+    Store("BHM", "Birmingham", (52.486, -1.890)),
+    Store("LDS", "Leeds", (53.801, -1.549)),
+    Store("BRS", "Bristol", (51.455, -2.588)),
+    Store("EDI", "Edinburgh", (55.953, -3.188)),
+    Store("CDF", "Cardiff", (51.481, -3.179)),
+    Store("NCL", "Newcastle", (54.978, -1.618)),
+)
+
+
+def distance_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    # as the crow flies (haversine), good enough to pick the nearest shop
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def seeded_store(store_id: str):
+    # the normal seed menu, with stock that differs from shop to shop
+    # (the same store id always gets the same stock)
+    inventory = seed_inventory()
+    rng = random.Random(store_id)
+    for pid in list(inventory):
+        inventory.set_stock(pid, rng.randint(0, 12))
+    return inventory
+
+
+def store_db(store_id: str, db_dir: str):
+    return open_inventory(os.path.join(db_dir, f"papercup-{store_id}.db"))
+
+
+# =========================
+# ONE SHARD (runs in its own process)
+# =========================
+
+# what a shard can be asked to do: name -> function(service, *args)
+# (everything sent back is plain tuples/dicts so it can go through a pipe)
+
+def _stock(service: OrderService, pids: Sequence[str]) -> Dict[str, int]:
+    found = {}
+    for pid in pids:
+        product = service.inventory.get(pid)
+        if product is not None:
+            found[pid] = product.stock
+    return found
+
+
+def _search(service: OrderService, query: str, limit: int) -> List[Tuple[str, str, int]]:
+    return [(p.id, p.name, p.stock) for p in service.search(query, limit)]
+
+
+def _deliver(service: OrderService, lines: Sequence[Tuple[str, int]], name: str, address: str) -> dict:
+    # a whole delivery order placed at this shop (the stock is reserved then sold)
+    order = service.new_order()
+    try:
+        for pid, qty in lines:
+            service.add(order, pid, qty)
+        service.set_delivery(order, name, address)
+        return receipt_record(service.checkout(order))
+    except (OrderError, OutOfStock):
+        service.cancel(order)
+        raise
+
+
+SHARD_OPS: Dict[str, Callable] = {
+    "stock": _stock,
+    "search": _search,
+    "deliver": _deliver,
+    "ping": lambda service: True,
+}
+
+
+def _serve(conn, make_inventory: Callable, args: tuple):
+    # the shard's main loop: one request in, one answer out, until it is sent None
+    inventory = make_inventory(*args)
+    service = OrderService(inventory)
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            op, op_args = request
+            try:
+                if op not in SHARD_OPS:
+                    raise OrderError(f"unknown request {op!r}")
+                conn.send((True, SHARD_OPS[op](service, *op_args)))
+            except OutOfStock as e:
+                # (sent as plain values, OutOfStock can't go through a pipe as it is)
+                conn.send((False, (e.product_id, e.wanted, e.available)))
+            except OrderError as e:
+                conn.send((False, str(e)))
+            except Exception as e:
+                # anything else (a bug, a database error) is sent back as a failure too,
+                # so the caller isn't left waiting and the shop keeps serving
+                conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        inventory.close()
+        conn.close()
+
+
+class Shard:
+    # one store's process, and our end of the pipe to it
+
+    def __init__(self, store: Store, make_inventory: Callable = seeded_store, args: Optional[tuple] = None):
+        # make_inventory(*args) runs inside the new process (so it must be a
+        # plain module-level function), args defaults to (store.id,)
+        self.store = store
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(child, make_inventory, (store.id,) if args is None else args),
+            name=f"store-{store.id}", daemon=True,
+        )
+        self._process.start()
+        child.close()
+
+    def send(self, op: str, *args):
+        self._conn.send((op, args))
+
+    def receive(self):
+        # the answer to the last send()
+        # (raises OutOfStock or OrderError if the shop said no, like its own order service would)
+        ok, result = self._conn.recv()
+        if not ok:
+            if isinstance(result, tuple):
+                raise OutOfStock(*result)
+            raise OrderError(f"{self.store.name}: {result}")
+        return result
+
+    def call(self, op: str, *args):
+        self.send(op, *args)
+        return self.receive()
+
+    def close(self):
+        if self._process.is_alive():
+            self._conn.send(None)
+            self._process.join(5)
+        self._conn.close()
+
+
+# =========================
+# THE NETWORK (asks every shard at once)
+# =========================
+
+@dataclass(frozen=True)
+class Sighting:
+    # one store that has a product matching the question
+    store: Store
+    product_id: str
+    name: str
+    stock: int
+
+
+class StoreNetwork:
+
+    def __init__(self, stores: Sequence[Store] = DEFAULT_STORES, make_inventory: Callable = seeded_store,
+                 args: Optional[Callable[[Store], tuple]] = None):
+        # args(store) gives the arguments for make_inventory (default: (store.id,))
+        self.shards = [Shard(store, make_inventory, None if args is None else args(store)) for store in stores]
+        self.ask_all("ping")     # (wait until every shop has its inventory ready)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ask_all(self, op: str, *args) -> list:
+        # sends the question to every shard, then collects the answers (in store order)
+        # (every answer is read even if one shop says no, so no pipe is left with an
+        # answer waiting in it, then the first problem is raised)
+        for shard in self.shards:
+            shard.send(op, *args)
+        answers, problem = [], None
+        for shard in self.shards:
+            try:
+                answers.append(shard.receive())
+            except (OrderError, OutOfStock) as e:
+                problem = problem or e
+        if problem is not None:
+            raise problem
+        return answers
+
+    def stock(self, pid: str) -> List[Tuple[Store, int]]:
+        # [(store, stock)] for every store that sells pid
+        pid = pid.strip().upper()
+        return [(shard.store, found[pid])
+                for shard, found in zip(self.shards, self.ask_all("stock", [pid])) if pid in found]
+
+    def where(self, query: str, limit: int = 20, in_stock: bool = True) -> List[Sighting]:
+        # which stores have products matching a search ("atomic habits", "B1", an author...)
+        # most stock first
+        found = []
+        for shard, matches in zip(self.shards, self.ask_all("search", query, limit)):
+            for pid, name, stock in matches:
+                if stock > 0 or not in_stock:
+                    found.append(Sighting(shard.store, pid, name, stock))
+        found.sort(key=lambda s: (-s.stock, s.store.id, s.product_id))
+        return found
+
+    def nearest_with(self, lines: Sequence[Tuple[str, int]], near: Tuple[float, float]) -> List[Store]:
+        # the stores that have every line in stock right now, nearest first
+        pids = [pid for pid, _ in lines]
+        able = []
+        for shard, found in zip(self.shards, self.ask_all("stock", pids)):
+            if all(found.get(pid, 0) >= qty for pid, qty in lines):
+                able.append(shard.store)
+        return sorted(able, key=lambda store: distance_km(store.location, near))
+
+    def deliver(self, lines: Sequence[Tuple[str, int]], near: Tuple[float, float],
+                name: str, address: str) -> Tuple[Store, dict]:
+        # places a delivery order at the nearest store that can fill all of it.
+        # another till may sell the stock between asking and ordering, so if the
+        # nearest one can't do it any more we try the next nearest
+        # (anything else wrong with the order, like no books in it, is raised straight away)
+        lines = [(pid.strip().upper(), qty) for pid, qty in lines]
+        shards = {shard.store.id: shard for shard in self.shards}
+        for store in self.nearest_with(lines, near):
+            try:
+                receipt = shards[store.id].call("deliver", lines, name, address)
+            except OutOfStock:
+                continue
+            # every shop counts its own orders from 1, so the shop's id goes in front
+            # ("MAN-12") to keep order ids from two shops apart
+            receipt["order_id"] = f"{store.id}-{receipt['order_id']}"
+            return store, receipt
+        raise OrderError("No store has all of that in stock.")
+
+    def close(self):
+        # (each shop saves its inventory as it shuts down)
+        for shard in self.shards:
+            shard.close()
+
+
+def _location(text: str) -> Tuple[float, float]:
+    lat, _, lon = text.partition(",")
+    return float(lat), float(lon)
+
+
+def _line(text: str) -> Tuple[str, int]:
+    pid, _, qty = text.partition(":")
+    return pid.upper(), int(qty or 1)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ask every PaperCup store at once (one local process per store)")
+    parser.add_argument("--stores", type=int, default=len(DEFAULT_STORES),
+                        help=f"how many stores to start (up to {len(DEFAULT_STORES)})")
+    parser.add_argument("--db-dir", help="keep each store's inventory in DIR/papercup-<store>.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    where = commands.add_parser("where", help="which stores have something in stock")
+    where.add_argument("query")
+    deliver = commands.add_parser("deliver", help="deliver books from the nearest store that has them")
+    deliver.add_argument("lines", nargs="+", type=_line, metavar="ID[:QTY]")
+    deliver.add_argument("--near", type=_location, default=DEFAULT_STORES[0].location, metavar="LAT,LON")
+    deliver.add_argument("--name", default="Customer")
+    deliver.add_argument("--address", default="(address)")
+    args = parser.parse_args(argv)
+
+    stores = DEFAULT_STORES[:max(1, args.stores)]
+    if args.db_dir:
+        os.makedirs(args.db_dir, exist_ok=True)
+        network = StoreNetwork(stores, store_db, lambda store: (store.id, args.db_dir))
+    else:
+        network = StoreNetwork(stores)
+
+    with network:
+        if args.command == "where":
+            found = network.where(args.query)
+            for s in found:
+                print(f"{s.store.name:<12} {s.product_id:<6} {s.name} (stock: {s.stock})")
+            if not found:
+                print("No store has that in stock.")
+        else:
+            try:
+                store, receipt = network.deliver(args.lines, args.near, args.name, args.address)
+            except OrderError as e:
+                parser.exit(1, f"{e}\n")
+            print(f"order {receipt['order_id']} from {store.name} "
+                  f"({distance_km(store.location, args.near):,.0f} km away)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# the order service running on a ColumnarInventory instead of an Inventory
+# run: python -m pytest -q
+
+from columnar import ColumnarInventory
+from models import product_row, seed_inventory
+from orders import OrderService, StockChange
+
+
+def columnar_shop():
+    seed = seed_inventory()
+    return seed, ColumnarInventory.from_rows(product_row(p) for p in seed.values())
+
+
+def test_order_through_columnar_inventory():
+    seed, inventory = columnar_shop()
+    service = OrderService(inventory)
+    order = service.new_order()
+    service.add(order, "D1", 2)
+    service.add(order, "B1", 1)
+    service.adjust(order, "D1", 3)
+    receipt = service.checkout(order)
+
+    assert [(line.product_id, line.qty) for line in receipt.lines] == [("D1", 3), ("B1", 1)]
+    assert inventory["D1"].stock == seed["D1"].stock - 3
+    assert inventory["B1"].stock == seed["B1"].stock - 1
+
+
+def test_cancelled_order_gives_stock_back():
+    seed, inventory = columnar_shop()
+    service = OrderService(inventory)
+    order = service.new_order()
+    service.add(order, "F1", 2)
+    assert inventory["F1"].stock == seed["F1"].stock - 2
+    service.cancel(order)
+    assert inventory["F1"].stock == seed["F1"].stock
+
+
+def test_employee_stock_jobs_and_change_feed():
+    _, inventory = columnar_shop()
+    service = OrderService(inventory)
+    sub = inventory.changes().subscribe()
+
+    service.set_stock("D2", 40)
+    report = service.change_stock([StockChange("D2", -5), StockChange("B3", 7, absolute=True)])
+    service.add_product("B9", "books", "Dune", 1099, 4, "Frank Herbert", True)
+
+    assert report.ok and inventory["D2"].stock == 35 and inventory["B3"].stock == 7
+    assert inventory["B9"].name == "Dune"
+    assert {change.pid for change in sub.drain()} == {"D2", "B3", "B9"}
+    assert [p.id for p in service.search("dune")] == ["B9"]
@@ -0,0 +1,49 @@
+# a delivery list is applied all together or not at all
+# run: python -m pytest -q
+
+from deliveries import parse_changes
+from models import LARGEST, open_inventory, seed_inventory
+from orders import OrderService, StockChange
+from reservations import ReservationService
+
+
+def test_amount_too_big_to_save_is_a_bad_line():
+    changes, bad = parse_changes(["D1 +24", f"F1 ={LARGEST + 1}", f"B1 {LARGEST}"])
+    assert [c.product_id for c in changes] == ["D1", "B1"]
+    assert bad == [(2, f"F1 ={LARGEST + 1}")]
+
+
+def test_batch_adding_up_past_the_limit_changes_nothing(tmp_path):
+    inventory = open_inventory(str(tmp_path / "shop.db"))
+    service = OrderService(inventory)
+    before = {pid: inventory[pid].stock for pid in ("D1", "B1")}
+    report = service.change_stock([StockChange("D1", 5), StockChange("B1", LARGEST), StockChange("B1", 1)])
+    assert not report.ok
+    assert report.too_large == [("B1", LARGEST + before["B1"] + 1)]
+    inventory.close()                    # (nothing half changed to fail saving)
+    inventory = open_inventory(str(tmp_path / "shop.db"))
+    assert {pid: inventory[pid].stock for pid in before} == before
+    inventory.close()
+
+
+class CountingLocks:
+    def __init__(self):
+        self.taken = []
+
+    def lock_for(self, pid: str):
+        self.taken.append(pid)
+        return self
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+def test_set_stock_takes_the_product_lock():
+    inventory = seed_inventory()
+    locks = CountingLocks()
+    service = OrderService(inventory, ReservationService(inventory, locks=locks))
+    service.set_stock("D2", 40)
+    assert locks.taken == ["D2"] and inventory["D2"].stock == 40
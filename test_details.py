@@ -0,0 +1,85 @@
+# the saved inventory leaving product details on disk until they're looked at
+# run: python -m pytest -q
+
+import os
+import sqlite3
+
+from models import Product, StoredProduct, details_path, open_inventory, seed_inventory
+
+
+def test_details_read_from_the_file_next_to_the_database(tmp_path):
+    db = str(tmp_path / "shop.db")
+    inventory = open_inventory(db)
+    assert os.path.exists(details_path(db))
+
+    product = inventory["B1"]
+    assert isinstance(product, StoredProduct)
+    assert inventory.details.cache_info().currsize == 0
+    assert product.details == seed_inventory()["B1"].details
+    assert inventory.details.cache_info().currsize == 1
+    inventory.close()
+
+
+def test_saving_stock_does_not_read_details(tmp_path):
+    db = str(tmp_path / "shop.db")
+    inventory = open_inventory(db)
+    inventory.adjust_stock("D1", -1)
+    inventory.adjust_stock("B2", -1)
+    inventory.flush()
+    assert inventory.details.cache_info().currsize == 0
+    inventory.close()
+
+    inventory = open_inventory(db)
+    assert inventory["D1"].stock == seed_inventory()["D1"].stock - 1
+    assert inventory["B2"].details == seed_inventory()["B2"].details
+    inventory.close()
+
+
+def test_new_and_edited_details_are_appended_not_rewritten(tmp_path):
+    db = str(tmp_path / "shop.db")
+    inventory = open_inventory(db)
+    generation, rows = inventory.details.generation, len(inventory.details)
+
+    inventory["F1"] = Product("F1", "food", "Chocolate Brownie", 290, 15, "Cocoa, butter, eggs")
+    inventory["B9"] = Product("B9", "books", "Dune", 1099, 4, "Frank Herbert", True)
+    del inventory["D2"]
+    inventory.flush()
+    inventory.adjust_stock("B9", -1)     # (saved again with the same details: nothing appended)
+    inventory.close()
+
+    inventory = open_inventory(db)
+    assert inventory.details.generation == generation
+    assert len(inventory.details) == rows + 2
+    assert inventory["F1"].details == "Cocoa, butter, eggs"
+    assert inventory["B9"].details == "Frank Herbert"
+    assert inventory["D3"].details == seed_inventory()["D3"].details
+    inventory.close()
+
+
+def test_vacuum_does_not_mix_up_details(tmp_path):
+    db = str(tmp_path / "shop.db")
+    inventory = open_inventory(db)
+    for pid in ("D1", "D3", "F2", "B1"):
+        del inventory[pid]
+    inventory.close()
+    open_inventory(db).close()
+    conn = sqlite3.connect(db)
+    conn.execute("VACUUM")
+    conn.close()
+
+    inventory = open_inventory(db)
+    seed = seed_inventory()
+    assert {p.id: p.details for p in inventory.values()} == {
+        pid: p.details for pid, p in seed.items() if pid not in ("D1", "D3", "F2", "B1")}
+    inventory.close()
+
+
+def test_product_saved_after_the_file_was_opened(tmp_path):
+    db = str(tmp_path / "shop.db")
+    inventory = open_inventory(db)
+    other = open_inventory(db)
+    other["B9"] = Product("B9", "books", "Dune", 1099, 4, "Frank Herbert", True)
+    other.close()
+
+    assert inventory["B9"].details == "Frank Herbert"
+    inventory.close()
@@ -0,0 +1,38 @@
+# an order the journal couldn't write down isn't placed
+# run: python -m pytest -q
+
+import pytest
+
+from journal import OrderJournal, read_journal
+from models import seed_inventory
+from orders import OrderService
+
+
+class BrokenDisk(OrderJournal):
+    def _write(self, chunk: bytes):
+        raise OSError("disk full")
+
+
+@pytest.mark.parametrize("group_commit", [True, False])
+def test_failed_journal_write_leaves_the_basket_as_it_was(tmp_path, group_commit):
+    inventory = seed_inventory()
+    journal = BrokenDisk(str(tmp_path / "orders.journal"), group_commit=group_commit)
+    service = OrderService(inventory, journal=journal)
+    order = service.new_order()
+    service.add(order, "D1", 2)
+    stock = inventory["D1"].stock
+
+    with pytest.raises(OSError):
+        service.checkout(order)
+    assert len(order.basket) == 1 and service.reservations.held(order.basket, "D1") == 2
+    assert inventory["D1"].stock == stock
+
+    service.cancel(order)
+    assert inventory["D1"].stock == seed_inventory()["D1"].stock
+    if group_commit:
+        with pytest.raises(OSError):
+            journal.close()
+    else:
+        journal.close()
+    assert journal._file.closed
+    assert list(read_journal(journal.path)) == []
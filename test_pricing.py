@@ -0,0 +1,72 @@
+# the compiled PricingEngine must price every basket the same as scan_price
+# run: python -m pytest -q
+
+import datetime
+import random
+
+import pytest
+
+from models import BasketItem, seed_inventory
+from orders import OrderService
+from pricing import MealDeal, MultiBuy, PricingEngine, Selector, TimedPrice, sample_rules, scan_price
+
+CATEGORY = {"D1": "drinks", "D2": "drinks", "F1": "food", "F2": "food", "B1": "books", "B2": "books", "B3": "books"}
+PRICES = {"D1": 360, "D2": 250, "F1": 300, "F2": 450, "B1": 1299, "B2": 999, "B3": 1500}
+NOON = datetime.datetime(2026, 1, 5, 12, 0)
+
+
+def basket(*lines):
+    return [BasketItem(pid, pid, PRICES[pid], qty) for pid, qty in lines]
+
+
+def both(rules, items):
+    engine = PricingEngine(rules, clock=lambda: NOON)
+    return engine.price(items, CATEGORY.get), scan_price(rules, items, CATEGORY.get, NOON)
+
+
+def test_rule_naming_product_and_its_category_counts_line_once():
+    rule = MultiBuy("4 for 2", Selector(products=("B1",), categories=("books",)), 4, 2)
+    engine, scan = both([rule], basket(("B1", 3)))
+    assert engine == scan
+    assert engine.savings == 0
+
+
+def test_selectors_matching_by_id_and_category_agree_with_scan():
+    rules = [
+        MultiBuy("books 3 for 2", Selector(products=("B1", "B1"), categories=("books",)), 3, 2),
+        MultiBuy("food 4 for 2", Selector(products=("F1", "F2"), categories=("food",)), 4, 2),
+        MealDeal("coffee + cake", Selector(products=("D1",), categories=("drinks",)),
+                 Selector(products=("F1", "D1"), categories=("food", "drinks")), 500),
+        TimedPrice("lunch 10% off", Selector(products=("F2",), categories=("food",)), 10,
+                   datetime.time(11), datetime.time(14)),
+        *sample_rules(),
+    ]
+    rng = random.Random(19)
+    for _ in range(500):
+        items = basket(*((pid, rng.randint(1, 4)) for pid in rng.sample(sorted(CATEGORY), rng.randint(1, 5))))
+        engine, scan = both(rules, items)
+        assert engine == scan, items
+
+
+@pytest.mark.parametrize("rule", [
+    TimedPrice("150% off", Selector(categories=("drinks",)), 150, datetime.time(0), datetime.time(23)),
+    TimedPrice("-10% off", Selector(categories=("drinks",)), -10, datetime.time(0), datetime.time(23)),
+    MealDeal("free lunch", Selector(categories=("drinks",)), Selector(categories=("food",)), 0),
+])
+def test_rules_that_could_go_below_nothing_are_refused(rule):
+    with pytest.raises(ValueError):
+        PricingEngine([rule])
+
+
+def test_bill_prices_the_basket_once():
+    # happy hour ends between one look at the clock and the next
+    times = iter([datetime.datetime(2026, 1, 5, 16, 59), datetime.datetime(2026, 1, 5, 17, 0)])
+    engine = PricingEngine([TimedPrice("happy hour", Selector(categories=("drinks",)), 20,
+                                       datetime.time(15), datetime.time(17))], clock=lambda: next(times))
+    service = OrderService(seed_inventory(), pricing=engine)
+    order = service.new_order()
+    service.add(order, "D1", 2)
+    order.discount_percent = 10
+    bill = order.bill()
+    assert bill.savings == 144
+    assert bill.subtotal - bill.savings - bill.discount == bill.total
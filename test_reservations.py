@@ -0,0 +1,114 @@
+# reservations timing out while the order is being placed
+# run: python -m pytest -q
+
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+from models import Inventory, Product
+from reservations import LOCK_STRATEGIES, OutOfStock, ReservationService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class MeddlingLocks:
+    # per-product locks that let another thread run expire_stale (with the
+    # clock moved past every deadline) each time commit lets go of one
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.service = None
+        self.lock = threading.Lock()
+
+    def lock_for(self, pid: str):
+        return self
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        if self.service is not None:
+            service, self.service = self.service, None
+            self.clock.now += 100
+            reaper = threading.Thread(target=service.expire_stale)
+            reaper.start()
+            reaper.join()
+
+
+def test_expiry_during_commit_does_not_give_sold_stock_back():
+    inventory = Inventory({"D1": Product("D1", "drinks", "Latte", 300, 10, ""),
+                           "F1": Product("F1", "food", "Cookie", 150, 5, "")})
+    clock = Clock()
+    locks = MeddlingLocks(clock)
+    service = ReservationService(inventory, ttl=10, locks=locks, clock=clock)
+    holder = object()
+    service.reserve(holder, "D1", 4)
+    assert inventory["D1"].stock == 6
+
+    locks.service = service      # (from here on, the next lock released lets the reaper in)
+    service.commit(holder, {"D1": 4, "F1": 1})
+
+    assert inventory["D1"].stock == 6
+    assert inventory["F1"].stock == 4
+    assert service.held(holder, "D1") == 0
+
+
+class SlowShelf(Inventory):
+    # changing stock reads it, lets another thread in, then writes it back.
+    # anything that isn't properly locked loses updates and oversells
+    def adjust_stock(self, pid: str, delta: int):
+        stock = self[pid].stock
+        time.sleep(0)
+        self.set_stock(pid, stock + delta)
+
+
+@pytest.mark.parametrize("strategy", [s for s in LOCK_STRATEGIES if s != "none"])
+def test_tills_racing_never_oversell(strategy):
+    stock = 30
+    inventory = SlowShelf({f"P{i}": Product(f"P{i}", "food", f"P{i}", 100, stock, "") for i in range(3)})
+    service = ReservationService(inventory, ttl=60, locks=strategy)
+    pids = list(inventory)
+    sold = {pid: [] for pid in pids}      # (list.append is safe from several threads)
+    go = threading.Barrier(8)
+
+    def till(n: int):
+        rng = random.Random(n)
+        go.wait()
+        for _ in range(200):
+            holder = object()
+            pid = rng.choice(pids)
+            qty = rng.randint(1, 3)
+            try:
+                service.reserve(holder, pid, qty)
+                if rng.random() < 0.3:
+                    service.release(holder)
+                    continue
+                service.commit(holder, {pid: qty})
+            except OutOfStock:
+                service.release(holder)
+                continue
+            sold[pid].append(qty)
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        tills = [threading.Thread(target=till, args=(n,)) for n in range(8)]
+        for t in tills:
+            t.start()
+        for t in tills:
+            t.join()
+    finally:
+        sys.setswitchinterval(old_interval)
+
+    for pid in pids:
+        assert sum(sold[pid]) <= stock
+        assert inventory[pid].stock == stock - sum(sold[pid])
@@ -0,0 +1,37 @@
+# the server answering 400 to requests it can't read
+# run: python -m pytest -q
+
+import asyncio
+
+import pytest
+
+from server import HTTPError, read_request
+
+
+def _read(data: bytes, limit: int = 2 ** 16):
+    async def go():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(go())
+
+
+def test_reads_a_request():
+    body = b'{"qty": 2}'
+    request = b"POST /x HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+    method, path, headers, got = _read(request)
+    assert (method, path, got) == ("POST", "/x", body)
+
+
+@pytest.mark.parametrize("length", [b"ten", b"-5", b"1e3"])
+def test_bad_content_length_is_400(length):
+    with pytest.raises(HTTPError) as e:
+        _read(b"POST /x HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+    assert e.value.status == 400
+
+
+def test_too_long_line_is_400():
+    with pytest.raises(HTTPError) as e:
+        _read(b"GET /" + b"a" * 200 + b" HTTP/1.1\r\n\r\n", limit=64)
+    assert e.value.status == 400
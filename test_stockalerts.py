@@ -0,0 +1,64 @@
+# low stock alerts from the change feed
+# run: python -m pytest -q
+
+import threading
+
+from models import Inventory, Product, open_inventory
+from stockalerts import LowStockMonitor
+
+
+def shop():
+    return Inventory({
+        "D1": Product("D1", "drinks", "Latte", 300, 3, ""),      # already low (default level 5)
+        "F1": Product("F1", "food", "Cookie", 150, 7, ""),
+    })
+
+
+def test_already_low_product_does_not_alert_when_it_changes():
+    inventory = shop()
+    monitor = LowStockMonitor(inventory)
+    inventory.adjust_stock("D1", -1)
+    assert monitor.since(0) == []
+    assert [p.id for p, _ in monitor.low()] == ["D1"]
+    monitor.close()
+
+
+def test_crossings_alert_once_in_order():
+    inventory = shop()
+    monitor = LowStockMonitor(inventory)
+    inventory.adjust_stock("F1", -2)     # 5: low
+    monitor.catch_up()
+    inventory.adjust_stock("F1", -1)     # 4: still low, no new alert
+    inventory.set_stock("D1", 0)         # out
+    monitor.catch_up()
+    inventory.set_stock("F1", 20)        # restocked
+    alerts = monitor.since(0)
+    assert [(a.kind, a.pid) for a in alerts] == [("low", "F1"), ("out", "D1"), ("restocked", "F1")]
+    assert [a.seq for a in alerts] == [1, 2, 3]
+    assert monitor.since(2) == alerts[2:]
+    monitor.close()
+
+
+def test_running_out_and_back_between_looks_still_alerts():
+    inventory = shop()
+    monitor = LowStockMonitor(inventory)
+    heard = threading.Semaphore(0)
+    monitor.listen(lambda alert: heard.release())
+    inventory.set_stock("F1", 0)
+    inventory.set_stock("F1", 7)
+    assert [(a.kind, a.pid) for a in monitor.since(0)] == [("out", "F1"), ("restocked", "F1")]
+    assert heard.acquire(timeout=5) and heard.acquire(timeout=5)
+    assert [p.id for p, _ in monitor.low()] == ["D1"]
+    monitor.close()
+
+
+def test_starting_on_a_saved_inventory_loads_nothing(tmp_path):
+    inventory = open_inventory(str(tmp_path / "shop.db"))
+    inventory.adjust_stock("F5", -6)     # 1 left, not saved yet
+    monitor = LowStockMonitor(inventory, {"B3": 5})
+    assert dict.__len__(inventory) == 1
+    assert sorted(p.id for p, _ in monitor.low()) == ["B3", "F5"]
+    inventory.adjust_stock("B4", -3)
+    assert [(a.kind, a.pid, a.stock) for a in monitor.since(0)] == [("low", "B4", 4)]
+    monitor.close()
+    inventory.close()
@@ -0,0 +1,18 @@
+# delivery orders from different shops getting different order ids
+# run: python -m pytest -q
+
+from models import seed_inventory
+from stores import DEFAULT_STORES, StoreNetwork
+
+
+def test_order_ids_are_unique_across_stores():
+    london, manchester = DEFAULT_STORES[0], DEFAULT_STORES[1]
+    # (both shops get the seed stock, so either can fill the order)
+    with StoreNetwork((london, manchester), seed_inventory, lambda store: ()) as network:
+        pid = next(pid for pid, p in seed_inventory().items() if p.category == "books" and p.stock > 0)
+        first, a = network.deliver([(pid, 1)], near=london.location, name="Sam", address="1 High St")
+        second, b = network.deliver([(pid, 1)], near=manchester.location, name="Jo", address="2 Low St")
+
+    assert {first, second} == {london, manchester}
+    assert a["order_id"] != b["order_id"]
+    assert a["order_id"] == f"{london.id}-1"
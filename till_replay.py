@@ -0,0 +1,297 @@
+# load generator for the terminal till: many pretend customers going through
+# the real customer_flow screens (project.py) at once
+#
+# replay.py calls the order service directly. this goes the long way round, like
+# a person at a till would: it answers every input() prompt customer_flow asks
+# (menu choice, item number, "View additional details?", quantity, review,
+# employee discount, delivery, "Place order?") and reads what it prints.
+# every thread is one till, all tills share one inventory and one order service.
+#
+# a customer session is the same JSON as replay.py, with a few extras:
+#   {"lines": [["D1", 2], ["B1", 1]], "discount": true,
+#    "delivery": {"name": "Sam", "address": "1 High St"},
+#    "details": true,       (look at the details screen before each item)
+#    "review": true,        (open "Review order" before checking out)
+#    "place": false}        (walk away at the confirmation screen)
+#
+# at the end it prints sessions/sec, latency percentiles and checks the stock
+# adds up: what's left on the shelf + everything sold = what we started with.
+#
+# run:
+#   python till_replay.py --random 5000 --tills 16
+#   python till_replay.py sessions.jsonl --tills 8 --restock 1000
+
+import argparse
+import random
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import project
+from loadtest import percentile
+from models import Product, money, seed_inventory
+from orders import CATEGORIES, EMPLOYEE_PASSWORD, OrderService, Receipt, list_products
+from replay import random_orders, read_orders
+
+
+class ScriptError(Exception):
+    # the till asked something the script doesn't know how to answer
+    pass
+
+
+class RecordingService(OrderService):
+    # the normal order service, but it remembers every receipt so we can check the stock afterwards
+
+    def __init__(self, inventory):
+        super().__init__(inventory)
+        self.receipts: List[Receipt] = []
+        self._receipts_lock = threading.Lock()
+
+    def checkout(self, order):
+        receipt = super().checkout(order)
+        with self._receipts_lock:
+            self.receipts.append(receipt)
+        return receipt
+
+
+class Customer:
+    # answers customer_flow's prompts for one scripted session
+    # (works out the answer from the prompt, so it never gets out of step)
+
+    def __init__(self, inventory: Dict[str, Product], script: dict):
+        self.inventory = inventory
+        self.script = script
+        self.lines = list(script["lines"])
+        self.current: Optional[list] = None     # [pid, qty] being added right now
+        self.reviewed = not script.get("review")
+        self.checked_out = False
+        self.last_printed = ""
+        self.placed = False
+        self.short = 0           # items we couldn't get as many of as we wanted
+        self.prompts = 0
+        self.waits: List[float] = []    # time from each answer to the next question
+        self._answered_at: Optional[float] = None
+
+    # ----- what customer_flow sees instead of input() and print() -----
+
+    def input(self, prompt: str = "") -> str:
+        now = time.perf_counter()
+        if self._answered_at is not None:
+            self.waits.append(now - self._answered_at)
+        self.prompts += 1
+        answer = self.answer(prompt)
+        self._answered_at = time.perf_counter()
+        return answer
+
+    def print(self, *args, **kwargs):
+        # (a whole screen comes in one call, see project.show)
+        text = " ".join(str(a) for a in args).strip()
+        if text:
+            self.last_printed = text
+            if "Preparing your order" in text:
+                self.placed = True
+
+    # ----- the answers -----
+
+    def answer(self, prompt: str) -> str:
+        if prompt.startswith("\nPress Enter"):
+            return ""
+        if prompt == "Select an option: ":
+            return self.menu_choice()
+        if prompt == "Select an item number: ":
+            return self.item_number()
+        if prompt.startswith("View additional details?"):
+            return "Y" if self.script.get("details") else "N"
+        if prompt.startswith("How many "):
+            return self.quantity()
+        if prompt == "Select: ":
+            # the review screen: we've seen the basket, go back
+            return "0"
+        if prompt.startswith("Are you an employee?"):
+            return "Y" if self.script.get("discount") else "N"
+        if prompt.startswith("Enter employee password"):
+            return EMPLOYEE_PASSWORD
+        if prompt.startswith("Apply "):
+            return "Y"
+        if prompt.startswith("Do you want book delivery"):
+            return "Y" if self.script.get("delivery") else "N"
+        if prompt.startswith("Delivery name"):
+            return self.script["delivery"]["name"]
+        if prompt.startswith("Delivery address"):
+            return self.script["delivery"]["address"]
+        if prompt.startswith("Place order?"):
+            return "Y" if self.script.get("place", True) else "N"
+        raise ScriptError(f"don't know how to answer {prompt!r}")
+
+    def menu_choice(self) -> str:
+        while self.lines:
+            self.current = self.lines.pop(0)
+            product = self.inventory.get(self.current[0])
+            if product is not None and product.category in CATEGORIES:
+                return str(CATEGORIES.index(product.category) + 1)
+            # not on the menu any more, try the next one
+        if not self.reviewed:
+            self.reviewed = True
+            return "4"
+        if not self.checked_out:
+            # (an empty basket just says so and comes back here)
+            self.checked_out = True
+            return "5"
+        return "0"
+
+    def item_number(self) -> str:
+        product = self.inventory[self.current[0]]
+        for idx, p in enumerate(list_products(self.inventory, product.category), start=1):
+            if p.id == product.id:
+                return str(idx)
+        return "0"
+
+    def quantity(self) -> str:
+        # if ask_int just said "Please enter a number between 1 and N", take the N that's left
+        if self.last_printed.startswith("Please enter a number between"):
+            self.short += 1
+            return self.last_printed.rstrip(".").split()[-1]
+        return str(self.current[1])
+
+
+# which Customer the current thread is serving (customer_flow only knows input/print)
+_current = threading.local()
+
+
+def _input(prompt: str = "") -> str:
+    return _current.customer.input(prompt)
+
+
+def _print(*args, **kwargs):
+    _current.customer.print(*args, **kwargs)
+
+
+def random_sessions(inventory: Dict[str, Product], count: int, seed: int = 1) -> Iterator[dict]:
+    # replay.py's random orders, plus some browsing and some customers walking away
+    rng = random.Random(seed + 1)
+    for script in random_orders(inventory, count, seed):
+        script["details"] = rng.random() < 0.2
+        script["review"] = rng.random() < 0.3
+        script["place"] = rng.random() >= 0.05
+        yield script
+
+
+def run(service: OrderService, scripts: Iterable[dict], tills: int) -> dict:
+    scripts = iter(scripts)
+    next_lock = threading.Lock()
+    sessions: List[dict] = []
+    errors: List[str] = []
+
+    def till():
+        while True:
+            with next_lock:
+                script = next(scripts, None)
+            if script is None:
+                return
+            customer = Customer(service.inventory, script)
+            _current.customer = customer
+            start = time.perf_counter()
+            try:
+                project.customer_flow(service)
+            except ScriptError as e:
+                errors.append(str(e))
+                continue
+            finally:
+                _current.customer = None
+            sessions.append({
+                "seconds": time.perf_counter() - start,
+                "placed": customer.placed,
+                "short": customer.short,
+                "prompts": customer.prompts,
+                "waits": customer.waits,
+            })
+
+    # customer_flow looks input/print up in project's globals first, so these
+    # replace the real ones for project.py only (and only while we run)
+    project.input, project.print = _input, _print
+    try:
+        workers = [threading.Thread(target=till, name=f"till-{n}") for n in range(tills)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        del project.input, project.print
+
+    return {"seconds": elapsed, "sessions": sessions, "errors": errors}
+
+
+def stock_problems(start_stock: Dict[str, int], inventory: Dict[str, Product], receipts: List[Receipt]) -> List[str]:
+    # every product: started with = left + sold (and nothing below 0)
+    sold: Dict[str, int] = {}
+    for receipt in receipts:
+        for line in receipt.lines:
+            sold[line.product_id] = sold.get(line.product_id, 0) + line.qty
+    problems = []
+    for pid, before in start_stock.items():
+        now = inventory[pid].stock
+        if now < 0:
+            problems.append(f"{pid}: stock is {now}")
+        if now + sold.get(pid, 0) != before:
+            problems.append(f"{pid}: started {before}, sold {sold.get(pid, 0)}, left {now}")
+    return problems
+
+
+def report(result: dict, service: RecordingService, problems: List[str]):
+    sessions = result["sessions"]
+    placed = sum(1 for s in sessions if s["placed"])
+    times = sorted(s["seconds"] for s in sessions)
+    waits = sorted(w for s in sessions for w in s["waits"])
+
+    print(f"sessions: {len(sessions):,} ({placed:,} placed, {len(sessions) - placed:,} not placed)")
+    print(f"short:    {sum(s['short'] for s in sessions):,} items with less stock than wanted")
+    if result["errors"]:
+        print(f"script errors: {len(result['errors']):,} (first: {result['errors'][0]})")
+    print(f"takings:  {money(sum(r.total for r in service.receipts))}")
+    print(f"time:     {result['seconds']:.2f}s ({len(sessions) / result['seconds']:,.0f} sessions/sec, "
+          f"{placed / result['seconds']:,.0f} orders/sec)")
+
+    print(f"\n{'latency':<26} {'count':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, values in (("whole session", times), ("answer -> next question", waits)):
+        if values:
+            print(f"{name:<26} {len(values):>9,} " + " ".join(
+                f"{percentile(values, p) * 1000:>9.3f}" for p in (50, 90, 99, 100)))
+
+    if problems:
+        print(f"\nSTOCK DOES NOT ADD UP ({len(problems)} products):")
+        for line in problems[:20]:
+            print(f"  {line}")
+    else:
+        print("\nstock check: ok (left on the shelf + sold = starting stock for every product)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Drive many scripted customers through the PaperCup till screens")
+    parser.add_argument("sessions", nargs="?", help="JSON-lines file of customer sessions")
+    parser.add_argument("--random", type=int, metavar="N", help="make up N random sessions instead")
+    parser.add_argument("--tills", type=int, default=8, help="tills (threads) serving customers at once")
+    parser.add_argument("--restock", type=int, metavar="N", help="set every product's stock to N first")
+    args = parser.parse_args(argv)
+
+    if not args.sessions and not args.random:
+        parser.error("give a sessions file or --random N")
+
+    inventory = seed_inventory()
+    if args.restock is not None:
+        for pid in list(inventory):
+            inventory.set_stock(pid, args.restock)
+    start_stock = {pid: p.stock for pid, p in inventory.items()}
+
+    service = RecordingService(inventory)
+    scripts = random_sessions(inventory, args.random) if args.random else read_orders(args.sessions)
+    result = run(service, scripts, args.tills)
+    problems = stock_problems(start_stock, inventory, service.receipts)
+    report(result, service, problems)
+    if problems or result["errors"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()